@@ -0,0 +1,319 @@
+from typing import Iterator, Optional
+
+import numpy as np
+
+import graph_store
+import spatial_hash
+
+COLUMNS = ("x", "y", "radius")
+
+
+class BubbleView:
+    """Dict-like view of one bubble row, so the dialogs can keep using bubble["key"]."""
+
+    __slots__ = ("store", "row", "id", "fields")
+
+    def __init__(self, store, row: int, bubble_id: int, fields: dict):
+        self.store = store
+        self.row = row
+        self.id = bubble_id
+        self.fields = fields
+
+    def check_loaded(self) -> None:
+        """Raise once the bubble was removed or evicted, as row -1 would silently address the last row."""
+        if self.row < 0:
+            raise ValueError(f"bubble {self.id} isn't in the store anymore")
+
+    def __getitem__(self, key):
+        if key in COLUMNS:
+            self.check_loaded()
+            return float(getattr(self.store, key)[self.row])
+        if key == "connections":
+            return self.store.connections_of(self)
+        try:
+            return self.fields[key]
+        except KeyError:
+            return self.store.load_field(self, key)
+
+    def __setitem__(self, key, value):
+        self.check_loaded()
+        if key in COLUMNS:
+            getattr(self.store, key)[self.row] = value
+            if key != "radius":
+                self.store.grid.mark_moved(self.row)
+        elif key == "connections":
+            self.store.set_connections(self, value)
+        else:
+            self.fields[key] = value
+            self.store.versions[self.row] += 1
+
+    def __contains__(self, key):
+        return key in COLUMNS or key == "connections" or key in self.fields or key in self.store.lazy_keys()
+
+    def get(self, key, default=None):
+        """Get a value like dict.get."""
+        return self[key] if key in self else default
+
+    def keys(self):
+        """Get all keys like dict.keys."""
+        lazy = [key for key in self.store.lazy_keys() if key not in self.fields]
+        return [*COLUMNS, "connections", *self.fields, *lazy]
+
+    def __repr__(self):
+        fields = {key: self.fields[key] for key in self.fields if key != "text_surface"}
+        return repr({"x": self["x"], "y": self["y"], "radius": self["radius"], **fields,
+                     "connections": [connected["name"] for connected in self["connections"]]})
+
+
+class BubbleStore:
+    """Columnar bubble storage with contiguous x, y and radius arrays and a graph of connections by bubble id."""
+
+    def __init__(self, cell_size: float, capacity: int = 64):
+        """
+        Bubble store
+
+        Args:
+            cell_size: Cell size of the spatial hash used for collisions and hit-testing
+            capacity: Number of rows allocated up front
+        """
+        self.count = 0
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.radius = np.zeros(capacity)
+        self.versions = np.zeros(capacity, dtype=np.int64)
+        self.views = []
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.row_of = np.full(capacity, -1, dtype=np.int64)
+        self.next_id = 0
+        self.graph = graph_store.GraphStore(capacity)
+        self.edge_version = 0
+        self.edge_cache = (None, np.zeros((0, 2), dtype=np.int64))
+        self.lazy_fields = None
+        self.grid = spatial_hash.SpatialHash(cell_size)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[BubbleView]:
+        return iter(self.views[:self.count])
+
+    def __getitem__(self, row: int) -> BubbleView:
+        # views holds exactly count entries, copying it per lookup made every row access O(n)
+        return self.views[row]
+
+    def __repr__(self):
+        return repr(self.views[:self.count])
+
+    def grow(self, capacity: int) -> None:
+        """Reallocate the row arrays to hold at least capacity rows."""
+        for column in (*COLUMNS, "versions", "ids"):
+            old = getattr(self, column)
+            array = np.zeros(capacity, dtype=old.dtype)
+            array[:self.count] = old[:self.count]
+            setattr(self, column, array)
+
+    def add(self, bubble: dict) -> BubbleView:
+        """Append a bubble given as a dict and get its view."""
+        if self.count == len(self.x):
+            self.grow(max(64, len(self.x) * 2))
+        row = self.count
+        self.x[row] = bubble["x"]
+        self.y[row] = bubble["y"]
+        self.radius[row] = bubble["radius"]
+        self.versions[row] = 0
+        bubble_id = self.next_id
+        self.next_id += 1
+        if bubble_id == len(self.row_of):
+            row_of = np.full(max(64, len(self.row_of) * 2), -1, dtype=np.int64)
+            row_of[:bubble_id] = self.row_of
+            self.row_of = row_of
+        self.ids[row] = bubble_id
+        self.row_of[bubble_id] = row
+        fields = {key: value for key, value in bubble.items() if key not in COLUMNS and key != "connections"}
+        view = BubbleView(self, row, bubble_id, fields)
+        self.views.append(view)
+        self.count += 1
+        self.grid.mark_moved(row)
+        for connected in bubble.get("connections", ()):
+            self.connect(view, connected)
+        return view
+
+    def add_many(self, x: np.ndarray, y: np.ndarray, radius: np.ndarray, fields: list,
+                 ids: Optional[np.ndarray] = None) -> list:
+        """Append many bubbles given as columns plus one field dict each and get their views, optionally keeping ids."""
+        count = len(x)
+        if count == 0:
+            return []
+        if ids is None:
+            ids = np.arange(self.next_id, self.next_id + count)
+        elif np.any(ids < 0) or np.any(self.row_of[ids[ids < len(self.row_of)]] >= 0):
+            raise ValueError("bubble ids must be unused, unique and not negative")
+        if self.count + count > len(self.x):
+            self.grow(max(64, len(self.x) * 2, self.count + count))
+        next_id = max(self.next_id, int(ids.max()) + 1)
+        if next_id > len(self.row_of):
+            row_of = np.full(max(64, len(self.row_of) * 2, next_id), -1, dtype=np.int64)
+            row_of[:len(self.row_of)] = self.row_of
+            self.row_of = row_of
+        rows = slice(self.count, self.count + count)
+        self.row_of[ids] = np.arange(rows.start, rows.stop)
+        if not np.array_equal(self.row_of[ids], np.arange(rows.start, rows.stop)):
+            # a repeated id kept only the row written last
+            self.row_of[ids] = -1
+            raise ValueError("bubble ids must be unused, unique and not negative")
+        self.x[rows] = x
+        self.y[rows] = y
+        self.radius[rows] = radius
+        self.versions[rows] = 0
+        self.ids[rows] = ids
+        views = list(map(BubbleView, [self] * count, range(rows.start, rows.stop), ids.tolist(), fields))
+        self.views.extend(views)
+        self.next_id = next_id
+        self.count += count
+        self.grid.invalidate()
+        return views
+
+    def remove(self, view: BubbleView) -> None:
+        """Remove a bubble and all of its connections, keeping the drawing order of the others."""
+        row = view.row
+        self.graph.remove_node(view.id)
+        for column in (*COLUMNS, "versions", "ids"):
+            array = getattr(self, column)
+            array[row:self.count - 1] = array[row + 1:self.count]
+        del self.views[row]
+        self.count -= 1
+        for index in range(row, self.count):
+            self.views[index].row = index
+        self.row_of[view.id] = -1
+        self.row_of[self.ids[row:self.count]] -= 1
+        # the rows behind the removed one moved, so the cached edge rows are stale even without lost connections
+        self.edge_version += 1
+        view.row = -1
+        self.grid.invalidate()
+
+    def remove_many(self, rows: np.ndarray) -> None:
+        """Remove many bubbles given by row and all of their connections at once, keeping the drawing order."""
+        count = self.count
+        keep = np.ones(count, dtype=bool)
+        keep[rows] = False
+        removed = np.flatnonzero(~keep)
+        if len(removed) == 0:
+            return
+        self.graph.remove_nodes(self.ids[removed])
+        self.row_of[self.ids[removed]] = -1
+        for row in removed.tolist():
+            self.views[row].row = -1
+        self.count = int(np.count_nonzero(keep))
+        for column in (*COLUMNS, "versions", "ids"):
+            array = getattr(self, column)
+            array[:self.count] = array[:count][keep]
+        self.views = [view for view, kept in zip(self.views, keep.tolist()) if kept]
+        for index, view in enumerate(self.views):
+            view.row = index
+        self.row_of[self.ids[:self.count]] = np.arange(self.count)
+        self.edge_version += 1
+        self.grid.invalidate()
+
+    def clear(self) -> None:
+        """Remove every bubble and connection."""
+        for view in self.views[:self.count]:
+            view.row = -1
+        self.count = 0
+        self.views = []
+        self.row_of[:] = -1
+        self.graph = graph_store.GraphStore()
+        self.edge_version += 1
+        self.close_lazy_fields()
+        self.grid.invalidate()
+
+    def lazy_keys(self) -> tuple:
+        """Get the field keys that are decoded on first access, see lazy_fields."""
+        return self.lazy_fields.keys if self.lazy_fields is not None else ()
+
+    def load_field(self, view: BubbleView, key: str):
+        """Decode a lazily loaded field of a bubble and keep it, raising KeyError for unknown keys."""
+        if key not in self.lazy_keys():
+            raise KeyError(key)
+        value = self.lazy_fields.load(view, key)
+        view.fields[key] = value
+        return value
+
+    def materialize(self) -> None:
+        """Decode every lazily loaded field, e.g. before the file they come from is overwritten."""
+        for key in self.lazy_keys():
+            for view in self.views[:self.count]:
+                view.get(key)
+        self.close_lazy_fields()
+
+    def close_lazy_fields(self) -> None:
+        """Drop the source of lazily loaded fields."""
+        if self.lazy_fields is not None:
+            self.lazy_fields.close()
+            self.lazy_fields = None
+
+    def view_of(self, bubble_id: int) -> Optional[BubbleView]:
+        """Get the view of a bubble by its id, None if it was removed."""
+        row = self.row_of[bubble_id] if 0 <= bubble_id < self.next_id else -1
+        return self.views[row] if row >= 0 else None
+
+    def has_edge(self, view1: BubbleView, view2: BubbleView) -> bool:
+        """Check whether view1 is connected to view2."""
+        return self.graph.contains(view1.id, view2.id)
+
+    def connect(self, view1: BubbleView, view2: BubbleView) -> bool:
+        """Connect view1 to view2 unless they are already connected."""
+        if not self.graph.connect(view1.id, view2.id):
+            return False
+        self.edge_version += 1
+        return True
+
+    def connect_many(self, source_ids: np.ndarray, target_ids: np.ndarray) -> int:
+        """Connect many bubbles given by id at once and get the number of new connections."""
+        added = self.graph.connect_many(source_ids, target_ids)
+        if added:
+            self.edge_version += 1
+        return added
+
+    def disconnect(self, view1: BubbleView, view2: BubbleView) -> bool:
+        """Remove the connection from view1 to view2 if there is one."""
+        if not self.graph.disconnect(view1.id, view2.id):
+            return False
+        self.edge_version += 1
+        return True
+
+    def connections_of(self, view: BubbleView) -> list:
+        """Get the views view is connected to."""
+        return [self.views[self.row_of[target]] for target in self.graph.successors(view.id)]
+
+    def connected_to(self, view: BubbleView) -> list:
+        """Get the views connected to view."""
+        return [self.views[self.row_of[source]] for source in self.graph.predecessors(view.id)]
+
+    def set_connections(self, view: BubbleView, connections) -> None:
+        """Replace the outgoing connections of view."""
+        self.graph.clear_successors(view.id)
+        self.edge_version += 1
+        for connected in connections:
+            self.connect(view, connected)
+
+    def edge_rows(self) -> np.ndarray:
+        """Get the (source row, target row) array of all connections, rebuilt only after they or the rows changed."""
+        version, rows = self.edge_cache
+        if version != self.edge_version:
+            rows = self.row_of[self.graph.edge_ids()]
+            self.edge_cache = (self.edge_version, rows)
+        return rows
+
+    def bubble_at(self, x: float, y: float) -> Optional[BubbleView]:
+        """Get the topmost bubble whose circle contains the world position, if any."""
+        if self.grid.valid:
+            rows = self.grid.rows_near(x, y)
+        else:
+            rows = np.arange(self.count)
+        rows = rows[rows < self.count]
+        hits = rows[(self.x[rows] - x) ** 2 + (self.y[rows] - y) ** 2 < self.radius[rows] ** 2]
+        return self.views[int(hits.max())] if len(hits) else None
+
+
+if __name__ == "__main__":
+    print("This file isn't intended to be run directly.")
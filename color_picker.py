@@ -9,7 +9,9 @@ import tkinter
 from typing import Optional, Tuple
 
 import customtkinter
-from PIL import Image, ImageTk
+import numpy as np
+
+import image_assets
 
 PATH = os.path.dirname(os.path.realpath(__file__))
 
@@ -29,6 +31,7 @@ class AskColor(customtkinter.CTkToplevel):
             fg_color: Optional[str] = None,
             corner_radius: int = 24,
             slider_border: int = 1,
+            refresh_rate: int = 60,
             **button_kwargs
     ):
         super().__init__()
@@ -36,6 +39,10 @@ class AskColor(customtkinter.CTkToplevel):
         self.default_rgb = [255, 255, 255]
         self.rgb_color = self.default_rgb.copy()
         self._color = None
+        # drag events are applied at most once per display frame
+        self.frame_ms = max(1, 1000 // refresh_rate)
+        self.drag_job = None
+        self.shown_colors = None
         self._init_colors(button_color, button_hover_color, button_hover_color2,
                           fg_color, corner_radius, slider_border)
         self._create_widgets()
@@ -113,21 +120,17 @@ class AskColor(customtkinter.CTkToplevel):
         self.canvas.pack(pady=20)
         self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
 
-        self.img1 = Image.open(os.path.join(PATH, 'color_wheel.png')).resize(
-            (self.image_dimension, self.image_dimension),
-            Image.Resampling.LANCZOS
-        )
-        self.img2 = Image.open(os.path.join(PATH, 'target.png')).resize(
-            (self.target_dimension, self.target_dimension),
-            Image.Resampling.LANCZOS
-        )
+        # decoded and resized once per size, then shared by every picker that is opened
+        wheel_size = (self.image_dimension, self.image_dimension)
+        target_size = (self.target_dimension, self.target_dimension)
+        self.wheel_pixels = image_assets.shared.array("color_wheel.png", wheel_size)
 
-        self.wheel = ImageTk.PhotoImage(self.img1)
-        self.target = ImageTk.PhotoImage(self.img2)
+        self.wheel = image_assets.shared.photo("color_wheel.png", wheel_size, self)
+        self.target = image_assets.shared.photo("target.png", target_size, self)
 
         self.canvas.create_image(self.image_dimension / 2, self.image_dimension / 2, image=self.wheel)
         self.target_x, self.target_y = self.image_dimension / 2, self.image_dimension / 2
-        self.canvas.create_image(self.target_x, self.target_y, image=self.target)
+        self.target_item = self.canvas.create_image(self.target_x, self.target_y, image=self.target)
 
     def _create_brightness_slider(self) -> None:
         """Create the brightness slider."""
@@ -206,11 +209,12 @@ class AskColor(customtkinter.CTkToplevel):
         self._cleanup_resources()
 
     def _cleanup_resources(self) -> None:
-        """Clean up image resources."""
-        if hasattr(self, 'img1'):
-            del self.img1
-        if hasattr(self, 'img2'):
-            del self.img2
+        """Cancel a pending drag update and drop the references to the shared images."""
+        if self.drag_job is not None:
+            self.after_cancel(self.drag_job)
+            self.drag_job = None
+        if hasattr(self, 'wheel_pixels'):
+            del self.wheel_pixels
         if hasattr(self, 'wheel'):
             del self.wheel
         if hasattr(self, 'target'):
@@ -219,9 +223,6 @@ class AskColor(customtkinter.CTkToplevel):
     def on_mouse_drag(self, event) -> None:
         """Handle mouse drag on color wheel."""
         x, y = event.x, event.y
-        self.canvas.delete("all")
-        self.canvas.create_image(self.image_dimension / 2, self.image_dimension / 2, image=self.wheel)
-
         center_x, center_y = self.image_dimension / 2, self.image_dimension / 2
         radius = self.image_dimension / 2
         d_from_center = math.sqrt((center_x - x) ** 2 + (center_y - y) ** 2)
@@ -231,14 +232,19 @@ class AskColor(customtkinter.CTkToplevel):
         else:
             self.target_x, self.target_y = self.projection_on_circle(x, y, center_x, center_y, radius - 1)
 
-        self.canvas.create_image(self.target_x, self.target_y, image=self.target)
-        self.get_target_color()
+        if self.drag_job is None:
+            self.drag_job = self.after(self.frame_ms, self._apply_drag)
+
+    def _apply_drag(self) -> None:
+        """Move the target to the last dragged position and update the colors once for all drag events since."""
+        self.drag_job = None
+        self.canvas.coords(self.target_item, self.target_x, self.target_y)
         self.update_colors()
 
     def get_target_color(self) -> None:
         """Get the color at the current target position."""
         try:
-            self.rgb_color = self.img1.getpixel((self.target_x, self.target_y))[:3]
+            self.rgb_color = self.wheel_pixels[int(self.target_y), int(self.target_x), :3].tolist()
         except (AttributeError, IndexError):
             self.rgb_color = self.default_rgb.copy()
 
@@ -253,20 +259,21 @@ class AskColor(customtkinter.CTkToplevel):
         ]
 
         hex_color = self.rgb_to_hex(adjusted_rgb)
+        text_color = "white" if brightness < 70 or hex_color == "#000000" else "black"
+        if (hex_color, text_color) == self.shown_colors:
+            return
+        self.shown_colors = (hex_color, text_color)
         hover_rgb = self.get_hover_color(adjusted_rgb)
         hover_hex = self.rgb_to_hex(hover_rgb)
         hover2_hex = self.rgb_to_hex(self.get_hover_color(hover_rgb))
 
-        self.button.configure(fg_color=hex_color, hover_color=hover_hex)
+        self.button.configure(fg_color=hex_color, hover_color=hover_hex, text_color=text_color)
         self.slider.configure(
             progress_color=hex_color,
             button_color=hover_hex,
             button_hover_color=hover2_hex
         )
 
-        text_color = "white" if brightness < 70 or hex_color == "#000000" else "black"
-        self.button.configure(text_color=text_color)
-
     @staticmethod
     def projection_on_circle(point_x: float, point_y: float,
                              circle_x: float, circle_y: float,
@@ -277,27 +284,74 @@ class AskColor(customtkinter.CTkToplevel):
         projection_y = circle_y + radius * math.sin(angle)
         return projection_x, projection_y
 
+    def wheel_position(self, rgb: Tuple[int, int, int], tolerance: int = 24) -> Tuple[int, int, int]:
+        """Get the wheel position and the brightness that show rgb, from its HSV values and the wheel geometry."""
+        center = self.image_dimension // 2
+        brightness = max(rgb)
+        if brightness == 0:
+            return center, center, 0
+        full = np.array(rgb, dtype=float) * 255 / brightness
+        saturation = 1 - min(rgb) / brightness
+        size = (self.image_dimension, self.image_dimension)
+        hues, angles = image_assets.shared.derived("color_wheel.png", size, wheel_hue_curve)
+        hue = float(rgb_to_hue(full))
+        angle = np.interp(hues[0] + (hue - hues[0]) % 360, hues, angles)
+        distance = saturation * (center - 1)
+        x = min(self.image_dimension - 1, max(0, round(center + distance * math.cos(angle))))
+        y = min(self.image_dimension - 1, max(0, round(center - distance * math.sin(angle))))
+        wheel = image_assets.shared.array("color_wheel.png", size)
+        if np.abs(wheel[y, x, :3] - full).max() > tolerance:
+            # the wheel doesn't follow the hue curve here, so take the pixel of the closest color
+            colors, positions = image_assets.shared.derived("color_wheel.png", size, wheel_lookup)
+            x, y = positions[np.argmin(((colors - full) ** 2).sum(axis=1))].tolist()
+        return x, y, brightness
+
     def set_initial_color(self, initial_color: str) -> None:
-        """BROKEN! Set the initial color selection."""
+        """Set the initial color selection."""
         if not initial_color or not initial_color.startswith("#"):
             return
 
         try:
-            r, g, b = self.hex_to_rgb(initial_color)
+            rgb = self.hex_to_rgb(initial_color)
         except ValueError:
             return
 
-        for i in range(self.image_dimension):
-            for j in range(self.image_dimension):
-                pixel = self.img1.getpixel((i, j))
-                if pixel[:3] == (r, g, b):
-                    self.canvas.delete("all")
-                    self.canvas.create_image(self.image_dimension / 2, self.image_dimension / 2, image=self.wheel)
-                    self.canvas.create_image(i, j, image=self.target)
-                    self.target_x, self.target_y = i, j
-                    self.get_target_color()
-                    self.update_colors()
-                    return
+        self.target_x, self.target_y, brightness = self.wheel_position(rgb)
+        self.canvas.coords(self.target_item, self.target_x, self.target_y)
+        self.brightness_slider_value.set(brightness)
+        self.update_colors()
+
+
+def rgb_to_hue(colors: np.ndarray) -> np.ndarray:
+    """Get the HSV hue in degrees of RGB colors given along the last axis."""
+    colors = np.asarray(colors, dtype=float)
+    red, green, blue = colors[..., 0], colors[..., 1], colors[..., 2]
+    maximum = colors.max(axis=-1)
+    chroma = maximum - colors.min(axis=-1)
+    safe_chroma = np.where(chroma == 0, 1, chroma)
+    hue = np.where(maximum == red, ((green - blue) / safe_chroma) % 6,
+                   np.where(maximum == green, (blue - red) / safe_chroma + 2, (red - green) / safe_chroma + 4))
+    return np.where(chroma == 0, 0.0, hue * 60)
+
+
+def wheel_hue_curve(wheel: np.ndarray, samples: int = 720, ring: float = 0.9) -> tuple:
+    """Sample the hue along a ring of the wheel and get the rising hues and the counterclockwise angles of them."""
+    center = wheel.shape[0] / 2
+    angles = np.linspace(0, 2 * math.pi, samples + 1)
+    x = np.clip((center + ring * center * np.cos(angles[:-1])).astype(np.int64), 0, wheel.shape[1] - 1)
+    y = np.clip((center - ring * center * np.sin(angles[:-1])).astype(np.int64), 0, wheel.shape[0] - 1)
+    # the wheel isn't spaced evenly by hue, so angles are interpolated between these samples
+    hues = np.maximum.accumulate(np.degrees(np.unwrap(np.radians(rgb_to_hue(wheel[y, x, :3])))))
+    # closing the circle lets hues just below the first one wrap around to the end
+    return np.append(hues, hues[0] + 360), angles
+
+
+def wheel_lookup(wheel: np.ndarray, step: int = 2) -> tuple:
+    """Get the colors and positions of every step-th opaque wheel pixel for nearest color searches."""
+    y, x = np.mgrid[0:wheel.shape[0]:step, 0:wheel.shape[1]:step]
+    sample = wheel[y, x]
+    opaque = sample[..., 3] > 0
+    return sample[opaque][:, :3].astype(float), np.stack((x[opaque], y[opaque]), axis=1)
 
 
 def hex_to_rgb(hex_color: str) -> Tuple[int, int, int]:
@@ -0,0 +1,63 @@
+import collections
+import statistics
+import time
+from typing import Callable, Optional
+
+
+class DialogPool:
+    """Builds every dialog window once on the tkinter thread and hides it instead of destroying it."""
+
+    def __init__(self, builders: dict, latency_samples: int = 100):
+        """
+        Dialog pool
+
+        Args:
+            builders: Functions that build the window of a dialog kind, called once on its first use
+            latency_samples: Number of recent open latencies kept for the statistics
+        """
+        self.builders = builders
+        self.windows = {}
+        self.shown = None
+        self.open_seconds = collections.deque(maxlen=latency_samples)
+        self.builds = 0
+
+    def window(self, kind: str):
+        """Get the window of a dialog kind, building it on the first call."""
+        window = self.windows.get(kind)
+        if window is None:
+            window = self.builders[kind]()
+            window.withdraw()
+            self.windows[kind] = window
+            self.builds += 1
+        return window
+
+    def show(self, kind: str, populate: Callable, requested_at: Optional[float] = None) -> bool:
+        """Fill a dialog through populate and show it, nothing happens while another dialog is open."""
+        if self.shown is not None:
+            return False
+        start = time.perf_counter() if requested_at is None else requested_at
+        window = self.window(kind)
+        populate(window)
+        window.deiconify()
+        window.lift()
+        window.focus_force()
+        window.update_idletasks()
+        self.open_seconds.append(time.perf_counter() - start)
+        self.shown = kind
+        return True
+
+    def hide(self) -> None:
+        """Hide the open dialog so it can be shown again without being rebuilt."""
+        if self.shown is not None:
+            self.windows[self.shown].withdraw()
+            self.shown = None
+
+    def latency(self) -> tuple:
+        """Get the median and the worst of the recent open latencies in seconds."""
+        if not self.open_seconds:
+            return 0.0, 0.0
+        return statistics.median(self.open_seconds), max(self.open_seconds)
+
+
+if __name__ == "__main__":
+    print("This file isn't intended to be run directly.")
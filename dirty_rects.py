@@ -0,0 +1,147 @@
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pygame
+
+
+class DirtyTracker:
+    """Remembers what the last presented frame showed and collects the screen regions that changed since."""
+
+    def __init__(self, full_redraw_share: float = 0.5, max_rects: int = 24, margin: int = 2):
+        """
+        Dirty tracker
+
+        Args:
+            full_redraw_share: Share of the window above which one full repaint is cheaper than many small ones
+            max_rects: Number of dirty rects above which they are merged into their union
+            margin: Pixels added around every dirty rect to cover antialiasing and line width
+        """
+        self.full_redraw_share = full_redraw_share
+        self.max_rects = max_rects
+        self.margin = margin
+        self.view = None
+        self.edge_version = None
+        self.rects = np.zeros((0, 4), dtype=np.int64)
+        self.previous_rects = self.rects
+        self.versions = np.zeros(0, dtype=np.int64)
+        self.bounds = np.zeros((0, 4), dtype=np.int64)
+        self.overlays = {}
+        self.dirty = []
+        self.full = True
+        self.presented_frames = 0
+        self.skipped_frames = 0
+
+    def invalidate(self) -> None:
+        """Repaint the whole window next frame."""
+        self.full = True
+
+    def begin(self, view, edge_version: int, rects: np.ndarray, versions: np.ndarray) -> np.ndarray:
+        """Compare the bubble screen rects and versions with the last frame and get the rows that changed."""
+        count = len(rects)
+        rounded = np.round(rects).astype(np.int64)
+        old_count = len(self.rects)
+        if view != self.view or edge_version != self.edge_version or count < old_count:
+            self.full = True
+        self.view = view
+        self.edge_version = edge_version
+        if self.full:
+            changed = np.arange(count)
+        else:
+            same = np.all(rounded[:old_count] == self.rects, axis=1) & (versions[:old_count] == self.versions)
+            changed = np.concatenate((np.flatnonzero(~same), np.arange(old_count, count)))
+        self.previous_rects = self.rects
+        self.rects = rounded
+        self.versions = versions.copy()
+        if len(self.bounds) != count:
+            bounds = np.zeros((count, 4), dtype=np.int64)
+            kept = min(count, len(self.bounds))
+            bounds[:kept] = self.bounds[:kept]
+            self.bounds = bounds
+        return changed
+
+    def mark(self, rect) -> None:
+        """Add a screen rect (x, y, w, h) that has to be repainted."""
+        if rect is not None and rect[2] > 0 and rect[3] > 0:
+            self.dirty.append(tuple(int(value) for value in rect))
+
+    def set_bounds(self, row: int, rect: Optional[Tuple[int, int, int, int]]) -> None:
+        """Store the area a bubble covers now, marking the area it covered before and after as dirty."""
+        if not self.full:
+            self.mark(self.bounds[row])
+            self.mark(rect)
+        self.bounds[row] = rect if rect is not None else (0, 0, 0, 0)
+
+    def clear_bounds(self, rows: np.ndarray) -> None:
+        """Forget the area of rows that are not drawn on their own anymore, marking it as dirty."""
+        if not self.full:
+            for rect in self.bounds[rows][self.bounds[rows, 2] > 0]:
+                self.mark(rect)
+        self.bounds[rows] = 0
+
+    def mark_edges(self, edges: np.ndarray, changed: np.ndarray) -> None:
+        """Mark the old and new lines of every connection with a changed end as dirty."""
+        if self.full or len(edges) == 0 or len(changed) == 0:
+            return
+        moved = np.zeros(len(self.rects), dtype=bool)
+        moved[changed] = True
+        edges = edges[moved[edges[:, 0]] | moved[edges[:, 1]]]
+        for rects in (self.previous_rects, self.rects):
+            known = edges[(edges[:, 0] < len(rects)) & (edges[:, 1] < len(rects))]
+            if len(known):
+                for rect in self.line_bounds(rects[known[:, 0]], rects[known[:, 1]]):
+                    self.mark(rect)
+
+    @staticmethod
+    def line_bounds(rects1: np.ndarray, rects2: np.ndarray) -> np.ndarray:
+        """Get the bounding rects of the lines between the centers of two rows of rects."""
+        x1 = rects1[:, 0] + rects1[:, 2] // 2
+        y1 = rects1[:, 1] + rects1[:, 3] // 2
+        x2 = rects2[:, 0] + rects2[:, 2] // 2
+        y2 = rects2[:, 1] + rects2[:, 3] // 2
+        left, top = np.minimum(x1, x2), np.minimum(y1, y2)
+        return np.stack((left, top, np.abs(x2 - x1) + 1, np.abs(y2 - y1) + 1), axis=1)
+
+    def overlay(self, name: str, rect: Optional[Tuple[int, int, int, int]], content=None) -> None:
+        """Track something drawn on top of the map and mark it dirty when its rect or content changes."""
+        if self.overlays.get(name) != (rect, content):
+            if name in self.overlays:
+                self.mark(self.overlays[name][0])
+            self.mark(rect)
+            self.overlays[name] = (rect, content)
+
+    def finish(self, size: Tuple[int, int]) -> Tuple[bool, List[pygame.Rect]]:
+        """Get whether the whole window has to be repainted and otherwise the merged dirty rects."""
+        screen = pygame.Rect(0, 0, *size)
+        if self.full:
+            return True, [screen]
+        rects = [pygame.Rect(rect).inflate(self.margin * 2, self.margin * 2).clip(screen) for rect in self.dirty]
+        rects = [rect for rect in rects if rect.width > 0 and rect.height > 0]
+        if len(rects) > self.max_rects:
+            rects = [rects[0].unionall(rects[1:])]
+        if sum(rect.width * rect.height for rect in rects) > self.full_redraw_share * screen.width * screen.height:
+            self.full = True
+            return True, [screen]
+        return False, rects
+
+    @staticmethod
+    def overlapping(rects: np.ndarray, rect: pygame.Rect) -> np.ndarray:
+        """Get a mask of the rects (x, y, w, h) that overlap a screen rect."""
+        return ((rects[:, 0] < rect.right) & (rects[:, 0] + rects[:, 2] > rect.left)
+                & (rects[:, 1] < rect.bottom) & (rects[:, 1] + rects[:, 3] > rect.top))
+
+    def rows_in(self, rect: pygame.Rect) -> np.ndarray:
+        """Get the rows whose last drawn area overlaps a screen rect, in drawing order."""
+        return np.flatnonzero((self.bounds[:, 2] > 0) & self.overlapping(self.bounds, rect))
+
+    def presented(self, painted: bool) -> None:
+        """Forget the collected dirty rects after a frame was presented or skipped."""
+        self.dirty = []
+        self.full = False
+        if painted:
+            self.presented_frames += 1
+        else:
+            self.skipped_frames += 1
+
+
+if __name__ == "__main__":
+    print("This file isn't intended to be run directly.")
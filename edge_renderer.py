@@ -0,0 +1,131 @@
+import math
+import time
+from typing import Sequence, Tuple
+
+import numpy as np
+import pygame
+
+
+class EdgeRenderer:
+    """Draws connections with one vectorized geometry and clipping pass and one aaline call per visible edge."""
+
+    def __init__(self, palette: Sequence[Tuple[int, int, int]] = ((100, 100, 100),)):
+        """
+        Edge renderer
+
+        Args:
+            palette: Line colors, edges pick theirs by index
+        """
+        self.palette = list(palette)
+        self.edges = np.zeros((0, 2), dtype=np.int64)
+        self.colors = np.zeros(0, dtype=np.int64)
+        self.x1 = self.y1 = self.x2 = self.y2 = np.zeros(0)
+        self.drawn = 0
+        self.culled = 0
+        self.total_drawn = 0
+        self.total_culled = 0
+
+    def prepare(self, x: np.ndarray, y: np.ndarray, radius: np.ndarray, edges: np.ndarray, zoom: float,
+                offset_x: float, offset_y: float, colors: np.ndarray = None) -> None:
+        """Compute the on-screen line of every connection, from border to border of its two bubbles."""
+        self.drawn = 0
+        self.culled = 0
+        source, target = edges[:, 0], edges[:, 1]
+        dx = x[target] - x[source]
+        dy = y[target] - y[source]
+        length = np.hypot(dx, dy)
+        apart = length > 0
+        source, target, dx, dy, length = source[apart], target[apart], dx[apart], dy[apart], length[apart]
+        start = radius[source] / length
+        end = radius[target] / length
+        self.x1 = (x[source] + start * dx) * zoom + offset_x
+        self.y1 = (y[source] + start * dy) * zoom + offset_y
+        self.x2 = (x[target] - end * dx) * zoom + offset_x
+        self.y2 = (y[target] - end * dy) * zoom + offset_y
+        self.edges = edges[apart]
+        self.colors = (colors[apart] if colors is not None else np.zeros(len(self.edges), dtype=np.int64))
+
+    @staticmethod
+    def clip(x1: np.ndarray, y1: np.ndarray, x2: np.ndarray, y2: np.ndarray,
+             rect: pygame.Rect) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Clip segments to a rect (Liang-Barsky) and get which are visible along with their clipped ends."""
+        dx = x2 - x1
+        dy = y2 - y1
+        enter = np.zeros(len(x1))
+        leave = np.ones(len(x1))
+        visible = np.ones(len(x1), dtype=bool)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for p, q in ((-dx, x1 - rect.left), (dx, rect.right - x1), (-dy, y1 - rect.top), (dy, rect.bottom - y1)):
+                parallel = p == 0
+                visible &= ~(parallel & (q < 0))
+                ratio = q / p
+                enter = np.where(~parallel & (p < 0), np.maximum(enter, ratio), enter)
+                leave = np.where(~parallel & (p > 0), np.minimum(leave, ratio), leave)
+        visible &= enter <= leave
+        return (visible, x1 + enter * dx, y1 + enter * dy, x1 + leave * dx, y1 + leave * dy)
+
+    def draw(self, surface: pygame.Surface, region: pygame.Rect, margin: int = 8) -> None:
+        """Draw the prepared connections that cross a region one aaline call each, clipped a margin outside of it."""
+        visible, x1, y1, x2, y2 = self.clip(self.x1, self.y1, self.x2, self.y2,
+                                            region.inflate(margin * 2, margin * 2))
+        shown = np.flatnonzero(visible)
+        self.drawn += len(shown)
+        self.culled += len(visible) - len(shown)
+        self.total_drawn += len(shown)
+        self.total_culled += len(visible) - len(shown)
+        if len(shown) == 0:
+            return
+        shown = shown[np.argsort(self.colors[shown], kind="stable")]
+        groups = np.flatnonzero(np.diff(self.colors[shown], prepend=-1, append=-1))
+        points = np.stack((x1[shown], y1[shown], x2[shown], y2[shown]), axis=1).tolist()
+        # aalines only draws connected polylines, and rasterizing the segments in NumPy measured slower than aaline
+        aaline = pygame.draw.aaline
+        for start, end in zip(groups[:-1].tolist(), groups[1:].tolist()):
+            color = self.palette[self.colors[shown[start]]]
+            for line_x1, line_y1, line_x2, line_y2 in points[start:end]:
+                aaline(surface, color, (line_x1, line_y1), (line_x2, line_y2))
+
+
+def draw_edges_one_by_one(surface, x, y, radius, edges, zoom, offset_x, offset_y):
+    """Draw every connection with its own geometry and draw call, for comparison."""
+    for source, target in edges.tolist():
+        dx, dy = x[target] - x[source], y[target] - y[source]
+        length = math.hypot(dx, dy)
+        if length == 0:
+            continue
+        start = (x[source] + radius[source] / length * dx, y[source] + radius[source] / length * dy)
+        end = (x[target] - radius[target] / length * dx, y[target] - radius[target] / length * dy)
+        pygame.draw.aaline(surface, (100, 100, 100), (start[0] * zoom + offset_x, start[1] * zoom + offset_y),
+                           (end[0] * zoom + offset_x, end[1] * zoom + offset_y))
+
+
+def benchmark_edges(counts=(2000, 20000, 60000), rmin=12, rmax=100, zoom=0.5, repeats=3):
+    """Compare per-edge geometry and drawing with the clipping renderer on a map four times the size of the window."""
+    rng = np.random.default_rng(0)
+    surface = pygame.Surface((1280, 720))
+    screen = surface.get_rect()
+    for count in counts:
+        side = 2 * 1280 / zoom
+        # connected bubbles sit close together like on a map the springs have pulled together
+        x, y = rng.uniform(0, side, count), rng.uniform(0, side, count)
+        partners = rng.integers(0, count // 2, count // 2)
+        x[count // 2:] = x[partners] + rng.normal(0, 150, count - count // 2)
+        y[count // 2:] = y[partners] + rng.normal(0, 150, count - count // 2)
+        radius = rng.uniform(rmin, rmax, count)
+        edges = np.stack((partners, np.arange(count // 2, count)), axis=1)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            draw_edges_one_by_one(surface, x.tolist(), y.tolist(), radius.tolist(), edges, zoom, -side / 4, -side / 4)
+        one_by_one = (time.perf_counter() - start) / repeats
+        renderer = EdgeRenderer()
+        start = time.perf_counter()
+        for _ in range(repeats):
+            renderer.prepare(x, y, radius, edges, zoom, -side / 4, -side / 4)
+            renderer.draw(surface, screen)
+        clipped = (time.perf_counter() - start) / repeats
+        print(f"{len(edges):>6} edges: one by one {one_by_one * 1000:8.2f} ms, clipped {clipped * 1000:8.2f} ms, "
+              f"{renderer.drawn} drawn, {renderer.culled} culled")
+
+
+if __name__ == "__main__":
+    benchmark_edges()
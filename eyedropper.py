@@ -0,0 +1,178 @@
+import tkinter
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageTk
+
+
+class MssScreen:
+    """Screen source that keeps one mss grabber open instead of setting one up for every sample."""
+
+    def __init__(self):
+        import mss
+        self.grabber = mss.mss()
+
+    def bounds(self) -> Tuple[int, int, int, int]:
+        """Get left, top, width and height of the area spanning all monitors."""
+        monitor = self.grabber.monitors[0]
+        return monitor["left"], monitor["top"], monitor["width"], monitor["height"]
+
+    def grab(self, left: int, top: int, width: int, height: int) -> np.ndarray:
+        """Get the RGB pixels of a screen region as a height x width x 3 array."""
+        shot = self.grabber.grab({"left": left, "top": top, "width": width, "height": height})
+        return np.frombuffer(shot.bgra, dtype=np.uint8).reshape(height, width, 4)[:, :, 2::-1]
+
+    def close(self) -> None:
+        """Release the grabber."""
+        self.grabber.close()
+
+
+class ArrayScreen:
+    """Screen source that shows an array, e.g. to check the sampling without a display."""
+
+    def __init__(self, pixels: np.ndarray, left: int = 0, top: int = 0):
+        self.pixels = pixels
+        self.left = left
+        self.top = top
+        self.grabs = 0
+        self.closed = False
+
+    def bounds(self) -> Tuple[int, int, int, int]:
+        """Get left, top, width and height of the array on the fake screen."""
+        return self.left, self.top, self.pixels.shape[1], self.pixels.shape[0]
+
+    def grab(self, left: int, top: int, width: int, height: int) -> np.ndarray:
+        """Get the pixels of a region of the array."""
+        self.grabs += 1
+        return self.pixels[top - self.top:top - self.top + height, left - self.left:left - self.left + width, :3]
+
+    def close(self) -> None:
+        self.closed = True
+
+
+class ScreenSampler:
+    """Grabs a small square around the pointer into a reused buffer and reads the color under it."""
+
+    def __init__(self, source, radius: int = 5):
+        """
+        Screen sampler
+
+        Args:
+            source: Screen source with bounds, grab and close, see MssScreen
+            radius: Number of pixels grabbed on every side of the pointer
+        """
+        self.source = source
+        self.radius = radius
+        self.size = radius * 2 + 1
+        self.buffer = np.zeros((self.size, self.size, 3), dtype=np.uint8)
+        self.bounds = source.bounds()
+        self.color = (255, 255, 255)
+
+    def sample(self, x: int, y: int) -> Tuple[int, int, int]:
+        """Grab the square around a screen position, kept inside the screen, and get the color at the position."""
+        left, top, width, height = self.bounds
+        x = min(max(x, left), left + width - 1)
+        y = min(max(y, top), top + height - 1)
+        region_left = min(max(x - self.radius, left), left + width - self.size)
+        region_top = min(max(y - self.radius, top), top + height - self.size)
+        self.buffer[...] = self.source.grab(region_left, region_top, self.size, self.size)
+        self.color = tuple(self.buffer[y - region_top, x - region_left].tolist())
+        return self.color
+
+    def magnified(self, zoom: int) -> np.ndarray:
+        """Get the buffer scaled up by zoom with the pixel in the middle outlined."""
+        pixels = np.repeat(np.repeat(self.buffer, zoom, axis=0), zoom, axis=1)
+        start, end = self.radius * zoom, (self.radius + 1) * zoom - 1
+        outline = 255 if sum(self.buffer[self.radius, self.radius].tolist()) < 384 else 0
+        pixels[start:end + 1, [start, end]] = outline
+        pixels[[start, end], start:end + 1] = outline
+        return pixels
+
+    def close(self) -> None:
+        """Release the screen source."""
+        self.source.close()
+
+
+class Eyedropper:
+    """Live eyedropper that follows the pointer with a magnified preview and picks the color on a click anywhere."""
+
+    def __init__(self, master, on_pick: Callable[[Tuple[int, int, int]], None], source=None,
+                 on_close: Optional[Callable] = None, radius: int = 5, zoom: int = 10, refresh_rate: int = 60):
+        """
+        Eyedropper
+
+        Args:
+            master: Tk widget the preview window belongs to
+            on_pick: Called with the RGB color under the pointer when the user clicks
+            source: Screen source, a new MssScreen when it is None
+            on_close: Called once the eyedropper is torn down, after a pick or a cancel
+            radius: Number of pixels shown on every side of the pointer
+            zoom: Size of one screen pixel in the preview
+            refresh_rate: Samples per second
+        """
+        self.master = master
+        self.on_pick = on_pick
+        self.on_close = on_close
+        self.zoom = zoom
+        self.frame_ms = max(1, 1000 // refresh_rate)
+        self.sampler = ScreenSampler(MssScreen() if source is None else source, radius)
+        preview_size = self.sampler.size * zoom
+        self.window = tkinter.Toplevel(master)
+        self.window.overrideredirect(True)
+        self.window.attributes("-topmost", True)
+        self.photo = ImageTk.PhotoImage("RGB", (preview_size, preview_size), master=self.window)
+        tkinter.Label(self.window, image=self.photo, borderwidth=1, relief="solid").pack()
+        self.window.bind("<Button-1>", self.pick)
+        self.window.bind("<Button-3>", self.cancel)
+        self.window.bind("<Escape>", self.cancel)
+        self.job = None
+        self.tick()
+        self.window.wait_visibility()
+        try:
+            # clicks outside of the app only reach the eyedropper through a global grab
+            self.window.grab_set_global()
+        except tkinter.TclError:
+            self.window.grab_set()
+        self.window.focus_force()
+
+    def tick(self) -> None:
+        """Sample around the pointer, redraw the preview next to it and schedule the next sample."""
+        x, y = self.window.winfo_pointerxy()
+        self.sampler.sample(x, y)
+        self.photo.paste(Image.fromarray(self.sampler.magnified(self.zoom)))
+        left, top, width, height = self.sampler.bounds
+        offset = 24
+        preview_size = self.sampler.size * self.zoom + 2
+        # the preview stays beside the pointer so it never samples itself
+        preview_x = x + offset if x + offset + preview_size <= left + width else x - offset - preview_size
+        preview_y = y + offset if y + offset + preview_size <= top + height else y - offset - preview_size
+        self.window.geometry(f"+{preview_x}+{preview_y}")
+        self.job = self.window.after(self.frame_ms, self.tick)
+
+    def pick(self, event=None) -> None:
+        """Take the color under the pointer and close."""
+        color = self.sampler.sample(*self.window.winfo_pointerxy())
+        self.close()
+        self.on_pick(color)
+
+    def cancel(self, event=None) -> None:
+        """Close without picking."""
+        self.close()
+
+    def close(self) -> None:
+        """Stop sampling, release the grab and the grabber and remove the preview, safe to call twice."""
+        if self.window is None:
+            return
+        if self.job is not None:
+            self.window.after_cancel(self.job)
+            self.job = None
+        self.window.grab_release()
+        self.window.destroy()
+        self.window = None
+        self.sampler.close()
+        if self.on_close is not None:
+            self.on_close()
+
+
+if __name__ == "__main__":
+    print("This file isn't intended to be run directly.")
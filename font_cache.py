@@ -0,0 +1,78 @@
+import collections
+import math
+import os
+from typing import Optional
+
+import pygame
+
+
+class FontCache:
+    """Hands out shared pygame fonts for a quantized ladder of sizes."""
+
+    def __init__(self, name: Optional[str] = None, capacity: int = 48, exact_below: int = 16, step: float = 1.08):
+        """
+        Font cache
+
+        Args:
+            name: System font name, None for the pygame default font
+            capacity: Number of font sizes kept before the least recently used one is evicted
+            exact_below: Sizes up to this value are kept exact, larger ones are snapped to the ladder
+            step: Growth factor between two neighbouring ladder sizes
+        """
+        self.font_file = self.resolve_font_file(name)
+        self.capacity = max(1, capacity)
+        self.exact_below = max(1, exact_below)
+        self.step = max(1.01, step)
+        self.fonts = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def resolve_font_file(name: Optional[str]) -> Optional[str]:
+        """Look up the font file once so creating a size never touches the system font list."""
+        if name:
+            return pygame.font.match_font(name)
+        default_font = os.path.join(os.path.dirname(pygame.__file__), pygame.font.get_default_font())
+        return default_font if os.path.exists(default_font) else None
+
+    def snap(self, size: int) -> int:
+        """Snap a font size to the nearest ladder size."""
+        size = max(1, int(size))
+        if size <= self.exact_below:
+            return size
+        rung = round(math.log(size / self.exact_below, self.step))
+        return max(self.exact_below, int(round(self.exact_below * self.step ** rung)))
+
+    def get(self, size: int) -> pygame.font.Font:
+        """Get the shared font for the ladder size closest to size."""
+        size = self.snap(size)
+        font = self.fonts.get(size)
+        if font is not None:
+            self.hits += 1
+            self.fonts.move_to_end(size)
+            return font
+        self.misses += 1
+        font = pygame.font.Font(self.font_file, size)
+        self.fonts[size] = font
+        if len(self.fonts) > self.capacity:
+            self.fonts.popitem(last=False)
+        return font
+
+    def fit_size(self, lines, extent: float, line_spacing: float = 0.8, reference_size: int = 64) -> float:
+        """Get the font size at which the widest line or the stacked lines, whichever is larger, span extent."""
+        if not lines:
+            return extent
+        reference_size = self.snap(reference_size)
+        font = self.get(reference_size)
+        width = max(font.size(line)[0] for line in lines) / reference_size
+        height = len(lines) * line_spacing
+        # leave room for get() snapping the size up to the nearest ladder size
+        return extent / max(width, height) / math.sqrt(self.step)
+
+    def clear(self) -> None:
+        """Drop all cached fonts."""
+        self.fonts.clear()
+
+
+if __name__ == "__main__":
+    print("This file isn't intended to be run directly.")
@@ -0,0 +1,88 @@
+import queue
+import time
+
+import pygame
+
+WAKE_EVENT = pygame.event.custom_type()
+
+
+def wake() -> None:
+    """Wake the main loop from another thread, e.g. after queueing work for it."""
+    try:
+        pygame.event.post(pygame.event.Event(WAKE_EVENT))
+    except pygame.error:
+        # the window is closed or not open yet, so nobody is waiting
+        pass
+
+
+class WakeQueue(queue.Queue):
+    """Queue that wakes the main loop whenever something is put into it."""
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        wake()
+
+
+class FrameScheduler:
+    """Paces the main loop and blocks on the event queue while nothing moves."""
+
+    def __init__(self, active_fps: int = 120, idle_fps: int = 10, idle_after: float = 1.0,
+                 sleep_after: float = 20.0):
+        """
+        Frame scheduler
+
+        Args:
+            active_fps: Frame rate while the user interacts or something moves
+            idle_fps: Frame rate while the map is still, the loop blocks on events in between
+            idle_after: Seconds without events or movement after which the loop goes idle
+            sleep_after: Seconds without events after which the loop sleeps until the next event
+        """
+        self.active_fps = active_fps
+        self.idle_fps = idle_fps
+        self.idle_after = idle_after
+        self.sleep_after = sleep_after
+        self.clock = pygame.time.Clock()
+        self.last_event = time.perf_counter()
+        self.last_busy = self.last_event
+        self.mode = "active"
+        self.frames = {"active": 0, "idle": 0, "sleep": 0}
+        self.waited_seconds = 0.0
+
+    def keep_busy(self, busy: bool) -> None:
+        """Tell the scheduler whether the last frame moved or repainted anything."""
+        if busy:
+            self.last_busy = time.perf_counter()
+
+    def choose_mode(self, now: float) -> str:
+        """Get the mode by the wall time since the last event and the last busy frame."""
+        last_activity = max(self.last_event, self.last_busy)
+        # sleeping blocks until the next event, so nothing may still be moving or loading
+        if now - last_activity >= self.sleep_after:
+            return "sleep"
+        if now - last_activity < self.idle_after:
+            return "active"
+        return "idle"
+
+    def wait(self) -> list:
+        """Wait until the next frame is due and get the events that arrived meanwhile."""
+        start = time.perf_counter()
+        previous_mode = self.mode
+        self.mode = self.choose_mode(start)
+        if self.mode == "active" or (self.mode == "sleep" and previous_mode != "sleep"):
+            # the first sleeping frame returns at once so the battery saving screen gets drawn
+            self.clock.tick(self.active_fps)
+            events = pygame.event.get()
+        else:
+            timeout = 0 if self.mode == "sleep" else max(1, 1000 // self.idle_fps)
+            event = pygame.event.wait(timeout)
+            events = [] if event.type == pygame.NOEVENT else [event, *pygame.event.get()]
+        now = time.perf_counter()
+        self.waited_seconds += now - start
+        self.frames[self.mode] += 1
+        if events:
+            self.last_event = now
+        return events
+
+
+if __name__ == "__main__":
+    print("This file isn't intended to be run directly.")
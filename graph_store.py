@@ -0,0 +1,218 @@
+import time
+from typing import Iterator, Tuple
+
+import numpy as np
+
+
+class GraphStore:
+    """Directed connections between stable bubble ids, with forward and reverse adjacency."""
+
+    def __init__(self, capacity: int = 64):
+        """
+        Graph store
+
+        Args:
+            capacity: Number of connections allocated up front
+        """
+        # dicts with None values serve as insertion-ordered sets, so iteration order is stable
+        self.successors_of = {}
+        self.predecessors_of = {}
+        self.slots = {}
+        self.pairs = np.zeros((capacity, 2), dtype=np.int64)
+        self.count = 0
+        self.version = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, pair: Tuple[int, int]) -> bool:
+        self.build_index()
+        return pair in self.slots
+
+    def contains(self, source: int, target: int) -> bool:
+        """Check whether source is connected to target."""
+        self.build_index()
+        return (source, target) in self.slots
+
+    def connect(self, source: int, target: int) -> bool:
+        """Connect source to target unless they are already connected or the same."""
+        self.build_index()
+        if source == target or (source, target) in self.slots:
+            return False
+        if self.count == len(self.pairs):
+            pairs = np.zeros((max(64, len(self.pairs) * 2), 2), dtype=np.int64)
+            pairs[:self.count] = self.pairs[:self.count]
+            self.pairs = pairs
+        self.pairs[self.count] = (source, target)
+        self.slots[(source, target)] = self.count
+        self.count += 1
+        self.successors_of.setdefault(source, {})[target] = None
+        self.predecessors_of.setdefault(target, {})[source] = None
+        self.version += 1
+        return True
+
+    def connect_many(self, sources: np.ndarray, targets: np.ndarray) -> int:
+        """
+        Add many connections at once, skipping duplicates and self-connections, and get how many were new.
+
+        While the adjacency isn't built yet only the packed id array is filled, the adjacency is built on first use.
+        """
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        keep = sources != targets
+        sources, targets = sources[keep], targets[keep]
+        if len(sources) == 0:
+            return 0
+        stored = self.pairs[:self.count]
+        stride = max(int(targets.max()), int(stored[:, 1].max()) if self.count else 0) + 1
+        keys = np.unique(sources * stride + targets)
+        if self.count and self.slots is None:
+            keys = keys[~np.isin(keys, stored[:, 0] * stride + stored[:, 1])]
+        pairs = np.stack((keys // stride, keys % stride), axis=1)
+        if self.count and self.slots is not None:
+            pairs = pairs[[pair not in self.slots for pair in map(tuple, pairs.tolist())]]
+        count = len(pairs)
+        if count == 0:
+            return 0
+        if self.count + count > len(self.pairs):
+            grown = np.zeros((max(64, len(self.pairs) * 2, self.count + count), 2), dtype=np.int64)
+            grown[:self.count] = self.pairs[:self.count]
+            self.pairs = grown
+        self.pairs[self.count:self.count + count] = pairs
+        if self.slots is not None and self.count:
+            self.index_pairs(pairs.tolist(), self.count)
+        elif not self.count:
+            self.slots = None
+        self.count += count
+        self.version += 1
+        return count
+
+    def build_index(self) -> None:
+        """Build the pair slots and adjacency dicts if connect_many left them out."""
+        if self.slots is None:
+            self.slots = {}
+            self.successors_of = {}
+            self.predecessors_of = {}
+            self.index_pairs(self.pairs[:self.count].tolist(), 0)
+
+    def index_pairs(self, pairs: list, first_slot: int) -> None:
+        """Add pairs stored from first_slot on to the slots and adjacency dicts."""
+        successors_of = self.successors_of
+        predecessors_of = self.predecessors_of
+        self.slots.update(zip(map(tuple, pairs), range(first_slot, first_slot + len(pairs))))
+        for source, target in pairs:
+            successors = successors_of.get(source)
+            if successors is None:
+                successors = successors_of[source] = {}
+            successors[target] = None
+            predecessors = predecessors_of.get(target)
+            if predecessors is None:
+                predecessors = predecessors_of[target] = {}
+            predecessors[source] = None
+
+    def disconnect(self, source: int, target: int) -> bool:
+        """Remove the connection from source to target, moving the last connection into its slot."""
+        self.build_index()
+        slot = self.slots.pop((source, target), None)
+        if slot is None:
+            return False
+        self.count -= 1
+        if slot != self.count:
+            last = self.pairs[self.count]
+            self.pairs[slot] = last
+            self.slots[(int(last[0]), int(last[1]))] = slot
+        del self.successors_of[source][target]
+        del self.predecessors_of[target][source]
+        self.version += 1
+        return True
+
+    def successors(self, source: int) -> Iterator[int]:
+        """Iterate over the ids source is connected to."""
+        self.build_index()
+        return iter(self.successors_of.get(source, ()))
+
+    def predecessors(self, target: int) -> Iterator[int]:
+        """Iterate over the ids connected to target."""
+        self.build_index()
+        return iter(self.predecessors_of.get(target, ()))
+
+    def degree(self, node: int) -> int:
+        """Get the number of connections from and to a node."""
+        self.build_index()
+        return len(self.successors_of.get(node, ())) + len(self.predecessors_of.get(node, ()))
+
+    def remove_node(self, node: int) -> int:
+        """Remove every connection from and to a node and get their number."""
+        removed = 0
+        for target in list(self.successors(node)):
+            removed += self.disconnect(node, target)
+        for source in list(self.predecessors(node)):
+            removed += self.disconnect(source, node)
+        self.successors_of.pop(node, None)
+        self.predecessors_of.pop(node, None)
+        return removed
+
+    def remove_nodes(self, nodes: np.ndarray) -> int:
+        """Remove every connection from and to many nodes at once and get their number."""
+        stored = self.pairs[:self.count]
+        keep = ~(np.isin(stored[:, 0], nodes) | np.isin(stored[:, 1], nodes))
+        removed = self.count - int(np.count_nonzero(keep))
+        if removed:
+            kept = stored[keep]
+            self.count = len(kept)
+            self.pairs[:self.count] = kept
+            self.slots = None
+            self.version += 1
+        return removed
+
+    def clear_successors(self, source: int) -> None:
+        """Remove every connection from source."""
+        for target in list(self.successors(source)):
+            self.disconnect(source, target)
+
+    def edges(self) -> Iterator[Tuple[int, int]]:
+        """Iterate over all (source id, target id) connections."""
+        self.build_index()
+        return iter(self.slots)
+
+    def edge_ids(self) -> np.ndarray:
+        """Get the (source id, target id) array of all connections, in no particular order."""
+        return self.pairs[:self.count]
+
+
+def benchmark_graph(nodes=10000, edges=50000, hub_links=1000, repeats=1000):
+    """Time connect, contains and hub removal against scanning an edge array and adjacency lists."""
+    rng = np.random.default_rng(0)
+    graph = GraphStore()
+    pairs = rng.integers(0, nodes, (edges, 2))
+    start = time.perf_counter()
+    for source, target in pairs.tolist():
+        graph.connect(source, target)
+    for target in range(1, hub_links + 1):
+        graph.connect(0, target)
+        graph.connect(target, 0)
+    print(f"{len(graph)} connections built in {(time.perf_counter() - start) * 1000:.1f} ms")
+    queries = rng.integers(0, nodes, (repeats, 2)).tolist()
+    start = time.perf_counter()
+    for source, target in queries:
+        graph.contains(source, target)
+    per_query = (time.perf_counter() - start) / repeats
+    edge_array = graph.edge_ids().copy()
+    start = time.perf_counter()
+    for source, target in queries[:100]:
+        bool(np.any((edge_array[:, 0] == source) & (edge_array[:, 1] == target)))
+    per_scan = (time.perf_counter() - start) / 100
+    hub_list = list(graph.successors(0))
+    start = time.perf_counter()
+    for source, target in queries:
+        target in hub_list
+    per_list = (time.perf_counter() - start) / repeats
+    print(f"contains: {per_query * 1e6:.2f} us, edge array scan: {per_scan * 1e6:.2f} us, "
+          f"hub list scan: {per_list * 1e6:.2f} us")
+    start = time.perf_counter()
+    removed = graph.remove_node(0)
+    print(f"removing the hub and its {removed} connections: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    benchmark_graph()
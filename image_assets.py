@@ -0,0 +1,135 @@
+import os
+import time
+from typing import Callable, Tuple
+
+import customtkinter
+import numpy as np
+from PIL import Image, ImageTk
+
+PATH = os.path.dirname(os.path.realpath(__file__))
+
+
+class ImageAssets:
+    """Decodes every dialog image once and shares its resized variants, PhotoImages and CTkImages."""
+
+    def __init__(self, path: str = PATH, resample=Image.Resampling.LANCZOS):
+        """
+        Image asset manager
+
+        Args:
+            path: Folder the image files are loaded from
+            resample: PIL filter used for resized variants
+        """
+        self.path = path
+        self.resample = resample
+        self.images = {}
+        self.resized_images = {}
+        self.arrays = {}
+        self.derived_data = {}
+        self.photo_images = {}
+        self.ctk_images = {}
+        # PhotoImages belong to one Tcl interpreter, so they are dropped when a new root shows up
+        self.interpreter = None
+        self.hits = 0
+        self.misses = 0
+
+    def image(self, name: str) -> Image.Image:
+        """Get the decoded RGBA image of a file, decoding it only on the first call."""
+        image = self.images.get(name)
+        if image is None:
+            with Image.open(os.path.join(self.path, name)) as file:
+                image = file.convert("RGBA")
+            self.images[name] = image
+        return image
+
+    def resized(self, name: str, size: Tuple[int, int]) -> Image.Image:
+        """Get an image resized to size in pixels, which already includes the window scaling."""
+        key = (name, tuple(size))
+        image = self.resized_images.get(key)
+        if image is not None:
+            self.hits += 1
+            return image
+        self.misses += 1
+        image = self.image(name).resize(key[1], self.resample)
+        self.resized_images[key] = image
+        return image
+
+    def array(self, name: str, size: Tuple[int, int]) -> np.ndarray:
+        """Get an image resized to size as a read-only height x width x 4 array."""
+        key = (name, tuple(size))
+        array = self.arrays.get(key)
+        if array is None:
+            array = np.asarray(self.resized(name, size))
+            self.arrays[key] = array
+        return array
+
+    def derived(self, name: str, size: Tuple[int, int], build: Callable):
+        """Get what build makes from the array of an image at size, building it once per image, size and function."""
+        key = (name, tuple(size), build)
+        data = self.derived_data.get(key)
+        if data is None:
+            data = build(self.array(name, size))
+            self.derived_data[key] = data
+        return data
+
+    def use_interpreter(self, master) -> None:
+        """Drop the Tk bound images when they were made for another interpreter than the one of master."""
+        interpreter = master.tk if master is not None else None
+        if interpreter is not self.interpreter:
+            self.photo_images.clear()
+            self.ctk_images.clear()
+            self.interpreter = interpreter
+
+    def photo(self, name: str, size: Tuple[int, int], master=None) -> ImageTk.PhotoImage:
+        """Get a shared PhotoImage of an image resized to size."""
+        self.use_interpreter(master)
+        key = (name, tuple(size))
+        photo = self.photo_images.get(key)
+        if photo is None:
+            photo = ImageTk.PhotoImage(self.resized(name, size), master=master)
+            self.photo_images[key] = photo
+        return photo
+
+    def ctk_image(self, name: str, size: Tuple[int, int], master=None) -> customtkinter.CTkImage:
+        """Get a shared CTkImage that shows an image at size, customtkinter scales it to the window itself."""
+        self.use_interpreter(master)
+        key = (name, tuple(size))
+        image = self.ctk_images.get(key)
+        if image is None:
+            image = customtkinter.CTkImage(light_image=self.image(name), dark_image=self.image(name), size=key[1])
+            self.ctk_images[key] = image
+        return image
+
+    def clear(self) -> None:
+        """Drop all decoded and resized images."""
+        self.images.clear()
+        self.resized_images.clear()
+        self.arrays.clear()
+        self.derived_data.clear()
+        self.photo_images.clear()
+        self.ctk_images.clear()
+        self.interpreter = None
+
+
+shared = ImageAssets()
+
+
+def benchmark_assets(names=("color_wheel.png", "target.png"), sizes=(200, 20), opens=50):
+    """Compare decoding and resizing the color picker images on every open with taking them from the manager."""
+    start = time.perf_counter()
+    for _ in range(opens):
+        for name, size in zip(names, sizes):
+            Image.open(os.path.join(PATH, name)).resize((size, size), Image.Resampling.LANCZOS)
+    every_open = (time.perf_counter() - start) / opens
+    assets = ImageAssets()
+    start = time.perf_counter()
+    for _ in range(opens):
+        for name, size in zip(names, sizes):
+            assets.resized(name, (size, size))
+    shared_images = (time.perf_counter() - start) / opens
+    print(f"color picker images per open: {every_open * 1000:.2f} ms decoded and resized, "
+          f"{shared_images * 1000:.3f} ms from the asset manager")
+
+
+if __name__ == "__main__":
+    benchmark_assets()
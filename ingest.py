@@ -0,0 +1,186 @@
+import collections
+import math
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+import bubble_store
+import frame_scheduler
+import text_cache
+
+GOLDEN_ANGLE = math.pi * (3 - math.sqrt(5))
+
+
+class BubbleIngest:
+    """Takes bubbles and connections in batches from any thread and adds them to the store within a frame budget."""
+
+    def __init__(self, max_pending: int = 50000, frame_budget: float = 0.004, chunk_size: int = 256,
+                 radius: float = 24, spacing: float = 80.0, center: tuple = (0.0, 0.0)):
+        """
+        Bubble ingest
+
+        Args:
+            max_pending: Number of waiting bubbles above which submit blocks until the main loop caught up
+            frame_budget: Most seconds drain spends per frame, checked after every chunk
+            chunk_size: Number of bubbles added to the store at once
+            radius: Radius of bubbles that don't bring their own
+            spacing: Distance between neighbours on the spiral bubbles without a position are seeded on
+            center: World position the seeding spiral starts at
+        """
+        self.max_pending = max_pending
+        self.frame_budget = frame_budget
+        self.chunk_size = max(1, chunk_size)
+        self.radius = radius
+        self.spacing = spacing
+        self.center = center
+        self.batches = collections.deque()
+        self.condition = threading.Condition()
+        self.pending = 0
+        self.seeded = 0
+        self.added = 0
+        self.drain_seconds = 0.0
+
+    def seed(self, count: int) -> tuple:
+        """Get the next count positions on a sunflower spiral, so seeded bubbles start evenly spread around center."""
+        with self.condition:
+            start = self.seeded
+            self.seeded += count
+        index = np.arange(start, start + count)
+        distance = self.spacing * np.sqrt(index + 0.5)
+        angle = index * GOLDEN_ANGLE
+        return self.center[0] + distance * np.cos(angle), self.center[1] + distance * np.sin(angle)
+
+    def prepare(self, bubbles: list, edges) -> dict:
+        """Turn a batch into columns, wrapping the text and seeding missing positions on the calling thread."""
+        count = len(bubbles)
+        x = np.array([bubble.get("x", math.nan) for bubble in bubbles], dtype=float)
+        y = np.array([bubble.get("y", math.nan) for bubble in bubbles], dtype=float)
+        missing = np.flatnonzero(np.isnan(x) | np.isnan(y))
+        if len(missing):
+            x[missing], y[missing] = self.seed(len(missing))
+        radius = np.array([bubble.get("radius", self.radius) for bubble in bubbles], dtype=float)
+        fields = []
+        for bubble in bubbles:
+            name = bubble["name"]
+            lines = name.split("\n") if isinstance(name, str) else list(name)
+            fields.append({"name": lines, "color": tuple(bubble.get("color", (255, 255, 255))),
+                           "text_alignment": bubble.get("text_alignment", "center"), "font_size": None,
+                           "rendered_lines": text_cache.wrap_name(lines), "text_surface": None})
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        if len(edges) and (edges.min() < 0 or edges.max() >= count):
+            raise ValueError("connections must be pairs of indices into the bubbles of their batch")
+        return {"x": x, "y": y, "radius": radius, "fields": fields, "edges": edges,
+                "ids": np.zeros(count, dtype=np.int64), "done": 0}
+
+    def submit(self, bubbles: list, edges=(), timeout: Optional[float] = None) -> None:
+        """
+        Queue a batch from any thread, blocking while more than max_pending bubbles wait.
+
+        Args:
+            bubbles: Dicts with a name, given as a string or a list of lines, and optionally x, y, radius, color and
+                text_alignment, bubbles without x or y are seeded on a spiral
+            edges: (source, target) pairs of indices into bubbles
+            timeout: Most seconds to wait for room, queue.Full is raised after that
+        """
+        batch = self.prepare(bubbles, edges)
+        count = len(bubbles)
+        with self.condition:
+            # a batch larger than max_pending still goes in once nothing else waits
+            if not self.condition.wait_for(lambda: self.pending == 0 or self.pending + count <= self.max_pending,
+                                           timeout):
+                raise queue.Full
+            self.batches.append(batch)
+            self.pending += count
+        frame_scheduler.wake()
+
+    def empty(self) -> bool:
+        """Check whether no batch waits."""
+        return not self.batches
+
+    def drain(self, store, fit: Callable, journal=None, on_added: Optional[Callable] = None) -> int:
+        """
+        Add waiting bubbles to the store in chunks until the frame budget is used up and get their number.
+
+        Args:
+            store: The bubble store to add to
+            fit: Gets the wrapped lines and the radius of a bubble and returns its font size, called on this thread
+            journal: Optional journal or world every new bubble and connection is recorded in
+            on_added: Optional follow-up work on the views of every added chunk, e.g. prewarming their sprites, which
+                counts towards the frame budget
+        """
+        start = time.perf_counter()
+        added = 0
+        while self.batches and time.perf_counter() - start < self.frame_budget:
+            batch = self.batches[0]
+            rows = slice(batch["done"], min(batch["done"] + self.chunk_size, len(batch["fields"])))
+            fields = batch["fields"][rows]
+            for bubble, radius in zip(fields, batch["radius"][rows].tolist()):
+                bubble["font_size"] = fit(bubble["rendered_lines"], radius)
+            views = store.add_many(batch["x"][rows], batch["y"][rows], batch["radius"][rows], fields)
+            batch["ids"][rows] = [view.id for view in views]
+            batch["done"] = rows.stop
+            if journal is not None:
+                for view in views:
+                    journal.record_add(view)
+            if on_added is not None:
+                on_added(views)
+            if batch["done"] == len(batch["fields"]):
+                self.connect(store, batch, journal)
+                self.batches.popleft()
+            added += len(views)
+            with self.condition:
+                self.pending -= len(views)
+                self.condition.notify_all()
+        self.added += added
+        self.drain_seconds += time.perf_counter() - start
+        return added
+
+    @staticmethod
+    def connect(store, batch: dict, journal=None) -> None:
+        """Add the connections of a batch once all of its bubbles are in the store."""
+        if len(batch["edges"]) == 0:
+            return
+        # bubbles of a streamed world may have been evicted already, their connections are dropped with them
+        sources = batch["ids"][batch["edges"][:, 0]]
+        targets = batch["ids"][batch["edges"][:, 1]]
+        loaded = (store.row_of[sources] >= 0) & (store.row_of[targets] >= 0)
+        store.connect_many(sources[loaded], targets[loaded])
+        if journal is not None:
+            for source, target in zip(sources[loaded].tolist(), targets[loaded].tolist()):
+                journal.record_connect(store.view_of(source), store.view_of(target))
+
+
+def benchmark_ingest(counts=(10000, 100000), batch_size=1000, connections_per_bubble=1, frame=1 / 120):
+    """Feed random batches from a producer thread and drain them frame by frame like the main loop."""
+    rng = np.random.default_rng(0)
+    for count in counts:
+        store = bubble_store.BubbleStore(220.0)
+        bubble_ingest = BubbleIngest()
+        names = [f"generated bubble {index} with a name long enough to be wrapped onto a second line"
+                 for index in range(count)]
+        edges = rng.integers(batch_size, size=(batch_size * connections_per_bubble, 2))
+
+        def produce():
+            for offset in range(0, count, batch_size):
+                bubble_ingest.submit([{"name": name} for name in names[offset:offset + batch_size]], edges)
+
+        start = time.perf_counter()
+        producer = threading.Thread(target=produce)
+        producer.start()
+        frames = 0
+        while len(store) < count:
+            frame_start = time.perf_counter()
+            bubble_ingest.drain(store, lambda lines, radius: radius)
+            frames += 1
+            time.sleep(max(0.0, frame - (time.perf_counter() - frame_start)))
+        producer.join()
+        elapsed = time.perf_counter() - start
+        print(f"{count:>7} bubbles + {len(store.graph)} connections: {elapsed:6.2f} s over {frames} frames, "
+              f"{bubble_ingest.drain_seconds / frames * 1000:.2f} ms of drain per frame")
+
+
+if __name__ == "__main__":
+    benchmark_ingest()
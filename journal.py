@@ -0,0 +1,266 @@
+import json
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+import map_file
+
+
+class Journal:
+    """Append-only log of map edits, written and synced in batches by a background thread and compacted into a snapshot."""
+
+    def __init__(self, path: str, snapshot_path: str, flush_interval: float = 0.5, compact_after: int = 2000,
+                 position_interval: float = 10.0):
+        """
+        Journal
+
+        Args:
+            path: Path of the journal file, one JSON operation per line
+            snapshot_path: Path of the map file the journal is compacted into
+            flush_interval: Most seconds a record waits before it is written and synced with the ones after it
+            compact_after: Number of records after which compact_if_due writes a new snapshot
+            position_interval: Most seconds between logging the positions physics and the layout keep changing
+        """
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.flush_interval = flush_interval
+        self.compact_after = compact_after
+        self.records = queue.Queue()
+        # records come from the tkinter and the main thread, compactions reset the count on the main thread
+        self.pending_lock = threading.Lock()
+        self.pending = 0
+        self.position_interval = position_interval
+        self.positions_at = time.perf_counter()
+        self.was_settled = True
+        # last logged position of every bubble id, nan for ids whose position was never logged
+        self.logged_x = np.zeros(0)
+        self.logged_y = np.zeros(0)
+        self.thread = None
+        self.file = None
+        self.written = 0
+        self.syncs = 0
+        self.compactions = 0
+        self.recovery_seconds = 0.0
+
+    def record(self, operation: str, **values) -> None:
+        """Queue one operation for the writer thread, safe to call from any thread."""
+        self.records.put(json.dumps({"op": operation, **values}, ensure_ascii=False, separators=(",", ":")) + "\n")
+        with self.pending_lock:
+            self.pending += 1
+
+    def record_add(self, view) -> None:
+        """Log a new bubble with everything needed to create it again."""
+        self.record("add", id=view.id, x=view["x"], y=view["y"], radius=view["radius"], name=view["name"],
+                    color=view["color"], alignment=view["text_alignment"])
+        self.remember_position(view)
+
+    def record_edit(self, view) -> None:
+        """Log the fields of a bubble changed in the edit menu."""
+        self.record("edit", id=view.id, radius=view["radius"], name=view["name"], color=view["color"],
+                    alignment=view["text_alignment"])
+
+    def record_move(self, view) -> None:
+        """Log where a bubble was dropped."""
+        self.record("move", id=view.id, x=view["x"], y=view["y"])
+        self.remember_position(view)
+
+    def record_connect(self, source, target) -> None:
+        """Log a new connection."""
+        self.record("connect", source=source.id, target=target.id)
+
+    def grow_logged(self, size: int) -> None:
+        """Make room for the logged positions of ids below size."""
+        if size > len(self.logged_x):
+            size = max(64, len(self.logged_x) * 2, size)
+            self.logged_x = np.concatenate((self.logged_x, np.full(size - len(self.logged_x), np.nan)))
+            self.logged_y = np.concatenate((self.logged_y, np.full(size - len(self.logged_y), np.nan)))
+
+    def remember_position(self, view) -> None:
+        """Note the position of a bubble as logged."""
+        self.grow_logged(view.id + 1)
+        self.logged_x[view.id] = view["x"]
+        self.logged_y[view.id] = view["y"]
+
+    def remember_positions(self, store) -> None:
+        """Note the position of every bubble in the store as logged, after a snapshot or a recovery."""
+        self.grow_logged(store.next_id)
+        ids = store.ids[:len(store)]
+        self.logged_x[ids] = store.x[:len(store)]
+        self.logged_y[ids] = store.y[:len(store)]
+
+    def record_positions(self, store, tolerance: float = 0.5) -> int:
+        """Log the bubbles that moved by more than tolerance since their last logged position and get their number."""
+        count = len(store)
+        self.grow_logged(store.next_id)
+        ids = store.ids[:count]
+        x, y = store.x[:count], store.y[:count]
+        # nan positions never compare as close, so bubbles that were never logged count as moved
+        moved = ~((np.abs(self.logged_x[ids] - x) <= tolerance) & (np.abs(self.logged_y[ids] - y) <= tolerance))
+        ids, x, y = ids[moved], x[moved], y[moved]
+        if len(ids) >= self.compact_after:
+            # a snapshot is smaller and faster to recover than a record with most positions
+            self.compact(store)
+        elif len(ids):
+            self.record("moves", ids=ids.tolist(), x=x.tolist(), y=y.tolist())
+            self.logged_x[ids] = x
+            self.logged_y[ids] = y
+        return len(ids)
+
+    def record_positions_if_due(self, store, settled: bool) -> int:
+        """Log moved positions once the layout settles and every position_interval seconds while it keeps moving."""
+        now = time.perf_counter()
+        if self.was_settled and not settled:
+            # the interval counts from when the layout started moving
+            self.positions_at = now
+        due = (settled and not self.was_settled) or (not settled and now - self.positions_at >= self.position_interval)
+        self.was_settled = settled
+        if not due:
+            return 0
+        self.positions_at = now
+        return self.record_positions(store)
+
+    def compact(self, store) -> None:
+        """Pack the store into a snapshot that the writer thread saves before it empties the journal."""
+        self.records.put(map_file.pack(store))
+        with self.pending_lock:
+            self.pending = 0
+        self.remember_positions(store)
+
+    def compact_from(self, path: str) -> None:
+        """Take a map file the store was just loaded from as the new snapshot, without decoding it."""
+        with open(path, "rb") as file:
+            self.records.put([file.read()])
+        with self.pending_lock:
+            self.pending = 0
+
+    def compact_if_due(self, store) -> bool:
+        """Compact once compact_after records piled up since the last snapshot."""
+        if self.pending < self.compact_after:
+            return False
+        self.compact(store)
+        return True
+
+    def recover(self, store, defaults: dict) -> int:
+        """
+        Fill an empty store from the snapshot and replay the journal after it, and get the number of replayed records.
+
+        Args:
+            store: The bubble store to fill
+            defaults: Fields every bubble gets besides its color, alignment and name, shared between all bubbles
+        """
+        start = time.perf_counter()
+        if os.path.exists(self.snapshot_path):
+            try:
+                map_file.load(store, self.snapshot_path, defaults)
+            except ValueError as error:
+                # keep the broken file out of the way of the next compaction
+                print(f"Couldn't read '{self.snapshot_path}': {error}")
+                os.replace(self.snapshot_path, self.snapshot_path + ".broken")
+        replayed = 0
+        # connections are added together at the end, as bubbles are never removed that doesn't change the result
+        sources = []
+        targets = []
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as file:
+                for line in file:
+                    try:
+                        operation = json.loads(line)
+                    except ValueError:
+                        # the last record was cut short by a crash, everything before it is complete
+                        break
+                    if operation.get("op") == "connect":
+                        sources.append(operation["source"])
+                        targets.append(operation["target"])
+                    else:
+                        apply(store, operation, defaults)
+                    replayed += 1
+        if sources:
+            sources, targets = np.array(sources), np.array(targets)
+            ids = store.ids[:len(store)]
+            exist = np.isin(sources, ids) & np.isin(targets, ids)
+            store.connect_many(sources[exist], targets[exist])
+        with self.pending_lock:
+            self.pending = replayed
+        self.remember_positions(store)
+        self.recovery_seconds = time.perf_counter() - start
+        return replayed
+
+    def start(self) -> None:
+        """Open the journal for appending and start the writer thread."""
+        self.file = open(self.path, "ab")
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def close(self) -> None:
+        """Write everything queued so far and stop the writer thread."""
+        if self.thread is not None:
+            self.records.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def run(self) -> None:
+        """Write queued records in batches, syncing once per batch, and swap in snapshots as they come."""
+        while True:
+            item = self.records.get()
+            batch = []
+            deadline = time.perf_counter() + self.flush_interval
+            while isinstance(item, str):
+                batch.append(item)
+                try:
+                    item = self.records.get(timeout=max(0.0, deadline - time.perf_counter()))
+                except queue.Empty:
+                    item = ""
+                    break
+            if batch:
+                self.file.write("".join(batch).encode("utf-8"))
+                self.file.flush()
+                os.fsync(self.file.fileno())
+                self.written += len(batch)
+                self.syncs += 1
+            if item is None:
+                self.file.close()
+                return
+            if isinstance(item, list):
+                # replaying the old journal onto the new snapshot is harmless, so a crash in between loses nothing
+                map_file.write(item, self.snapshot_path)
+                self.file.close()
+                self.file = open(self.path, "wb")
+                self.compactions += 1
+
+
+def apply(store, operation: dict, defaults: dict) -> None:
+    """Apply one add, edit, move or batch of moves from the journal to a store, doing nothing for missing bubbles."""
+    kind = operation.get("op")
+    if kind in ("add", "edit"):
+        view = store.view_of(operation["id"])
+        if view is None:
+            if kind == "edit":
+                return
+            store.add_many(np.array([operation["x"]]), np.array([operation["y"]]), np.array([operation["radius"]]),
+                           [dict(defaults)], np.array([operation["id"]]))
+            view = store.view_of(operation["id"])
+        view["radius"] = operation["radius"]
+        view["name"] = operation["name"]
+        view["color"] = tuple(operation["color"])
+        view["text_alignment"] = operation["alignment"]
+        view["rendered_lines"] = []
+    elif kind == "move":
+        view = store.view_of(operation["id"])
+        if view is not None:
+            view["x"] = operation["x"]
+            view["y"] = operation["y"]
+    elif kind == "moves":
+        ids = np.array(operation["ids"], dtype=np.int64)
+        known = ids < store.next_id
+        rows = store.row_of[ids[known]]
+        loaded = rows >= 0
+        store.x[rows[loaded]] = np.array(operation["x"])[known][loaded]
+        store.y[rows[loaded]] = np.array(operation["y"])[known][loaded]
+        store.grid.invalidate()
+
+
+if __name__ == "__main__":
+    print("This file isn't intended to be run directly.")
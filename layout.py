@@ -0,0 +1,252 @@
+import math
+import time
+
+import numpy as np
+
+import bubble_store
+import physics
+import simulation
+
+
+def spread_bits(values: np.ndarray) -> np.ndarray:
+    """Put a zero bit between every bit of 16 bit integers."""
+    values = (values | (values << 8)) & 0x00FF00FF
+    values = (values | (values << 4)) & 0x0F0F0F0F
+    values = (values | (values << 2)) & 0x33333333
+    return (values | (values << 1)) & 0x55555555
+
+
+class QuadTree:
+    """Linear quadtree over bubble centers, built level by level from Morton codes."""
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, charge: np.ndarray, depth: int = 12):
+        """
+        Quad tree
+
+        Args:
+            x: X coordinates of the bubbles
+            y: Y coordinates of the bubbles
+            charge: Repulsion charge of every bubble
+            depth: Number of subdivisions below the root, at most 16
+        """
+        self.depth = min(16, max(1, depth))
+        self.min_x = float(x.min())
+        self.min_y = float(y.min())
+        self.side = max(float(x.max()) - self.min_x, float(y.max()) - self.min_y, 1e-6) * (1 + 1e-9)
+        cells = 1 << self.depth
+        scale = cells / self.side
+        ix = np.minimum(((x - self.min_x) * scale).astype(np.int64), cells - 1)
+        iy = np.minimum(((y - self.min_y) * scale).astype(np.int64), cells - 1)
+        codes = spread_bits(ix) | (spread_bits(iy) << 1)
+        self.order = np.argsort(codes, kind="stable")
+        sorted_codes = codes[self.order]
+        self.x = x[self.order]
+        self.y = y[self.order]
+        self.charge = charge[self.order]
+        self.codes = []
+        self.body_node = []
+        self.mass = []
+        self.count = []
+        self.center_x = []
+        self.center_y = []
+        for level in range(self.depth + 1):
+            level_codes = sorted_codes >> (2 * (self.depth - level))
+            starts = np.flatnonzero(np.diff(level_codes, prepend=level_codes[0] - 1))
+            node_of_body = np.cumsum(np.diff(level_codes, prepend=level_codes[0]) != 0)
+            mass = np.bincount(node_of_body, self.charge)
+            self.codes.append(level_codes[starts])
+            self.body_node.append(node_of_body)
+            self.mass.append(mass)
+            self.count.append(np.bincount(node_of_body))
+            self.center_x.append(np.bincount(node_of_body, self.charge * self.x) / mass)
+            self.center_y.append(np.bincount(node_of_body, self.charge * self.y) / mass)
+        self.child_start = []
+        self.child_end = []
+        for level in range(self.depth):
+            parents = self.codes[level + 1] >> 2
+            self.child_start.append(np.searchsorted(parents, self.codes[level], "left"))
+            self.child_end.append(np.searchsorted(parents, self.codes[level], "right"))
+
+    def repulsion(self, theta: float, strength: float) -> tuple:
+        """Get the Barnes–Hut approximated repulsion on every bubble, in the caller's order."""
+        body_count = len(self.x)
+        force_x = np.zeros(body_count)
+        force_y = np.zeros(body_count)
+        bodies = np.arange(body_count)
+        nodes = np.zeros(body_count, dtype=np.int64)
+        theta_squared = theta * theta
+        for level in range(self.depth + 1):
+            if len(bodies) == 0:
+                break
+            dx = self.x[bodies] - self.center_x[level][nodes]
+            dy = self.y[bodies] - self.center_y[level][nodes]
+            distance_squared = dx * dx + dy * dy
+            mass = self.mass[level][nodes]
+            own = self.body_node[level][bodies] == nodes
+            single = self.count[level][nodes] == 1
+            size = self.side / (1 << level)
+            if level < self.depth:
+                accept = ~own & (single | (size * size < theta_squared * distance_squared))
+                drop = own & single
+            else:
+                accept = ~own
+                drop = own & single
+                shared = own & ~single
+                own_bodies = bodies[shared]
+                own_charge = self.charge[own_bodies]
+                rest = mass[shared] - own_charge
+                rest_x = (mass[shared] * self.center_x[level][nodes[shared]] - own_charge * self.x[own_bodies]) / rest
+                rest_y = (mass[shared] * self.center_y[level][nodes[shared]] - own_charge * self.y[own_bodies]) / rest
+                dx[shared] = self.x[own_bodies] - rest_x
+                dy[shared] = self.y[own_bodies] - rest_y
+                distance_squared[shared] = dx[shared] ** 2 + dy[shared] ** 2
+                mass[shared] = rest
+                accept |= shared
+            pushing = accept & (distance_squared > 0) & (mass > 0)
+            magnitude = strength * self.charge[bodies[pushing]] * mass[pushing] / distance_squared[pushing]
+            force_x += np.bincount(bodies[pushing], dx[pushing] * magnitude, body_count)
+            force_y += np.bincount(bodies[pushing], dy[pushing] * magnitude, body_count)
+            if level == self.depth:
+                break
+            opening = ~accept & ~drop
+            bodies, nodes = bodies[opening], nodes[opening]
+            start = self.child_start[level][nodes]
+            lengths = self.child_end[level][nodes] - start
+            total = int(lengths.sum())
+            run_offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+            nodes = np.repeat(start, lengths) + np.arange(total) - run_offsets
+            bodies = np.repeat(bodies, lengths)
+        unsorted_x = np.empty(body_count)
+        unsorted_y = np.empty(body_count)
+        unsorted_x[self.order] = force_x
+        unsorted_y[self.order] = force_y
+        return unsorted_x, unsorted_y
+
+
+class ForceLayout:
+    """Optional force-directed layout that adds Barnes–Hut repulsion to the springs."""
+
+    def __init__(self, theta: float = 1.2, spacing: float = 150.0, initial_temperature: float = 0.1,
+                 cooling: float = 0.97, min_temperature: float = 0.05, tolerance: float = 0.05, depth: int = 12):
+        """
+        Force layout
+
+        Args:
+            theta: Opening angle, larger values approximate more and run faster
+            spacing: Distance in world units at which the pull and push between two average connected bubbles cancel
+            initial_temperature: Largest distance a bubble may move in the first step, as a share of the map size
+            cooling: Factor the temperature is multiplied with after every step
+            min_temperature: Temperature at which the layout stops
+            tolerance: Largest movement per step at which the layout counts as converged
+            depth: Depth of the quadtree
+        """
+        self.theta = theta
+        self.spacing = spacing
+        self.initial_temperature = initial_temperature
+        self.cooling = cooling
+        self.min_temperature = min_temperature
+        self.tolerance = tolerance
+        self.depth = depth
+        self.temperature = None
+        self.active = False
+        self.converged = False
+        self.steps = 0
+
+    def start(self) -> None:
+        """Heat the layout up and let it run until it converges."""
+        self.temperature = None
+        self.active = True
+        self.converged = False
+        self.steps = 0
+
+    def stop(self) -> None:
+        """Stop the layout where it is."""
+        self.active = False
+
+    def toggle(self) -> bool:
+        """Start the layout if it is stopped, otherwise stop it, and get whether it runs now."""
+        if self.active:
+            self.stop()
+        else:
+            self.start()
+        return self.active
+
+    def step(self, store, dragging_bubble=None) -> float:
+        """Move every bubble by Fruchterman-Reingold forces, limited by the temperature, and get the largest movement."""
+        if not self.active or store.count < 2:
+            return 0.0
+        count = store.count
+        x, y = store.x[:count], store.y[:count]
+        radius = store.radius[:count]
+        tree = QuadTree(x, y, radius, self.depth)
+        if self.temperature is None:
+            self.temperature = self.initial_temperature * tree.side
+        force_x, force_y = tree.repulsion(self.theta, (self.spacing / radius.mean()) ** 2)
+        edges = store.edge_rows()
+        if len(edges):
+            source, target = edges[:, 0], edges[:, 1]
+            dx = x[target] - x[source]
+            dy = y[target] - y[source]
+            stretch = np.hypot(dx, dy) / self.spacing
+            pull_x = dx * stretch
+            pull_y = dy * stretch
+            force_x += np.bincount(source, pull_x, count) - np.bincount(target, pull_x, count)
+            force_y += np.bincount(source, pull_y, count) - np.bincount(target, pull_y, count)
+        if dragging_bubble is not None:
+            force_x[dragging_bubble.row] = 0
+            force_y[dragging_bubble.row] = 0
+        magnitude = np.hypot(force_x, force_y)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            limit = np.where(magnitude > self.temperature, self.temperature / magnitude, 1.0)
+        x += force_x * limit
+        y += force_y * limit
+        movement = float(np.max(magnitude * limit))
+        self.temperature *= self.cooling
+        self.steps += 1
+        if self.temperature < self.min_temperature or movement < self.tolerance:
+            self.active = False
+            self.converged = True
+        return movement
+
+
+def brute_force_repulsion(x, y, charge, strength):
+    """Get the exact repulsion on every bubble for comparison."""
+    dx = x[:, None] - x[None, :]
+    dy = y[:, None] - y[None, :]
+    distance_squared = dx * dx + dy * dy
+    np.fill_diagonal(distance_squared, np.inf)
+    magnitude = strength * charge[:, None] * charge[None, :] / distance_squared
+    return (dx * magnitude).sum(axis=1), (dy * magnitude).sum(axis=1)
+
+
+def benchmark_layout(counts=(1000, 3000, 10000), cluster_size=20, rmin=12, rmax=100):
+    """Check the approximation error and time how long clustered maps take to settle."""
+    rng = np.random.default_rng(0)
+    x, y, charge = rng.uniform(0, 5000, 1500), rng.uniform(0, 5000, 1500), rng.uniform(rmin, rmax, 1500)
+    exact_x, exact_y = brute_force_repulsion(x, y, charge, 1.0)
+    for theta in (0.0, 0.6, 1.2):
+        approx_x, approx_y = QuadTree(x, y, charge).repulsion(theta, 1.0)
+        error = np.hypot(approx_x - exact_x, approx_y - exact_y) / np.hypot(exact_x, exact_y)
+        print(f"theta {theta}: median relative error {np.median(error):.4f}")
+    for count in counts:
+        side = math.sqrt(count) * rmax
+        store = bubble_store.BubbleStore(physics.collision_cell_size(rmax, 1.1), capacity=count)
+        for x, y, radius in zip(rng.uniform(0, side, count), rng.uniform(0, side, count),
+                                rng.uniform(rmin, rmax / 2, count)):
+            store.add({"x": x, "y": y, "radius": radius})
+        for cluster in range(0, count, cluster_size):
+            members = np.arange(cluster, min(count, cluster + cluster_size))
+            for source in members[1:]:
+                store.connect(store[int(source)], store[int(rng.choice(members[members < source]))])
+        layout = ForceLayout()
+        bubble_simulation = simulation.Simulation(store, rmax, layout=layout)
+        layout.start()
+        start = time.perf_counter()
+        while layout.active:
+            bubble_simulation.step(bubble_simulation.timestep)
+        elapsed = time.perf_counter() - start
+        print(f"{count:>6} bubbles: converged after {layout.steps} steps in {elapsed:6.2f} s")
+
+
+if __name__ == "__main__":
+    benchmark_layout()
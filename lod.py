@@ -0,0 +1,115 @@
+import math
+import time
+from typing import Tuple
+
+import numpy as np
+
+CLUSTER, DISC, SPRITE, FULL = range(4)
+
+
+class LodTiers:
+    """Picks how much of a bubble is drawn from its on-screen radius and merges the smallest ones into clusters."""
+
+    def __init__(self, text_below: float = 10.0, disc_below: float = 6.0, cluster_below: float = 4.0,
+                 cluster_cell: int = 24, max_bundles: int = 2000):
+        """
+        Level of detail tiers
+
+        Args:
+            text_below: On-screen radius in pixels below which the text of a bubble is skipped
+            disc_below: On-screen radius below which a bubble is drawn as a flat disc instead of its sprite
+            cluster_below: On-screen radius below which bubbles are merged into cluster glyphs
+            cluster_cell: Edge length in pixels of the grid cells clustered bubbles are merged in
+            max_bundles: Most bundled connections drawn, the ones standing for the most connections win
+        """
+        self.text_below = text_below
+        self.disc_below = disc_below
+        self.cluster_below = cluster_below
+        self.cluster_cell = cluster_cell
+        self.max_bundles = max_bundles
+
+    def tiers(self, screen_radius: np.ndarray) -> np.ndarray:
+        """Get the tier (CLUSTER, DISC, SPRITE or FULL) of every on-screen radius."""
+        return np.digitize(screen_radius, (self.cluster_below, self.disc_below, self.text_below))
+
+    def cluster(self, x: np.ndarray, y: np.ndarray, radius: np.ndarray, rows: np.ndarray,
+                zoom: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Merge rows that share a grid cell, anchored to the world so panning keeps the clusters stable.
+
+        Returns:
+            The cluster of every row (-1 for rows not clustered), the world centers of the clusters weighted by
+            bubble area, and the number of bubbles in every cluster
+        """
+        cluster_of = np.full(len(x), -1, dtype=np.int64)
+        if len(rows) == 0:
+            empty = np.zeros(0)
+            return cluster_of, empty, empty, np.zeros(0, dtype=np.int64)
+        cell = self.cluster_cell / zoom
+        cx = np.floor(x[rows] / cell).astype(np.int64)
+        cy = np.floor(y[rows] / cell).astype(np.int64)
+        cx -= cx.min()
+        cy -= cy.min()
+        keys = cx * (int(cy.max()) + 1) + cy
+        _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        cluster_of[rows] = inverse
+        weight = radius[rows] ** 2
+        weight_sum = np.bincount(inverse, weight)
+        center_x = np.bincount(inverse, weight * x[rows]) / weight_sum
+        center_y = np.bincount(inverse, weight * y[rows]) / weight_sum
+        return cluster_of, center_x, center_y, counts
+
+    def glyph_radius(self, counts: np.ndarray) -> np.ndarray:
+        """Get the on-screen radius of the cluster glyphs, growing with the number of bubbles they stand for."""
+        return np.minimum(self.cluster_cell / 2, 2 + np.sqrt(counts))
+
+    def bundle(self, edges: np.ndarray, cluster_of: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Merge the connections that touch a cluster into one bundle per pair of endpoints.
+
+        Endpoints are numbered as rows for bubbles that are drawn on their own and as row count plus cluster
+        index for clusters.
+
+        Returns:
+            The two endpoints of every bundle and the number of connections it stands for, at most max_bundles
+        """
+        empty = np.zeros(0, dtype=np.int64)
+        if len(edges) == 0:
+            return empty, empty, empty
+        count = len(cluster_of)
+        nodes = np.where(cluster_of >= 0, count + cluster_of, np.arange(count))
+        touching = (cluster_of[edges[:, 0]] >= 0) | (cluster_of[edges[:, 1]] >= 0)
+        first, second = nodes[edges[touching, 0]], nodes[edges[touching, 1]]
+        low, high = np.minimum(first, second), np.maximum(first, second)
+        apart = low != high
+        if not apart.any():
+            return empty, empty, empty
+        stride = int(high.max()) + 1
+        pairs, weights = np.unique(low[apart] * stride + high[apart], return_counts=True)
+        if len(pairs) > self.max_bundles:
+            heaviest = np.argpartition(weights, -self.max_bundles)[-self.max_bundles:]
+            pairs, weights = pairs[heaviest], weights[heaviest]
+        return pairs // stride, pairs % stride, weights
+
+
+def benchmark_clusters(counts=(1000, 10000, 100000), zoom=0.05, rmin=12, rmax=100, repeats=5):
+    """Time tiering, clustering and bundling of growing maps that fill the same screen area."""
+    rng = np.random.default_rng(0)
+    tiers = LodTiers()
+    for count in counts:
+        side = 1000 / zoom
+        x, y = rng.uniform(0, side, count), rng.uniform(0, side, count)
+        radius = rng.uniform(rmin, rmax, count)
+        edges = rng.integers(0, count, (count, 2))
+        start = time.perf_counter()
+        for _ in range(repeats):
+            clustered = np.flatnonzero(tiers.tiers(radius * zoom) == CLUSTER)
+            cluster_of, center_x, center_y, members = tiers.cluster(x, y, radius, clustered, zoom)
+            first, second, weights = tiers.bundle(edges, cluster_of)
+        elapsed = (time.perf_counter() - start) / repeats
+        print(f"{count:>7} bubbles: {len(members):>5} glyphs, {len(weights):>6} bundles, {elapsed * 1000:7.2f} ms, "
+              f"{math.ceil(count / max(1, len(members)))} bubbles per glyph")
+
+
+if __name__ == "__main__":
+    benchmark_clusters()
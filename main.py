@@ -1,44 +1,69 @@
 try:
     import os
     import math
+    import importlib.util
     import queue
     import threading
     import time
-    import tkinter
     import sys
-    import urllib.request
+    import tempfile
     import typing
 except ImportError as e:
     print(f"Error: '{e.name}' not found. Please install it using 'pip install {e.name}'.")
     exit()
 
+startup_start = time.perf_counter()
 necessarry_files = ["batter_saving_icon.png", "bubble.png", "bubble_icon.png", "color_palette.png", "color_wheel.png",
                     "target.png"]
-custom_modules=["color_picker", "nav_bar"]
-trying=True
-while trying:
-    try:
-        import customtkinter
-        import mss
-        import pyautogui
-        import pygame
-        from PIL import Image
-
-        import color_picker
-        import nav_bar
-        trying=False
-    except ImportError as e:
-        tkinter.messagebox.showinfo("Missing Module", f"Downloading '{e.name}'")
-        if not e.name in custom_modules:
-            os.system(f"pip install {e.name}")
-        else:
-            link=f"https://raw.githubusercontent.com/PizzaPost/relationBubbles/master/{e.name}.py"
-            urllib.request.urlretrieve(link, f"{e.name}.py")
-for file in necessarry_files:
-    if not os.path.exists(file):
-        tkinter.messagebox.showinfo("Missing File", f"Downloading '{file}'")
-        link=f"https://raw.githubusercontent.com/PizzaPost/relationBubbles/master/{file}"
-        urllib.request.urlretrieve(link, file)
+custom_modules=["bubble_store", "color_picker", "dialog_pool", "dirty_rects", "edge_renderer", "eyedropper", "font_cache", "frame_scheduler", "graph_store", "image_assets", "ingest", "journal", "layout", "lod", "map_file", "nav_bar", "physics", "simulation", "spatial_hash", "sprite_cache", "text_cache", "tk_dispatch", "world_store"]
+# import names of requirements.txt, the dialog and eyedropper ones are only imported once they are used
+required_packages = ["customtkinter", "mss", "numpy", "PIL", "pygame"]
+# only looks the modules up, so nothing is imported, installed or downloaded here
+missing_modules = [name for name in required_packages + custom_modules if importlib.util.find_spec(name) is None]
+missing_files = [file for file in necessarry_files if not os.path.exists(file)]
+if missing_modules or missing_files:
+    if missing_modules:
+        print(f"Missing modules: {', '.join(missing_modules)}. Install the packages with 'pip install -r requirements.txt'"
+              " and get the .py files from https://github.com/PizzaPost/relationBubbles.")
+    if missing_files:
+        print(f"Missing files: {', '.join(missing_files)}. Get them from https://github.com/PizzaPost/relationBubbles.")
+    exit()
+
+import numpy as np
+import pygame
+
+import bubble_store
+import dirty_rects
+import edge_renderer
+import font_cache
+import frame_scheduler
+import ingest
+import journal
+import layout
+import lod
+import map_file
+import physics
+import simulation
+import sprite_cache
+import text_cache
+import tk_dispatch
+import world_store
+
+
+def import_dialog_modules():
+    global customtkinter, color_picker, dialog_pool, image_assets, nav_bar
+    import customtkinter
+
+    import color_picker
+    import dialog_pool
+    import image_assets
+    import nav_bar
+
+
+def import_eyedropper_modules():
+    global eyedropper
+    import eyedropper
+
 
 bubble_img_original = pygame.image.load("bubble.png")
 batter_saving_icon = pygame.image.load("batter_saving_icon.png")
@@ -49,12 +74,19 @@ bubble_icon = pygame.image.load("bubble_icon.png")
 pygame.init()
 running = True
 tk = None
+dialogs = None
+active_eyedropper = None
+editing_bubble = None
+new_bubble_position = (0, 0)
+bubble_picker_colors = ("#ffffff", "#cccccc", "#a3a3a3")
+alignment_labels = ["left", "center", "right"]
 screen_width = pygame.display.Info().current_w
 screen_height = pygame.display.Info().current_h
 width = 0
 height = 0
-tk_queue = queue.Queue()
-bubble_queue = queue.Queue()
+tk_commands = tk_dispatch.TkDispatcher(frame_scheduler.WakeQueue())
+# commands from the dialogs for the main thread, which owns the bubble store
+main_commands = frame_scheduler.WakeQueue()
 
 rmin = 12
 rmax = 100
@@ -62,27 +94,32 @@ rdef = 24
 
 
 def tkinter_thread():
-    global tk_queue, bubble_queue
+    global dialogs
 
+    import_dialog_modules()
     customtkinter.set_default_color_theme("green")
+    dialogs = dialog_pool.DialogPool({"bubble": build_bubble_window})
+    tk_commands.register("create", open_create_window)
+    tk_commands.register("edit", open_edit_window)
+    tk_commands.register("close", close_dialog)
+    tk_commands.run(dialogs.window("bubble"), lambda: dialogs.shown is not None)
 
-    while running:
-        try:
-            command = tk_queue.get(block=False)
-            if isinstance(command, tuple):
-                cmd_name, cmd_arg = command
-                if cmd_name == "ce":
-                    create_edit_menu(cmd_arg)
-            elif command == "cc":
-                create_create_window()
-        except queue.Empty:
-            pass
-        time.sleep(0.05)
+
+def open_create_window(queued_at):
+    dialogs.show("bubble", populate_create_window, queued_at)
+
+
+def open_edit_window(bubble, queued_at):
+    dialogs.show("bubble", lambda window: populate_edit_window(bubble), queued_at)
+
+
+def close_dialog(queued_at):
+    close_bubble_window(False)
 
 
 def ask_color(button, color1, color2, color3):
     pick_color = color_picker.AskColor(button=button, button_color=color1, button_hover_color=color2,
-                                       button_hover_color2=color3)
+                                       button_hover_color2=color3, initial_color=button.cget("fg_color"))
     color = pick_color.get()
     if not color: return
     base_rgb = hex_to_rgb(color)
@@ -117,42 +154,90 @@ def hex_to_rgb(hex_color):
 def get_contrasting_bubble_color(text_color):
     r, g, b = text_color
     brightness = (r * 299 + g * 587 + b * 114) / 1000
-    return (40, 40, 40) if brightness > 128 else (240, 240, 240)
+    return contrasting_bubble_colors[brightness > 128]
 
 
-def get_color_at_mouse(event, color_picker):
-    with mss.mss() as sct:
-        x, y = pyautogui.position()
-        monitor = {"top": y, "left": x, "width": 1, "height": 1}
-        img = sct.grab(monitor)
-        rgb_color = img.pixel(0, 0)
-    hex_color = rgb_to_hex(rgb_color)
-    hover_rgb = get_hover_color(hex_to_rgb(hex_color))
-    hover_hex = rgb_to_hex(hover_rgb)
-    color_picker.configure(fg_color=hex_color, hover_color=hover_hex)
+def calc_contrasting_bubble_colors(text_colors):
+    # index into contrasting_bubble_colors for every row of an n x 3 array
+    return (text_colors @ np.array([299, 587, 114]) / 1000 > 128).astype(np.int64)
 
 
-def close_create_menu(save, entry=None, x=width // 2, y=height // 2, color_picker=None, radius_slider=None,
-                      alignment_options=None):
-    global tk
-    if save:
-        bubble_data = (entry.get("1.0", "end"), x, y, hex_to_rgb(color_picker.cget("fg_color")), radius_slider.get(),
-                       alignment_options.get())
-        bubble_queue.put(bubble_data)
-    tk.destroy()
-    tk = None
+def start_eyedropper(button):
+    global active_eyedropper
+    if active_eyedropper is not None:
+        return
+    import_eyedropper_modules()
+    active_eyedropper = eyedropper.Eyedropper(tk, lambda rgb: set_picked_color(button, rgb), on_close=eyedropper_closed)
+
+
+def eyedropper_closed():
+    global active_eyedropper
+    active_eyedropper = None
+
+
+def stop_eyedropper():
+    if active_eyedropper is not None:
+        active_eyedropper.close()
+
+
+def set_picked_color(button, rgb):
+    hover_hex = rgb_to_hex(get_hover_color(rgb))
+    button.configure(fg_color=rgb_to_hex(rgb), hover_color=hover_hex)
+
+
+def close_bubble_window(save):
+    global editing_bubble
+    if save and editing_bubble is None:
+        text = bubble_entry.get("1.0", "end")[:-1]
+        if text.replace("\n", ""):
+            x, y = new_bubble_position
+            bubble_ingest.submit([{"name": text, "x": x, "y": y, "color": hex_to_rgb(bubble_color_button.cget("fg_color")),
+                                   "radius": bubble_radius_slider.get(), "text_alignment": bubble_alignment.get()}])
+    elif save:
+        # the main thread owns the store, so the edit is applied there
+        main_commands.put(("edit", (editing_bubble.id, {
+            "name": bubble_entry.get("1.0", "end")[:-1].split("\n"),
+            "color": hex_to_rgb(bubble_color_button.cget("fg_color")),
+            "radius": bubble_radius_slider.get(),
+            "text_alignment": bubble_alignment.get()
+        })))
+    editing_bubble = None
+    stop_eyedropper()
+    dialogs.hide()
+    tk_commands.settle()
+    frame_scheduler.wake()
+
+
+def apply_bubble_edit(bubble_id, fields):
+    bubble = bubbles.view_of(bubble_id)
+    if bubble is None:
+        # evicted from the streamed world while the dialog was open
+        return
+    for key, value in fields.items():
+        bubble[key] = value
+    text_surface_cache.invalidate(bubble)
+    # wrapped again on the next draw
+    bubble["rendered_lines"] = []
+    autosave.record_edit(bubble)
+    bubble_simulation.wake()
 
 
-def create_create_window():
-    global tk
-    if tk:
-        return
-    x, y = pygame.mouse.get_pos()
-    world_x = (x - map_offset_x) / zoom_level
-    world_y = (y - map_offset_y) / zoom_level
+def run_main_commands():
+    while True:
+        try:
+            name, args = main_commands.get(block=False)
+        except queue.Empty:
+            return
+        main_command_handlers[name](*args)
+
+
+def ask_bubble_color():
+    ask_color(bubble_color_button, *bubble_picker_colors)
+
+
+def build_bubble_window():
+    global tk, bubble_entry, bubble_color_button, bubble_radius_slider, bubble_alignment
     tk = customtkinter.CTk()
-    customtkinter.set_default_color_theme("green")
-    tk.title("add new bubble")
     tk.geometry(f"410x350+{screen_width // 2 - 164}+{screen_height // 2 - 150}")
     tk.resizable(False, False)
     tk.attributes("-alpha", 0.85)
@@ -164,167 +249,84 @@ def create_create_window():
     frame.grid_rowconfigure(1, weight=1)
     frame.pack(fill="both", expand=True)
     close_btn = customtkinter.CTkButton(frame, text="x", text_color="red", fg_color="transparent", hover_color="gray25",
-                                        width=25, height=25, command=lambda: close_create_menu(False))
-    entry = customtkinter.CTkTextbox(frame, height=170, width=300)
-    tk.focus_force()
-    entry.focus_force()
-    hex_color, hover_rgb, hover_hex = "#ffffff", (204, 204, 204), "#cccccc"
-    hover2_hex = rgb_to_hex(get_hover_color(hover_rgb))
-    color_picker = customtkinter.CTkButton(frame, text="", hover_color=hover_hex, fg_color=hex_color, width=127,
-                                           height=28,
-                                           command=lambda: ask_color(color_picker, hex_color, hover_hex, hover2_hex))
-    palette_img = Image.open("color_palette.png")
-    palette_img = palette_img.convert("RGBA")
-    image = customtkinter.CTkImage(light_image=palette_img,
-                                   dark_image=palette_img,
-                                   size=(127, 28))
+                                        width=25, height=25, command=lambda: close_bubble_window(False))
+    bubble_entry = customtkinter.CTkTextbox(frame, height=170, width=300)
+    bubble_color_button = customtkinter.CTkButton(frame, text="", width=127, height=28, command=ask_bubble_color)
+    image = image_assets.shared.ctk_image("color_palette.png", (127, 28), tk)
     color_palette = customtkinter.CTkLabel(frame, text="", image=image, width=127, height=28)
-    color_palette.bind("<Button-1>", lambda event: get_color_at_mouse(event, color_picker))
-    radius_slider = customtkinter.CTkSlider(frame, from_=rmin, to=rmax, number_of_steps=30)
-    radius_slider.set(rdef)
-    alignment_options = nav_bar.create_animated_pill_navigation(frame, labels=["left", "center", "right"],
-                                                                initial_index=1,
-                                                                grid={
-                                                                    'row': 4,
-                                                                    'column': 0,
-                                                                    'columnspan': 2,
-                                                                    'sticky': "ew",
-                                                                    'padx': 8,
-                                                                    'pady': 6
-                                                                })
-    submit_btn = customtkinter.CTkButton(frame, text="submit",
-                                         command=lambda: close_create_menu(True, entry, world_x, world_y, color_picker,
-                                                                           radius_slider, alignment_options))
-    entry.grid(row=1, column=0, columnspan=2, sticky="nsew", padx=8, pady=(6, 8))
-    color_picker.grid(row=2, column=0, sticky="e", padx=4, pady=6)
+    color_palette.bind("<Button-1>", lambda event: start_eyedropper(bubble_color_button))
+    bubble_radius_slider = customtkinter.CTkSlider(frame, from_=rmin, to=rmax, number_of_steps=30)
+    bubble_alignment = nav_bar.create_animated_pill_navigation(frame, labels=alignment_labels,
+                                                               initial_index=1,
+                                                               grid={
+                                                                   'row': 4,
+                                                                   'column': 0,
+                                                                   'columnspan': 2,
+                                                                   'sticky': "ew",
+                                                                   'padx': 8,
+                                                                   'pady': 6
+                                                               })
+    submit_btn = customtkinter.CTkButton(frame, text="submit", command=lambda: close_bubble_window(True))
+    bubble_entry.grid(row=1, column=0, columnspan=2, sticky="nsew", padx=8, pady=(6, 8))
+    bubble_color_button.grid(row=2, column=0, sticky="e", padx=4, pady=6)
     color_palette.grid(row=2, column=1, sticky="w", pady=6)
-    radius_slider.grid(row=3, column=0, columnspan=2, sticky="nsew", pady=6)
+    bubble_radius_slider.grid(row=3, column=0, columnspan=2, sticky="nsew", pady=6)
     submit_btn.grid(row=5, column=0, columnspan=2, sticky="ew", padx=8, pady=6)
     close_btn.grid(row=0, column=1, sticky="ne", padx=6, pady=6)
-    tk.protocol("WM_DELETE_WINDOW", close_create_menu)
-    tk.mainloop()
-
-
-def create_bubble(data):
-    text = data[0]
-    x = data[1]
-    y = data[2]
-    if not text.replace("\n", "") == "":
-        color = data[3]
-        radius = data[4]
-        alignment = data[5]
-        text = text[:-1]
-        texts = text.split("\n")
-        bubbles.append({
-            "name": texts,
-            "x": x,
-            "y": y,
-            "color": color,
-            "radius": radius,
-            "fm": 1.0,
-            "connections": [],
-            "rendered_lines": [],
-            "text_alignment": alignment
-        })
-
-
-tk_thread = threading.Thread(target=tkinter_thread, daemon=True)
-tk_thread.start()
+    tk.protocol("WM_DELETE_WINDOW", lambda: close_bubble_window(False))
+    return tk
+
+
+def populate_bubble_window(title, text, color, radius, alignment):
+    global bubble_picker_colors
+    tk.title(title)
+    bubble_entry.delete("1.0", "end")
+    bubble_entry.insert("1.0", text)
+    bubble_entry.focus_set()
+    hex_color = rgb_to_hex(color)
+    hover_rgb = get_hover_color(color)
+    hover_hex = rgb_to_hex(hover_rgb)
+    bubble_color_button.configure(fg_color=hex_color, hover_color=hover_hex)
+    bubble_picker_colors = (hex_color, hover_hex, rgb_to_hex(get_hover_color(hover_rgb)))
+    bubble_radius_slider.set(radius)
+    bubble_alignment.set_initial_state(alignment_labels.index(alignment) if alignment in alignment_labels else 1)
+
+
+def populate_create_window(window):
+    global editing_bubble, new_bubble_position
+    x, y = pygame.mouse.get_pos()
+    new_bubble_position = ((x - map_offset_x) / zoom_level, (y - map_offset_y) / zoom_level)
+    editing_bubble = None
+    populate_bubble_window("add new bubble", "", (255, 255, 255), rdef, "center")
+
+
+tk_thread = None
+
+
+def open_dialog(name, *args):
+    global tk_thread
+    tk_commands.submit(name, *args)
+    # tkinter and customtkinter are only loaded once the first dialog is asked for
+    if tk_thread is None:
+        tk_thread = threading.Thread(target=tkinter_thread, daemon=True)
+        tk_thread.start()
 
 
 def wrap_lines(bubble):
-    original_lines = bubble.get("name", [])
-    wrapped_lines = []
-    for line in original_lines:
-        split_next = False
-        for index, letter in enumerate(line):
-            if index > 40:
-                split_next = True
-            if split_next:
-                if letter == " ":
-                    line = line[:index] + "\n" + line[index:]
-                    split_next = False
-        wrapped_lines.append(line)
-    bubble["rendered_lines"] = [line for line in wrapped_lines if line]
-
-
-def close_edit_menu(save, bubble, entry, color_picker, radius_slider, alignment_options):
-    global tk
-    if save:
-        text = entry.get("1.0", "end")[:-1]
-        texts = text.split("\n")
-        bubble["name"] = texts
-        bubble["color"] = hex_to_rgb(color_picker.cget("fg_color"))
-        bubble["radius"] = radius_slider.get()
-        bubble["text_alignment"] = alignment_options.get()
-        wrap_lines(bubble)
-    tk.destroy()
-    tk = None
+    bubble["rendered_lines"] = text_cache.wrap_name(bubble.get("name", []))
+    bubble["font_size"] = fit_font_size(bubble["rendered_lines"], bubble["radius"])
+    text_surface_cache.invalidate(bubble)
 
 
-def create_edit_menu(bubble):
-    global tk
-    if tk:
-        return
-    tk = customtkinter.CTk()
-    customtkinter.set_default_color_theme("green")
-    tk.title("edit bubble")
-    tk.geometry(f"410x350+{screen_width // 2 - 164}+{screen_height // 2 - 150}")
-    tk.resizable(False, False)
-    tk.attributes("-alpha", 0.85)
-    tk.overrideredirect(True)
-    tk.attributes("-topmost", True)
-    frame = customtkinter.CTkFrame(tk)
-    frame.pack(fill="both", expand=True)
-    frame.grid_columnconfigure(0, weight=1)
-    frame.grid_columnconfigure(1, weight=1)
-    frame.grid_rowconfigure(1, weight=1)
-    close_btn = customtkinter.CTkButton(frame, text="x", text_color="red", fg_color="transparent", hover_color="gray25",
-                                        width=25, height=25, command=lambda: close_create_menu(False))
-    entry = customtkinter.CTkTextbox(frame, height=170, width=300)
-    entry.insert("1.0", "\n".join(bubble["name"]))
-    tk.focus_force()
-    entry.focus_force()
-    base_rgb = bubble["color"]
-    hex_color = rgb_to_hex(base_rgb)
-    hover_rgb = get_hover_color(base_rgb)
-    hover_hex = rgb_to_hex(hover_rgb)
-    hover2_hex = rgb_to_hex(get_hover_color(hover_rgb))
-    color_picker = customtkinter.CTkButton(frame, text="", fg_color=hex_color, hover_color=hover_hex, width=127,
-                                           height=28,
-                                           command=lambda: ask_color(color_picker, hex_color, hover_hex, hover2_hex))
-    palette_img = Image.open("color_palette.png")
-    palette_img = palette_img.convert("RGBA")
-    image = customtkinter.CTkImage(light_image=palette_img,
-                                   dark_image=palette_img,
-                                   size=(127, 28))
-    color_palette = customtkinter.CTkLabel(frame, text="", image=image, width=127, height=28)
-    color_palette.bind("<Button-1>", lambda event: get_color_at_mouse(event, color_picker))
-    radius_slider = customtkinter.CTkSlider(frame, from_=rmin, to=rmax, number_of_steps=30)
-    radius_slider.set(bubble["radius"])
-    for index, option in enumerate(["left", "center", "right"]):
-        if option == bubble["text_alignment"]:
-            alignment_options = nav_bar.create_animated_pill_navigation(frame, labels=["left", "center", "right"],
-                                                                        initial_index=index,
-                                                                        grid={
-                                                                            'row': 4,
-                                                                            'column': 0,
-                                                                            'columnspan': 2,
-                                                                            'sticky': "ew",
-                                                                            'padx': 8,
-                                                                            'pady': 6
-                                                                        })
-    submit_btn = customtkinter.CTkButton(frame, text="submit",
-                                         command=lambda: close_edit_menu(True, bubble, entry, color_picker,
-                                                                         radius_slider, alignment_options))
-    entry.grid(row=1, column=0, columnspan=2, sticky="nsew", padx=8, pady=(6, 8))
-    color_picker.grid(row=2, column=0, sticky="e", padx=4, pady=6)
-    color_palette.grid(row=2, column=1, sticky="w", pady=6)
-    radius_slider.grid(row=3, column=0, columnspan=2, sticky="nsew", pady=6)
-    submit_btn.grid(row=5, column=0, columnspan=2, sticky="ew", padx=8, pady=6)
-    close_btn.grid(row=0, column=1, sticky="ne", padx=6, pady=6)
-    tk.protocol("WM_DELETE_WINDOW", close_edit_menu)
-    tk.mainloop()
+def fit_font_size(lines, radius):
+    return font_manager.fit_size(lines, radius * math.sqrt(2))
+
+
+def populate_edit_window(bubble):
+    global editing_bubble
+    editing_bubble = bubble
+    populate_bubble_window("edit bubble", "\n".join(bubble["name"]), bubble["color"], bubble["radius"],
+                           bubble["text_alignment"])
 
 
 def handle_zoom(event):
@@ -341,6 +343,7 @@ def handle_zoom(event):
         world_my_after = (my - map_offset_y) / zoom_level
         map_offset_x += (world_mx_after - world_mx_before) * zoom_level
         map_offset_y += (world_my_after - world_my_before) * zoom_level
+        prewarm_bubble_sprites()
         return True
     return False
 
@@ -349,31 +352,23 @@ def handle_mouse_button_one_down():
     global click_start, moved, dragging_bubble, offset_x, offset_y, dragging_map, last_mouse_pos
     click_start = event.pos
     moved = False
-    clicked_on_bubble = False
-    for bubble in bubbles:
-        distance = math.sqrt((bubble["x"] - world_mx) ** 2 + (bubble["y"] - world_my) ** 2)
-        if distance < bubble["radius"]:
-            dragging_bubble = bubble
-            offset_x = bubble["x"] - world_mx
-            offset_y = bubble["y"] - world_my
-            clicked_on_bubble = True
-            break
-    if not clicked_on_bubble:
+    bubble = bubbles.bubble_at(world_mx, world_my)
+    if bubble:
+        dragging_bubble = bubble
+        offset_x = bubble["x"] - world_mx
+        offset_y = bubble["y"] - world_my
+    else:
         dragging_map = True
         last_mouse_pos = event.pos
 
 
 def handle_mouse_button_three_down():
     global world_mx, world_my
-    on_rect = False
-    for bubble in bubbles:
-        distance = math.sqrt((bubble["x"] - world_mx) ** 2 + (bubble["y"] - world_my) ** 2)
-        if distance < bubble["radius"]:
-            tk_queue.put(("ce", bubble))
-            on_rect = True
-            break
-    if not on_rect:
-        tk_queue.put("cc")
+    bubble = bubbles.bubble_at(world_mx, world_my)
+    if bubble:
+        open_dialog("edit", bubble)
+    else:
+        open_dialog("create")
 
 
 def handle_mouse_button_one_up():
@@ -381,31 +376,27 @@ def handle_mouse_button_one_up():
     mx, my = event.pos
     world_mx = (mx - map_offset_x) / zoom_level
     world_my = (my - map_offset_y) / zoom_level
-    clicked_bubble = None
-    for bubble in bubbles:
-        distance = math.sqrt((bubble["x"] - world_mx) ** 2 + (bubble["y"] - world_my) ** 2)
-        if distance < bubble["radius"]:
-            clicked_bubble = bubble
-            break
+    clicked_bubble = bubbles.bubble_at(world_mx, world_my)
     if connecting_bubble is None:
         if clicked_bubble:
             connecting_bubble = clicked_bubble
     else:
         if clicked_bubble and clicked_bubble is not connecting_bubble:
-            if clicked_bubble not in connecting_bubble["connections"]:
-                connecting_bubble["connections"].append(clicked_bubble)
+            if bubbles.connect(connecting_bubble, clicked_bubble):
+                autosave.record_connect(connecting_bubble, clicked_bubble)
+                bubble_simulation.wake()
         connecting_bubble = None
 
 
 def handle_mouse_motion():
-    global batter_saving_cooldown, dragging_bubble, map_offset_x, map_offset_y, dragging_map, last_mouse_pos, click_start, moved
-    batter_saving_cooldown = 0
+    global dragging_bubble, map_offset_x, map_offset_y, dragging_map, last_mouse_pos, click_start, moved
     mx, my = event.pos
     if dragging_bubble:
         world_mx = (mx - map_offset_x) / zoom_level
         world_my = (my - map_offset_y) / zoom_level
         dragging_bubble["x"] = world_mx + offset_x
         dragging_bubble["y"] = world_my + offset_y
+        bubble_simulation.wake()
     elif dragging_map:
         last_mx, last_my = last_mouse_pos
         dx = mx - last_mx
@@ -418,7 +409,7 @@ def handle_mouse_motion():
             moved = True
 
 
-def draw_connection_line_between_bubble_and_mouse(connecting_bubble):
+def connection_preview_points(connecting_bubble):
     radius = connecting_bubble["radius"]
     start_center_screen = (connecting_bubble["x"] * zoom_level + map_offset_x,
                            connecting_bubble["y"] * zoom_level + map_offset_y)
@@ -433,62 +424,25 @@ def draw_connection_line_between_bubble_and_mouse(connecting_bubble):
         t = min(t_x, t_y)
         if t < 1.0:
             start_point = (start_center_screen[0] + t * dx, start_center_screen[1] + t * dy)
-            pygame.draw.aaline(pg, (200, 200, 200), start_point, end_pos, 2)
-
-
-def draw_connection_line_between_bubbles():
-    for bubble in bubbles:
-        for connected_bubble in bubble["connections"]:
-            b1r = bubble["radius"]
-            b2r = connected_bubble["radius"]
-            p1_center_world = (bubble["x"], bubble["y"])
-            p2_center_world = (connected_bubble["x"], connected_bubble["y"])
-            dx = p2_center_world[0] - p1_center_world[0]
-            dy = p2_center_world[1] - p1_center_world[1]
-            if dx == 0 and dy == 0:
-                continue
-            length = math.hypot(dx, dy)
-            t1 = b2r / length
-            t2 = b1r / length
-            start_point = (p1_center_world[0] + t2 * dx, p1_center_world[1] + t2 * dy)
-            end_point = (p2_center_world[0] - t1 * dx, p2_center_world[1] - t1 * dy)
-            start_screen = (start_point[0] * zoom_level + map_offset_x,
-                            start_point[1] * zoom_level + map_offset_y)
-            end_screen = (end_point[0] * zoom_level + map_offset_x,
-                          end_point[1] * zoom_level + map_offset_y)
-            pygame.draw.aaline(pg, (100, 100, 100), start_screen, end_screen, 2)
-            force = 0.001
-            bubble["x"] += force * dx
-            bubble["y"] += force * dy
-            connected_bubble["x"] -= force * dx
-            connected_bubble["y"] -= force * dy
-
-
-def handle_bubble_collisions():
-    for i in range(len(bubbles)):
-        for j in range(i + 1, len(bubbles)):
-            bubble1 = bubbles[i]
-            bubble2 = bubbles[j]
-            if bubble1 is dragging_bubble or bubble2 is dragging_bubble:
-                continue
-            dx = bubble2["x"] - bubble1["x"]
-            dy = bubble2["y"] - bubble1["y"]
-            distance = math.hypot(dx, dy)
-            bubble1_bbox_radius = bubble1["radius"]
-            bubble2_radius = bubble2["radius"]
-            min_distance = (bubble1_bbox_radius + bubble2_radius) * min_distance_multiplier
-            if 0 < distance < min_distance:
-                overlap = min_distance - distance
-                nx = dx / distance
-                ny = dy / distance
-                push_strength = overlap / 2 * easing_factor
-                bubble1["x"] -= nx * push_strength
-                bubble1["y"] -= ny * push_strength
-                bubble2["x"] += nx * push_strength
-                bubble2["y"] += ny * push_strength
-
-
-def render_bubble_text(bubble, bubble_width_screen, text_color, text_block_start_y_screen, line_height_scaled):
+            return start_point, end_pos
+    return None
+
+
+def connection_preview_rect(preview_points):
+    (x1, y1), (x2, y2) = preview_points
+    return int(min(x1, x2)), int(min(y1, y2)), int(abs(x2 - x1)) + 2, int(abs(y2 - y1)) + 2
+
+
+def draw_connection_line_between_bubble_and_mouse(preview_points):
+    pygame.draw.aaline(pg, (200, 200, 200), preview_points[0], preview_points[1], 2)
+
+
+def draw_connection_line_between_bubbles(region):
+    connection_renderer.draw(pg, region)
+
+
+def layout_bubble_text(bubble, bubble_width_screen, text_color, text_block_start_y_screen, line_height_scaled,
+                       font_size_scaled, bubble_font):
     if bubble.get("text_alignment") == "left":
         bubble_center_x_screen = bubble["x"] * zoom_level + map_offset_x
         text_x_pos = bubble_center_x_screen - ((bubble_width_screen / 2) + 10) / 2
@@ -497,39 +451,23 @@ def render_bubble_text(bubble, bubble_width_screen, text_color, text_block_start
         text_x_pos = bubble_center_x_screen + ((bubble_width_screen / 2) - 10) / 2
     else:
         text_x_pos = bubble["x"] * zoom_level + map_offset_x
-    maxLineWidth = 0
-    for index, text in enumerate(bubble["rendered_lines"]):
-        text_to_render = text if text.strip() else "‎ "
-        rendered = bubble_font.render(text_to_render, True, text_color)
-        text_rect = rendered.get_rect()
-        if bubble.get("text_alignment") == "left":
-            text_rect.left = text_x_pos
-        elif bubble.get("text_alignment") == "right":
-            text_rect.right = text_x_pos
-        else:
-            text_rect.centerx = text_x_pos
-        maxLineWidth = max(maxLineWidth, text_rect.width)
-        text_rect.top = text_block_start_y_screen + (index * line_height_scaled)
-        pg.blit(rendered, text_rect)
-    return maxLineWidth
-
-
-def font_scaling(bubble, maxLineWidth, totalLineHeight):
-    maxDiameter = bubble["radius"] * math.sqrt(2) * zoom_level
-    minDiameter = bubble["radius"] * zoom_level
-    if max(maxLineWidth, totalLineHeight) > maxDiameter:
-        bubble["fm"] *= 0.99
-    elif max(maxLineWidth, totalLineHeight) < minDiameter:
-        bubble["fm"] *= 1.01
-
-
-def calc_font_and_line_height(bubble, rdef, zoom_level):
-    radius = bubble["radius"]
-    font_size_unscaled = max(1, int(24 * radius / rdef * bubble["fm"]))
-    font_size_scaled = max(1, int(font_size_unscaled * zoom_level))
-    bubble_font = pygame.font.SysFont(None, font_size_scaled)
+    rendered = text_surface_cache.get(bubble, bubble_font, font_size_scaled, line_height_scaled, text_color)
+    text_rect = rendered.get_rect()
+    if bubble.get("text_alignment") == "left":
+        text_rect.left = text_x_pos
+    elif bubble.get("text_alignment") == "right":
+        text_rect.right = text_x_pos
+    else:
+        text_rect.centerx = text_x_pos
+    text_rect.top = text_block_start_y_screen
+    return rendered, text_rect
+
+
+def calc_font_and_line_height(bubble, zoom_level):
+    font_size_scaled = font_manager.snap(max(1, int(bubble["font_size"] * zoom_level)))
+    bubble_font = font_manager.get(font_size_scaled)
     line_height_scaled = int(font_size_scaled * 0.8)
-    return bubble_font, line_height_scaled
+    return bubble_font, line_height_scaled, font_size_scaled
 
 
 def calc_bubble_screen_rect(bubble, zoom_level, map_offset_x, map_offset_y):
@@ -541,20 +479,51 @@ def calc_bubble_screen_rect(bubble, zoom_level, map_offset_x, map_offset_y):
     return x, y, w, h
 
 
+def calc_bubble_screen_rects(rows=None):
+    rows = slice(0, len(bubbles)) if rows is None else rows
+    r = bubbles.radius[rows]
+    rects = np.empty((len(r), 4))
+    rects[:, 0] = (bubbles.x[rows] - r) * zoom_level + map_offset_x
+    rects[:, 1] = (bubbles.y[rows] - r) * zoom_level + map_offset_y
+    rects[:, 2] = r * zoom_level * 2
+    rects[:, 3] = rects[:, 2]
+    return rects
+
+
+def calc_offscreen_rows(rects):
+    x, y, w, h = rects.T
+    return (w < 1) | (h < 1) | (x > width) | (y > height) | (x + w < 0) | (y + h < 0)
+
+
 def is_bubble_offscreen(x, y, w, h, screen_width, screen_height):
     return w < 1 or h < 1 or \
         x > screen_width or y > screen_height or \
         x + w < 0 or y + h < 0
 
 
-def render_bubble_image(surface, bubble_img_original, x, y, w, h, bubble_color):
-    scaled_bubble = pygame.transform.scale(bubble_img_original, (int(w), int(h)))
-    tinted_bubble = scaled_bubble.copy()
-    tint_surface = pygame.Surface(scaled_bubble.get_size(), pygame.SRCALPHA)
+def layout_bubble_image(x, y, w, h, bubble_color):
     bubble_bg_color = get_contrasting_bubble_color(bubble_color)
-    tint_surface.fill((*bubble_bg_color, 220))
-    tinted_bubble.blit(tint_surface, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
-    surface.blit(tinted_bubble, (x, y))
+    tinted_bubble = bubble_sprite_cache.get(w, bubble_bg_color)
+    size = tinted_bubble.get_width()
+    return tinted_bubble, (x + (w - size) / 2, y + (h - size) / 2)
+
+
+def prewarm_bubble_sprites(rows=None):
+    rows = np.arange(len(bubbles)) if rows is None else rows
+    rects = calc_bubble_screen_rects(rows)
+    # only on-screen bubbles drawn as sprites need one, so views are read for those rows alone
+    shown = (lod_tiers.tiers(rects[:, 2] / 2) >= lod.SPRITE) & ~calc_offscreen_rows(rects)
+    if not shown.any():
+        return
+    colors = np.array([bubbles[row]["color"] for row in rows[shown].tolist()], dtype=float).reshape(-1, 3)
+    keys = np.unique(np.stack((bubble_sprite_cache.buckets(rects[shown, 2]), calc_contrasting_bubble_colors(colors)),
+                              axis=1), axis=0)
+    bubble_sprite_cache.prewarm((bucket, contrasting_bubble_colors[contrast]) for bucket, contrast in keys.tolist())
+
+
+def prewarm_added_sprites(views):
+    # a chunk of the ingest is appended in one go, so its views are consecutive rows
+    prewarm_bubble_sprites(np.arange(views[0].row, views[-1].row + 1))
 
 
 def calc_bubble_text_layout(bubble, zoom_level, map_offset_y, line_height_scaled):
@@ -564,34 +533,174 @@ def calc_bubble_text_layout(bubble, zoom_level, map_offset_y, line_height_scaled
     return text_block_start_y, total_text_height
 
 
-def draw_bubbles():
-    global bubble_font
-    draw_connection_line_between_bubbles()
-    handle_bubble_collisions()
-    for bubble in bubbles:
+def prepare_bubble(bubble):
+    tier = bubble_tiers[bubble.row]
+    if tier == lod.CLUSTER:
+        return None
+    x, y, w, h = calc_bubble_screen_rect(bubble, zoom_level, map_offset_x, map_offset_y)
+    # checked before the name so bubbles off screen never decode it
+    if is_bubble_offscreen(x, y, w, h, width, height) or not any(bubble.get("name", [])):
+        return None
+    if tier == lod.DISC:
+        disc = (get_contrasting_bubble_color(bubble["color"]), (x + w / 2, y + h / 2), w / 2)
+        return None, None, None, None, disc
+    sprite, sprite_pos = layout_bubble_image(x, y, w, h, bubble["color"])
+    if tier == lod.SPRITE:
+        return sprite, sprite_pos, None, None, None
+    if not bubble.get("rendered_lines"):
+        wrap_lines(bubble)
         if not bubble.get("rendered_lines"):
-            wrap_lines(bubble)
-            if not bubble.get("rendered_lines"):
+            return None
+    bubble_font, line_height_scaled, font_size_scaled = calc_font_and_line_height(bubble, zoom_level)
+    text_block_start_y_screen, total_text_height = calc_bubble_text_layout(bubble, zoom_level, map_offset_y,
+                                                                           line_height_scaled)
+    text_surface, text_rect = layout_bubble_text(bubble, w, bubble["color"], text_block_start_y_screen,
+                                                 line_height_scaled, font_size_scaled, bubble_font)
+    return sprite, sprite_pos, text_surface, text_rect, None
+
+
+def calc_prepared_bubble_bounds(prepared):
+    sprite, sprite_pos, text_surface, text_rect, disc = prepared
+    if disc:
+        color, (center_x, center_y), radius = disc
+        return int(center_x - radius), int(center_y - radius), int(radius * 2) + 2, int(radius * 2) + 2
+    bounds = sprite.get_rect(topleft=sprite_pos)
+    return tuple(bounds.union(text_rect) if text_rect else bounds)
+
+
+def draw_bubble(prepared):
+    sprite, sprite_pos, text_surface, text_rect, disc = prepared
+    if disc:
+        pygame.draw.circle(pg, *disc)
+        return
+    pg.blit(sprite, sprite_pos)
+    if text_surface:
+        pg.blit(text_surface, text_rect)
+
+
+def calc_cluster_layer():
+    count = len(bubbles)
+    clustered = np.flatnonzero(bubble_tiers == lod.CLUSTER)
+    if len(clustered) == 0:
+        return np.full(count, -1), [], [], None
+    cluster_of, center_x, center_y, members = lod_tiers.cluster(bubbles.x[:count], bubbles.y[:count],
+                                                                bubbles.radius[:count], clustered, zoom_level)
+    glyph_x = np.round(center_x * zoom_level + map_offset_x).astype(np.int64)
+    glyph_y = np.round(center_y * zoom_level + map_offset_y).astype(np.int64)
+    glyph_radius = np.round(lod_tiers.glyph_radius(members)).astype(np.int64)
+    first, second, weights = lod_tiers.bundle(bubbles.edge_rows(), cluster_of)
+    node_x = np.concatenate((np.round(bubbles.x[:count] * zoom_level + map_offset_x).astype(np.int64), glyph_x))
+    node_y = np.concatenate((np.round(bubbles.y[:count] * zoom_level + map_offset_y).astype(np.int64), glyph_y))
+    line_width = 1 + np.log2(weights).astype(np.int64)
+    glyphs = list(zip(zip(glyph_x.tolist(), glyph_y.tolist()), glyph_radius.tolist()))
+    bundles = list(zip(zip(node_x[first].tolist(), node_y[first].tolist()),
+                       zip(node_x[second].tolist(), node_y[second].tolist()), line_width.tolist()))
+    signature = b"".join(array.tobytes() for array in (glyph_x, glyph_y, glyph_radius, node_x[first], node_y[first],
+                                                        node_x[second], node_y[second], line_width))
+    return cluster_of, glyphs, bundles, signature
+
+
+def calc_cluster_layer_bounds(glyphs, bundles):
+    if not glyphs:
+        return None
+    xs = [x for (x, y), radius in glyphs] + [x for start, end, line_width in bundles for x in (start[0], end[0])]
+    ys = [y for (x, y), radius in glyphs] + [y for start, end, line_width in bundles for y in (start[1], end[1])]
+    reach = lod_tiers.cluster_cell
+    return min(xs) - reach, min(ys) - reach, max(xs) - min(xs) + reach * 2, max(ys) - min(ys) + reach * 2
+
+
+def draw_cluster_layer():
+    for start, end, line_width in cluster_bundles:
+        pygame.draw.line(pg, (100, 100, 100), start, end, line_width)
+    for center, radius in cluster_glyphs:
+        pygame.draw.circle(pg, (150, 150, 150), center, radius)
+        pygame.draw.circle(pg, (230, 230, 230), center, radius, 1)
+
+
+def update_bubbles():
+    global bubble_tiers, cluster_of, cluster_glyphs, cluster_bundles
+    bubble_tiers = lod_tiers.tiers(bubbles.radius[:len(bubbles)] * zoom_level)
+    rects = calc_bubble_screen_rects()
+    changed = dirty_tracker.begin((zoom_level, map_offset_x, map_offset_y, width, height), bubbles.edge_version,
+                                  rects, bubbles.versions[:len(bubbles)])
+    dirty_tracker.mark_edges(bubbles.edge_rows(), changed)
+    prepared_bubbles.clear()
+    # panning or zooming changes every row, so the ones off screen are dropped before the per bubble loop
+    hidden = (bubble_tiers[changed] == lod.CLUSTER) | calc_offscreen_rows(rects[changed])
+    dirty_tracker.clear_bounds(changed[hidden])
+    for row in changed[~hidden].tolist():
+        prepared = prepare_bubble(bubbles[row])
+        dirty_tracker.set_bounds(row, calc_prepared_bubble_bounds(prepared) if prepared else None)
+        if prepared:
+            prepared_bubbles[row] = prepared
+    cluster_of, cluster_glyphs, cluster_bundles, signature = calc_cluster_layer()
+    edges = bubbles.edge_rows()
+    edges = edges[(cluster_of[edges[:, 0]] < 0) & (cluster_of[edges[:, 1]] < 0)]
+    connection_renderer.prepare(bubbles.x, bubbles.y, bubbles.radius, edges, zoom_level, map_offset_x, map_offset_y)
+    dirty_tracker.overlay("clusters", calc_cluster_layer_bounds(cluster_glyphs, cluster_bundles), signature)
+
+
+def draw_bubbles(region):
+    draw_connection_line_between_bubbles(region)
+    draw_cluster_layer()
+    for row in dirty_tracker.rows_in(region).tolist():
+        prepared = prepared_bubbles.get(row)
+        if prepared is None:
+            prepared = prepare_bubble(bubbles[row])
+            if prepared is None:
                 continue
-        bubble_font, line_height_scaled = calc_font_and_line_height(bubble, rdef, zoom_level)
-        x, y, w, h = calc_bubble_screen_rect(bubble, zoom_level, map_offset_x, map_offset_y)
-        if is_bubble_offscreen(x, y, w, h, width, height):
-            continue
-        render_bubble_image(pg, bubble_img_original, x, y, w, h, bubble["color"])
-        bubble_radius = bubble["radius"]
-        bubble_width_screen = bubble_radius * zoom_level * 2
-        text_color = bubble["color"]
-        text_block_start_y_screen, total_text_height = calc_bubble_text_layout(bubble, zoom_level, map_offset_y,
-                                                                               line_height_scaled)
-        maxLineWidth = render_bubble_text(bubble, bubble_width_screen, text_color, text_block_start_y_screen, line_height_scaled)
-        font_scaling(bubble, maxLineWidth, total_text_height)
+            prepared_bubbles[row] = prepared
+        draw_bubble(prepared)
+
+
+def open_world(path):
+    global autosave, world
+    # the map in memory stays in the autosave and goes into the world if that is new
+    autosave.compact(bubbles)
+    autosave.close()
+    world = world_store.WorldStore(path, bubbles, bubble_defaults)
+    if len(world) == 0:
+        world.import_store()
+    world.open()
+    autosave = world
+    print(f"Opened world '{path}' with {len(world)} bubbles")
+
+
+def update_world():
+    global connecting_bubble, dragging_bubble
+    if world.update(-map_offset_x / zoom_level, -map_offset_y / zoom_level, (width - map_offset_x) / zoom_level,
+                    (height - map_offset_y) / zoom_level):
+        # evicted bubbles have no row anymore
+        if connecting_bubble is not None and connecting_bubble.row < 0:
+            connecting_bubble = None
+        if dragging_bubble is not None and dragging_bubble.row < 0:
+            dragging_bubble = None
+        if editing_bubble is not None and editing_bubble.row < 0:
+            tk_commands.submit("close")
+        bubble_simulation.wake()
+        prewarm_bubble_sprites()
+
+
+def paint(region, preview_points, show_welcome):
+    pg.set_clip(region)
+    pg.fill((0, 0, 0), region)
+    if preview_points:
+        draw_connection_line_between_bubble_and_mouse(preview_points)
+    draw_bubbles(region)
+    if show_welcome:
+        pg.blit(welcomeText, (width // 2 - halfWelcomeTextWidth, height // 2 - halfWelcomeTextHeight))
+    pg.blit(zoom_text, (10, 10))
+    pg.set_clip(None)
 
 
 pg = pygame.display.set_mode((screen_width // 1.5, screen_height // 1.5 * 1.2), pygame.RESIZABLE)
 pygame.display.set_caption("Bubble Net")
-bubbles = []
-bubble_font = pygame.font.SysFont(None, 24)
-basicFont = pygame.font.SysFont(None, 24)
+font_manager = font_cache.FontCache()
+text_surface_cache = text_cache.TextSurfaceCache()
+bubble_sprite_cache = sprite_cache.BubbleSpriteCache(bubble_img_original)
+# sprite tints behind light and behind dark text
+contrasting_bubble_colors = ((240, 240, 240), (40, 40, 40))
+basicFont = font_manager.get(24)
 welcomeText = basicFont.render("Nothing here yet. Start to spread your creativity!", True, (255, 255, 255))
 halfWelcomeTextWidth = welcomeText.get_width() // 2
 halfWelcomeTextHeight = welcomeText.get_height() // 2
@@ -606,8 +715,17 @@ map_offset_x = 0
 map_offset_y = 0
 dragging_map = False
 last_mouse_pos = (0, 0)
-easing_factor = 0.1
 min_distance_multiplier = 1.1
+map_path = "bubbles.bmap"
+world_path = "bubbles.world"
+bubble_defaults = {"font_size": None, "rendered_lines": (), "text_surface": None}
+bubbles = bubble_store.BubbleStore(physics.collision_cell_size(rmax, min_distance_multiplier))
+force_layout = layout.ForceLayout(theta=1.2, spacing=150.0)
+# scripts and other components load bubbles through bubble_ingest.submit from any thread
+bubble_ingest = ingest.BubbleIngest(radius=rdef, center=(pg.get_width() / 2, pg.get_height() / 2))
+main_command_handlers = {"edit": apply_bubble_edit}
+bubble_simulation = simulation.Simulation(bubbles, rmax, substeps=1, spring_stiffness=0.12, easing_rate=12.0,
+                                          min_distance_multiplier=min_distance_multiplier, layout=force_layout)
 click_start = None
 moved = False
 connecting_bubble = None
@@ -616,44 +734,104 @@ min_zoom = 0.3
 max_zoom = 3
 zoom_speed = 0.1
 zoom = 0
-batter_saving_cooldown = 0
-clock = pygame.time.Clock()
+battery_screen_shown = False
+dirty_tracker = dirty_rects.DirtyTracker()
+prepared_bubbles = {}
+connection_renderer = edge_renderer.EdgeRenderer(palette=[(100, 100, 100)])
+lod_tiers = lod.LodTiers(text_below=10.0, disc_below=6.0, cluster_below=4.0, cluster_cell=24, max_bundles=2000)
+bubble_tiers = np.zeros(0, dtype=np.int64)
+cluster_of = np.zeros(0, dtype=np.int64)
+cluster_glyphs = []
+cluster_bundles = []
+zoom_text = None
+startup_benchmark = os.environ.get("BUBBLES_STARTUP_BENCHMARK") == "1"
+# a benchmark run starts from an empty autosave of its own instead of recovering and compacting the real one
+autosave_folder = tempfile.TemporaryDirectory() if startup_benchmark else None
+autosave_path = autosave_folder.name if autosave_folder is not None else ""
+autosave = journal.Journal(os.path.join(autosave_path, "autosave.journal"),
+                           os.path.join(autosave_path, "autosave.bmap"), flush_interval=0.5, compact_after=2000)
+world = None
+if len(sys.argv) > 1:
+    # a world given on the command line is streamed instead of recovering the autosave into memory
+    open_world(sys.argv[1])
+else:
+    recovered_edits = autosave.recover(bubbles, bubble_defaults)
+    if len(bubbles):
+        print(f"Recovered {len(bubbles)} bubbles and {recovered_edits} edits in {autosave.recovery_seconds * 1000:.0f} ms")
+        prewarm_bubble_sprites()
+    autosave.start()
+main_loop_scheduler = frame_scheduler.FrameScheduler(active_fps=120, idle_fps=10, idle_after=1.0, sleep_after=20.0)
+last_frame_time = time.perf_counter()
+pygame.display.set_icon(bubble_icon)
 while running:
-    pg.fill((0, 0, 0))
-    events = pygame.event.get()
-    if batter_saving_cooldown > 2000:
+    events = main_loop_scheduler.wait()
+    frame_time = time.perf_counter()
+    bubble_simulation.dragging_bubble = dragging_bubble
+    bubble_simulation.advance(frame_time - last_frame_time)
+    last_frame_time = frame_time
+    if main_loop_scheduler.mode == "sleep":
         for event in events:
             if event.type == pygame.QUIT:
                 running = False
-        if events:
-            batter_saving_cooldown = 0
-        pg.blit(batter_saving_icon, (width // 2 - half_batter_saving_icon_width,
-                                     height // 2 - half_batter_saving_icon_height - half_batter_saving_icon_height * 2))
-        pg.blit(batterSavingText, (width // 2 - halfbatterSavingTextWidth, height // 2 - halfbatterSavingTextHeight))
-        pygame.display.set_icon(batter_saving_icon)
+        if not battery_screen_shown:
+            pg.fill((0, 0, 0))
+            pg.blit(batter_saving_icon, (width // 2 - half_batter_saving_icon_width,
+                                         height // 2 - half_batter_saving_icon_height - half_batter_saving_icon_height * 2))
+            pg.blit(batterSavingText, (width // 2 - halfbatterSavingTextWidth, height // 2 - halfbatterSavingTextHeight))
+            pygame.display.set_icon(batter_saving_icon)
+            pygame.display.update()
+            battery_screen_shown = True
     else:
         width = pg.get_width()
         height = pg.get_height()
-        pygame.display.set_icon(bubble_icon)
-        try:
-            bubble_data = bubble_queue.get(block=False)
-            create_bubble(bubble_data)
-        except queue.Empty:
-            pass
+        if battery_screen_shown:
+            pygame.display.set_icon(bubble_icon)
+            dirty_tracker.invalidate()
+            battery_screen_shown = False
+        run_main_commands()
+        if bubble_ingest.drain(bubbles, fit_font_size, autosave, prewarm_added_sprites):
+            bubble_simulation.wake()
         for event in events:
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                dirty_tracker.invalidate()
             elif event.type == pygame.KEYDOWN:
-                batter_saving_cooldown = 0
                 if event.key == pygame.K_SPACE:
-                    tk_queue.put("cc")
+                    open_dialog("create")
+                elif event.key == pygame.K_l:
+                    force_layout.toggle()
+                    bubble_simulation.wake()
                 mods = pygame.key.get_mods()
-                if mods & pygame.KMOD_CTRL and event.key == pygame.K_s:
-                    print(bubbles)
-                elif mods and pygame.KMOD_CTRL and event.key == pygame.K_o:
-                    bubbles = list(input("Send your code here: "))
+                if mods & pygame.KMOD_CTRL and event.key == pygame.K_s and world is not None:
+                    world.compact(bubbles)
+                    print(f"Saved the loaded chunks of '{world.path}'")
+                elif mods & pygame.KMOD_CTRL and event.key == pygame.K_w and world is None:
+                    open_world(world_path)
+                    connecting_bubble = None
+                    dragging_bubble = None
+                    dirty_tracker.invalidate()
+                elif mods & pygame.KMOD_CTRL and event.key == pygame.K_s:
+                    start = time.perf_counter()
+                    size = map_file.save(bubbles, map_path)
+                    print(f"Saved {len(bubbles)} bubbles to '{map_path}' ({size / 1e6:.2f} MB) in "
+                          f"{(time.perf_counter() - start) * 1000:.0f} ms")
+                elif mods & pygame.KMOD_CTRL and event.key == pygame.K_o and world is None:
+                    start = time.perf_counter()
+                    try:
+                        map_file.load(bubbles, map_path, bubble_defaults)
+                    except (OSError, ValueError) as error:
+                        print(f"Couldn't open '{map_path}': {error}")
+                    else:
+                        print(f"Opened {len(bubbles)} bubbles from '{map_path}' in "
+                              f"{(time.perf_counter() - start) * 1000:.0f} ms")
+                        autosave.compact_from(map_path)
+                        bubble_simulation.wake()
+                    connecting_bubble = None
+                    dragging_bubble = None
+                    dirty_tracker.invalidate()
+                    prewarm_bubble_sprites()
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                batter_saving_cooldown = 0
                 mx, my = event.pos
                 world_mx = (mx - map_offset_x) / zoom_level
                 world_my = (my - map_offset_y) / zoom_level
@@ -662,7 +840,8 @@ while running:
                 elif event.button == 3:
                     handle_mouse_button_three_down()
             elif event.type == pygame.MOUSEBUTTONUP:
-                batter_saving_cooldown = 0
+                if dragging_bubble is not None and moved:
+                    autosave.record_move(dragging_bubble)
                 dragging_bubble = None
                 click_start = None
                 dragging_map = False
@@ -671,21 +850,42 @@ while running:
             elif event.type == pygame.MOUSEMOTION:
                 handle_mouse_motion()
             elif event.type == pygame.MOUSEWHEEL:
-                batter_saving_cooldown = 0
                 handle_zoom(event)
-        if not events:
-            batter_saving_cooldown += 1
         for event in pygame.event.get(pump=False):
             if event.type == pygame.MOUSEWHEEL:
                 handle_zoom(event)
-        if connecting_bubble:
-            draw_connection_line_between_bubble_and_mouse(connecting_bubble)
-        if len(bubbles) > 0:
-            draw_bubbles()
-        elif tk_queue.empty() and tk is None:
-            pg.blit(welcomeText, (width // 2 - halfWelcomeTextWidth, height // 2 - halfWelcomeTextHeight))
-        zoom_text = basicFont.render(f"Zoom: {zoom_level:.2f}x", True, (200, 200, 200))
-        pg.blit(zoom_text, (10, 10))
-    pygame.display.update()
-    clock.tick(120)
+        if world is not None:
+            update_world()
+        update_bubbles()
+        preview_points = connection_preview_points(connecting_bubble) if connecting_bubble else None
+        dirty_tracker.overlay("preview", connection_preview_rect(preview_points) if preview_points else None,
+                              preview_points)
+        show_welcome = len(bubbles) == 0 and tk_commands.empty() and bubble_ingest.empty() and (dialogs is None or dialogs.shown is None)
+        dirty_tracker.overlay("welcome", (width // 2 - halfWelcomeTextWidth, height // 2 - halfWelcomeTextHeight,
+                                          welcomeText.get_width(), welcomeText.get_height()) if show_welcome else None)
+        layout_text = "  Layout: running" if force_layout.active else ""
+        zoom_string = f"Zoom: {zoom_level:.2f}x{layout_text}"
+        if dirty_tracker.overlays.get("zoom", (None, None))[1] != zoom_string:
+            zoom_text = basicFont.render(zoom_string, True, (200, 200, 200))
+        dirty_tracker.overlay("zoom", (10, 10, zoom_text.get_width(), zoom_text.get_height()), zoom_string)
+        full, regions = dirty_tracker.finish(pg.get_size())
+        for region in regions:
+            paint(region, preview_points, show_welcome)
+        if full:
+            pygame.display.update()
+        elif regions:
+            pygame.display.update(regions)
+        dirty_tracker.presented(bool(regions))
+        if startup_benchmark and dirty_tracker.presented_frames:
+            print(f"First frame after {(time.perf_counter() - startup_start) * 1000:.1f} ms")
+            running = False
+        main_loop_scheduler.keep_busy(bool(regions) or not bubble_simulation.settled or force_layout.active
+                                      or dragging_bubble is not None or dragging_map
+                                      or (world is not None and world.loading))
+        autosave.record_positions_if_due(bubbles, bubble_simulation.settled and not force_layout.active)
+        if not regions and bubble_simulation.settled:
+            autosave.compact_if_due(bubbles)
+tk_commands.stop()
+autosave.compact(bubbles)
+autosave.close()
 pygame.quit()
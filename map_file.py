@@ -0,0 +1,218 @@
+import gc
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+import bubble_store
+
+MAGIC = b"BUBL"
+VERSION = 1
+# magic, format version, reserved, bubble, connection and string count, offsets of the four sections
+HEADER = struct.Struct("<4sHHQQQQQQQ")
+ALIGNMENTS = ("left", "center", "right")
+BUBBLE_DTYPE = np.dtype([("id", "<i8"), ("x", "<f8"), ("y", "<f8"), ("radius", "<f4"), ("text", "<u4"),
+                         ("color", "u1", (3,)), ("alignment", "u1")])
+
+
+def align(offset: int) -> int:
+    """Round an offset up to the next multiple of 8."""
+    return (offset + 7) & ~7
+
+
+class MappedMap:
+    """Memory-mapped map file whose bubble texts are only decoded when a bubble's name is first read."""
+
+    keys = ("name",)
+
+    def __init__(self, path: str):
+        """
+        Mapped map
+
+        Args:
+            path: Path of a map file written by save
+        """
+        self.file = open(path, "rb")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError(f"'{path}' is empty")
+        if len(self.map) < HEADER.size:
+            self.close()
+            raise ValueError(f"'{path}' is not a bubble map")
+        (magic, version, _, bubble_count, edge_count, string_count,
+         bubbles_at, edges_at, offsets_at, data_at) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"'{path}' is not a bubble map")
+        if version > VERSION:
+            self.close()
+            raise ValueError(f"'{path}' was saved in format {version}, this version reads up to {VERSION}")
+        self.version = version
+        self.bubbles = np.frombuffer(self.map, BUBBLE_DTYPE, bubble_count, bubbles_at)
+        self.edges = np.frombuffer(self.map, "<i8", edge_count * 2, edges_at).reshape(-1, 2)
+        self.string_offsets = np.frombuffer(self.map, "<u8", string_count + 1, offsets_at)
+        self.data_at = data_at
+        self.position_of = None
+
+    def text(self, index: int) -> str:
+        """Decode one string of the string table."""
+        start = self.data_at + int(self.string_offsets[index])
+        end = self.data_at + int(self.string_offsets[index + 1])
+        return self.map[start:end].decode("utf-8")
+
+    def load(self, view, key: str):
+        """Decode the name of a loaded bubble, see BubbleStore.lazy_fields."""
+        return self.text(int(self.bubbles["text"][self.position_of[view.id]])).split("\n")
+
+    def close(self) -> None:
+        """Drop the arrays into the mapping and unmap the file."""
+        self.bubbles = self.edges = self.string_offsets = self.position_of = None
+        if getattr(self, "map", None) is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+
+def pack(store) -> list:
+    """Encode all bubbles and connections as the byte chunks of a map file, see write."""
+    # every name has to be read anyway, and a mapping of the old file must not outlive it being replaced
+    store.materialize()
+    count = len(store)
+    table = np.zeros(count, BUBBLE_DTYPE)
+    table["id"] = store.ids[:count]
+    table["x"] = store.x[:count]
+    table["y"] = store.y[:count]
+    table["radius"] = store.radius[:count]
+    strings = {}
+    texts = []
+    colors = []
+    alignments = []
+    for view in store:
+        fields = view.fields
+        texts.append(strings.setdefault("\n".join(fields["name"]), len(strings)))
+        colors.append(fields["color"])
+        alignments.append(ALIGNMENTS.index(fields.get("text_alignment", "center")))
+    if count:
+        table["text"] = texts
+        table["color"] = colors
+        table["alignment"] = alignments
+    encoded = [text.encode("utf-8") for text in strings]
+    string_offsets = np.zeros(len(encoded) + 1, "<u8")
+    string_offsets[1:] = np.cumsum([len(data) for data in encoded])
+    edges = np.ascontiguousarray(store.graph.edge_ids(), dtype="<i8")
+    bubbles_at = align(HEADER.size)
+    edges_at = align(bubbles_at + table.nbytes)
+    offsets_at = align(edges_at + edges.nbytes)
+    data_at = align(offsets_at + string_offsets.nbytes)
+    header = HEADER.pack(MAGIC, VERSION, 0, count, len(edges), len(encoded), bubbles_at, edges_at, offsets_at, data_at)
+    chunks = []
+    size = 0
+    for offset, data in ((0, header), (bubbles_at, table.tobytes()), (edges_at, edges.tobytes()),
+                         (offsets_at, string_offsets.tobytes()), (data_at, b"".join(encoded))):
+        chunks.append(b"\0" * (offset - size))
+        chunks.append(data)
+        size = offset + len(data)
+    return chunks
+
+
+def write(chunks: list, path: str) -> int:
+    """Write packed chunks to a temporary file, sync it and move it over path, and get the file size in bytes."""
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.writelines(chunks)
+        file.flush()
+        os.fsync(file.fileno())
+        size = file.tell()
+    os.replace(temporary_path, path)
+    return size
+
+
+def save(store, path: str) -> int:
+    """Write all bubbles and connections to a map file and get its size in bytes."""
+    return write(pack(store), path)
+
+
+def load(store, path: str, defaults: dict) -> int:
+    """
+    Replace the content of a store with a map file and get the number of bubbles.
+
+    Args:
+        store: The bubble store to fill, its ids are taken over from the file
+        path: Path of the map file
+        defaults: Fields every bubble gets besides its color, alignment and name, shared between all bubbles
+    """
+    mapped = MappedMap(path)
+    table = mapped.bubbles
+    colors = list(map(tuple, table["color"].tolist()))
+    alignments = [ALIGNMENTS[index] for index in table["alignment"].tolist()]
+    store.clear()
+    ids = table["id"].astype(np.int64)
+    # none of the dicts and views made here can be garbage, so collecting while making them is wasted time
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        fields = [{**defaults, "color": color, "text_alignment": alignment}
+                  for color, alignment in zip(colors, alignments)]
+        store.add_many(table["x"], table["y"], table["radius"].astype(np.float64), fields, ids)
+    except ValueError:
+        mapped.close()
+        raise
+    finally:
+        if collecting:
+            gc.enable()
+    mapped.position_of = np.full(store.next_id, -1, dtype=np.int64)
+    mapped.position_of[ids] = np.arange(len(ids))
+    store.connect_many(mapped.edges[:, 0], mapped.edges[:, 1])
+    store.lazy_fields = mapped
+    return len(store)
+
+
+def benchmark_formats(counts=(10000, 100000, 300000), path="benchmark.bmap"):
+    """Compare save and load time and file size with a JSON dump of the same map."""
+    rng = np.random.default_rng(1)
+    names = [["repeated title"], ["two", "lines"], ["ünïcödé ✓"], ["", "blank first line"]]
+    for count in counts:
+        store = bubble_store.BubbleStore(220.0, capacity=count)
+        store.add_many(rng.uniform(-1e4, 1e4, count), rng.uniform(-1e4, 1e4, count), rng.uniform(12, 100, count),
+                       [{"name": names[index % 4] if index % 3 else [f"bubble {index}", "some more text"],
+                         "color": (index % 256, 100, 200), "text_alignment": ALIGNMENTS[index % 3]}
+                        for index in range(count)])
+        store.connect_many(rng.integers(0, count, count), rng.integers(0, count, count))
+        start = time.perf_counter()
+        size = save(store, path)
+        save_seconds = time.perf_counter() - start
+        loaded = bubble_store.BubbleStore(220.0)
+        start = time.perf_counter()
+        load(loaded, path, {"font_size": None, "rendered_lines": (), "text_surface": None})
+        load_seconds = time.perf_counter() - start
+        loaded.close_lazy_fields()
+        start = time.perf_counter()
+        document = json.dumps({"bubbles": [{"id": view.id, "x": view["x"], "y": view["y"], "radius": view["radius"],
+                                            "name": view["name"], "color": view["color"],
+                                            "text_alignment": view["text_alignment"]} for view in store],
+                               "connections": store.graph.edge_ids().tolist()})
+        json_save_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        data = json.loads(document)
+        json_store = bubble_store.BubbleStore(220.0)
+        bubbles = data["bubbles"]
+        json_store.add_many(np.array([bubble["x"] for bubble in bubbles]), np.array([bubble["y"] for bubble in bubbles]),
+                            np.array([bubble["radius"] for bubble in bubbles]),
+                            [{"name": bubble["name"], "color": tuple(bubble["color"]),
+                              "text_alignment": bubble["text_alignment"]} for bubble in bubbles],
+                            np.array([bubble["id"] for bubble in bubbles]))
+        connections = np.array(data["connections"]).reshape(-1, 2)
+        json_store.connect_many(connections[:, 0], connections[:, 1])
+        json_load_seconds = time.perf_counter() - start
+        print(f"{count:>7} bubbles: binary {size / 1e6:6.2f} MB, save {save_seconds:5.2f} s, load {load_seconds:5.2f} s"
+              f" | json {len(document) / 1e6:6.2f} MB, save {json_save_seconds:5.2f} s, load {json_load_seconds:5.2f} s")
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    benchmark_formats()
@@ -0,0 +1,74 @@
+import math
+import time
+
+import numpy as np
+
+import bubble_store
+
+
+def collision_cell_size(rmax, min_distance_multiplier):
+    """Get the smallest cell size at which only neighbouring cells can hold overlapping bubbles."""
+    return 2 * rmax * min_distance_multiplier
+
+
+def handle_bubble_collisions(store, dragging_bubble, rmax, min_distance_multiplier, easing_factor):
+    """Push overlapping bubbles apart, testing only pairs found in neighbouring grid cells."""
+    count = store.count
+    x, y, radius = store.x[:count], store.y[:count], store.radius[:count]
+    store.grid.rebuild(x, y, collision_cell_size(max(rmax, radius.max(initial=0)), min_distance_multiplier))
+    first, second = store.grid.pairs()
+    if dragging_bubble is not None:
+        free = (first != dragging_bubble.row) & (second != dragging_bubble.row)
+        first, second = first[free], second[free]
+    dx = x[second] - x[first]
+    dy = y[second] - y[first]
+    distance_squared = dx * dx + dy * dy
+    min_distance = (radius[first] + radius[second]) * min_distance_multiplier
+    overlapping = np.flatnonzero((distance_squared > 0) & (distance_squared < min_distance * min_distance))
+    if len(overlapping) == 0:
+        return
+    first, second = first[overlapping], second[overlapping]
+    dx, dy = dx[overlapping], dy[overlapping]
+    distance = np.sqrt(distance_squared[overlapping])
+    push_strength = (min_distance[overlapping] - distance) / 2 * easing_factor / distance
+    push_x = dx * push_strength
+    push_y = dy * push_strength
+    x -= np.bincount(first, push_x, count) - np.bincount(second, push_x, count)
+    y -= np.bincount(first, push_y, count) - np.bincount(second, push_y, count)
+
+
+def apply_spring_forces(store, force):
+    """Pull every pair of connected bubbles towards each other."""
+    edges = store.edge_rows()
+    if len(edges) == 0:
+        return
+    count = store.count
+    x, y = store.x[:count], store.y[:count]
+    source, target = edges[:, 0], edges[:, 1]
+    pull_x = force * (x[target] - x[source])
+    pull_y = force * (y[target] - y[source])
+    x += np.bincount(source, pull_x, count) - np.bincount(target, pull_x, count)
+    y += np.bincount(source, pull_y, count) - np.bincount(target, pull_y, count)
+
+
+def benchmark_collisions(counts=(100, 1000, 10000, 20000), rmin=12, rmax=100, repeats=5):
+    """Time one collision and spring pass for growing maps of constant bubble density."""
+    rng = np.random.default_rng(0)
+    for count in counts:
+        side = math.sqrt(count) * rmax * 1.5
+        store = bubble_store.BubbleStore(collision_cell_size(rmax, 1.1), capacity=count)
+        for x, y, radius in zip(rng.uniform(0, side, count), rng.uniform(0, side, count),
+                                rng.uniform(rmin, rmax, count)):
+            store.add({"x": x, "y": y, "radius": radius})
+        for source, target in rng.integers(0, count, (count, 2)).tolist():
+            store.connect(store[source], store[target])
+        start = time.perf_counter()
+        for _ in range(repeats):
+            handle_bubble_collisions(store, None, rmax, 1.1, 0.1)
+            apply_spring_forces(store, 0.001)
+        elapsed = (time.perf_counter() - start) / repeats
+        print(f"{count:>6} bubbles: {elapsed * 1000:8.2f} ms per pass, {elapsed * 1e6 / count:6.2f} us per bubble")
+
+
+if __name__ == "__main__":
+    benchmark_collisions()
@@ -0,0 +1,122 @@
+import math
+import time
+
+import numpy as np
+
+import bubble_store
+import physics
+
+
+class Simulation:
+    """Fixed-timestep bubble physics that runs independently of drawing."""
+
+    def __init__(self, store, rmax: float, timestep: float = 1 / 120, substeps: int = 1,
+                 spring_stiffness: float = 0.12, easing_rate: float = 12.0, min_distance_multiplier: float = 1.1,
+                 max_steps_per_advance: int = 8, settle_tolerance: float = 0.01, layout=None):
+        """
+        Simulation
+
+        Args:
+            store: The bubble store to move
+            rmax: Largest bubble radius, used for the collision grid
+            timestep: Simulated seconds per step
+            substeps: Number of physics passes per step
+            spring_stiffness: Share of the distance between connected bubbles they move towards each other per second
+            easing_rate: Share of an overlap that is resolved per second
+            min_distance_multiplier: Factor on the radius sum below which two bubbles overlap
+            max_steps_per_advance: Most steps run for one advance call, so a slow frame can't spiral
+            settle_tolerance: Largest movement per step in world units at which the layout counts as settled
+            layout: Optional force layout stepped before the springs, see layout.ForceLayout
+        """
+        self.store = store
+        self.rmax = rmax
+        self.timestep = timestep
+        self.substeps = max(1, substeps)
+        self.spring_stiffness = spring_stiffness
+        self.easing_rate = easing_rate
+        self.min_distance_multiplier = min_distance_multiplier
+        self.max_steps_per_advance = max_steps_per_advance
+        self.settle_tolerance = settle_tolerance
+        self.layout = layout
+        self.dragging_bubble = None
+        self.accumulator = 0.0
+        self.last_movement = math.inf
+        self.settled = False
+        self.step_seconds = 0.0
+
+    def step(self, dt: float) -> float:
+        """Advance the layout by dt seconds and get the largest distance a bubble moved."""
+        start = time.perf_counter()
+        store = self.store
+        count = store.count
+        if count == 0:
+            self.last_movement = 0.0
+            self.settled = True
+            return 0.0
+        before_x = store.x[:count].copy()
+        before_y = store.y[:count].copy()
+        substep_dt = dt / self.substeps
+        spring_force = self.spring_stiffness * substep_dt
+        easing_factor = min(1.0, self.easing_rate * substep_dt)
+        if self.layout is not None:
+            self.layout.step(store, self.dragging_bubble)
+        for _ in range(self.substeps):
+            physics.apply_spring_forces(store, spring_force)
+            physics.handle_bubble_collisions(store, self.dragging_bubble, self.rmax, self.min_distance_multiplier,
+                                             easing_factor)
+        movement = float(np.max(np.hypot(store.x[:count] - before_x, store.y[:count] - before_y)))
+        self.last_movement = movement
+        self.settled = movement < self.settle_tolerance
+        self.step_seconds = time.perf_counter() - start
+        return movement
+
+    def wake(self) -> None:
+        """Step again on the next advance, call it after something moved, resized, added or connected bubbles."""
+        self.settled = False
+
+    def advance(self, elapsed: float) -> int:
+        """Run as many fixed steps as fit into the elapsed wall time and get their number, none once settled."""
+        if self.settled and (self.layout is None or not self.layout.active):
+            # idle and woken frames cost no physics until wake is called
+            self.accumulator = 0.0
+            return 0
+        start = time.perf_counter()
+        self.accumulator = min(self.accumulator + elapsed, self.timestep * self.max_steps_per_advance)
+        steps = 0
+        while self.accumulator >= self.timestep:
+            self.step(self.timestep)
+            self.accumulator -= self.timestep
+            steps += 1
+            if time.perf_counter() - start > self.timestep:
+                # stepping is slower than real time, so slow the layout down instead of piling up steps
+                self.accumulator = 0.0
+                break
+        return steps
+
+    def settle(self, max_steps: int = 10000) -> int:
+        """Step without a window until the layout settles and get the number of steps it took."""
+        for steps in range(1, max_steps + 1):
+            self.step(self.timestep)
+            if self.settled:
+                return steps
+        return max_steps
+
+
+def benchmark_settle(counts=(100, 1000, 10000), rmin=12, rmax=100):
+    """Settle random maps headlessly and report simulation cost alone."""
+    rng = np.random.default_rng(0)
+    for count in counts:
+        side = math.sqrt(count) * rmax * 1.5
+        store = bubble_store.BubbleStore(physics.collision_cell_size(rmax, 1.1), capacity=count)
+        for x, y, radius in zip(rng.uniform(0, side, count), rng.uniform(0, side, count),
+                                rng.uniform(rmin, rmax, count)):
+            store.add({"x": x, "y": y, "radius": radius})
+        simulation = Simulation(store, rmax, settle_tolerance=0.05)
+        start = time.perf_counter()
+        steps = simulation.settle(2000)
+        elapsed = time.perf_counter() - start
+        print(f"{count:>6} bubbles: {steps:>5} steps in {elapsed:7.2f} s, {elapsed * 1000 / steps:6.2f} ms per step")
+
+
+if __name__ == "__main__":
+    benchmark_settle()
@@ -0,0 +1,108 @@
+from typing import Tuple
+
+import numpy as np
+
+NEIGHBOUR_OFFSETS = ((0, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+class SpatialHash:
+    """Uniform grid over bubble centers, stored as rows sorted by cell key."""
+
+    def __init__(self, cell_size: float):
+        """
+        Spatial hash
+
+        Args:
+            cell_size: Edge length of a cell, at least the largest distance at which two bubbles interact
+        """
+        self.cell_size = cell_size
+        self.order = np.zeros(0, dtype=np.int64)
+        self.sorted_keys = np.zeros(0, dtype=np.int64)
+        self.origin = (0, 0)
+        self.stride = 1
+        self.moved = set()
+        self.valid = False
+
+    def cells_of(self, x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the cell coordinates of world positions."""
+        return (np.floor(x / self.cell_size).astype(np.int64),
+                np.floor(y / self.cell_size).astype(np.int64))
+
+    def rebuild(self, x: np.ndarray, y: np.ndarray, cell_size: float = None) -> None:
+        """Sort all rows by the cell their center lies in."""
+        if cell_size:
+            self.cell_size = cell_size
+        self.moved.clear()
+        if len(x) == 0:
+            self.order = np.zeros(0, dtype=np.int64)
+            self.sorted_keys = np.zeros(0, dtype=np.int64)
+            self.valid = True
+            return
+        cx, cy = self.cells_of(x, y)
+        min_cx, min_cy = int(cx.min()), int(cy.min())
+        self.origin = (min_cx, min_cy)
+        self.stride = int(cy.max()) - min_cy + 3
+        keys = (cx - min_cx + 1) * self.stride + (cy - min_cy + 1)
+        self.order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.order]
+        self.valid = True
+
+    def invalidate(self) -> None:
+        """Forget the sorted rows, e.g. after rows were removed."""
+        self.valid = False
+
+    def mark_moved(self, row: int) -> None:
+        """Remember a row whose position changed after the last rebuild."""
+        self.moved.add(row)
+
+    def pairs(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Get every pair of rows that share a cell or sit in neighbouring cells, each pair once."""
+        sorted_keys = self.sorted_keys
+        count = len(sorted_keys)
+        if count == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        cell_starts = np.flatnonzero(np.diff(sorted_keys, prepend=sorted_keys[0] - 1))
+        cell_keys = sorted_keys[cell_starts]
+        cell_ends = np.append(cell_starts[1:], count)
+        cell_of_position = np.repeat(np.arange(len(cell_starts)), np.diff(cell_ends, prepend=0))
+        positions = np.arange(count)
+        firsts, seconds = [], []
+        for ox, oy in NEIGHBOUR_OFFSETS:
+            if ox == 0 and oy == 0:
+                start = positions + 1
+                end = cell_ends[cell_of_position]
+            else:
+                target = cell_keys + ox * self.stride + oy
+                index = np.minimum(np.searchsorted(cell_keys, target), len(cell_keys) - 1)
+                found = cell_keys[index] == target
+                start = np.where(found, cell_starts[index], 0)[cell_of_position]
+                end = np.where(found, cell_ends[index], 0)[cell_of_position]
+            lengths = end - start
+            total = int(lengths.sum())
+            if total == 0:
+                continue
+            run_offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+            partners = np.repeat(start, lengths) + np.arange(total) - run_offsets
+            firsts.append(self.order[np.repeat(positions, lengths)])
+            seconds.append(self.order[partners])
+        if not firsts:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        return np.concatenate(firsts), np.concatenate(seconds)
+
+    def rows_near(self, x: float, y: float) -> np.ndarray:
+        """Get the rows in the 3x3 cells around a world position plus all rows moved since the last rebuild."""
+        cx, cy = self.cells_of(np.array([x]), np.array([y]))
+        key = (int(cx[0]) - self.origin[0] + 1) * self.stride + (int(cy[0]) - self.origin[1] + 1)
+        targets = np.array([key + ox * self.stride + oy for ox in (-1, 0, 1) for oy in (-1, 0, 1)])
+        start = np.searchsorted(self.sorted_keys, targets, "left")
+        end = np.searchsorted(self.sorted_keys, targets, "right")
+        rows = [self.order[s:e] for s, e in zip(start, end) if e > s]
+        if self.moved:
+            rows.append(np.fromiter(self.moved, dtype=np.int64))
+        return np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+
+
+if __name__ == "__main__":
+    print("This file isn't intended to be run directly.")
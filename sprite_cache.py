@@ -0,0 +1,116 @@
+import collections
+import math
+from typing import Iterable, Tuple
+
+import numpy as np
+import pygame
+
+
+class BubbleSpriteCache:
+    """Keeps pre-scaled and pre-tinted bubble sprites in diameter buckets."""
+
+    def __init__(self, image: pygame.Surface, memory_budget: int = 32 * 1024 * 1024, exact_below: int = 24,
+                 step: float = 1.04, alpha: int = 220):
+        """
+        Bubble sprite cache
+
+        Args:
+            image: The untinted bubble image
+            memory_budget: Maximum number of pixel bytes kept before least recently used sprites are evicted
+            exact_below: Diameters up to this value get their own bucket, larger ones are snapped to the ladder
+            step: Growth factor between two neighbouring diameter buckets
+            alpha: Alpha of the tint multiplied onto the bubble image
+        """
+        self.memory_budget = memory_budget
+        self.exact_below = max(1, exact_below)
+        self.step = max(1.01, step)
+        self.alpha = alpha
+        self.pyramid = self.build_pyramid(image)
+        self.sprites = collections.OrderedDict()
+        self.memory_used = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def build_pyramid(image: pygame.Surface) -> list:
+        """Halve the image until it is tiny so every sprite is scaled from a level close to its size."""
+        levels = [image]
+        while min(levels[-1].get_size()) > 16:
+            width, height = levels[-1].get_size()
+            levels.append(pygame.transform.smoothscale(levels[-1], (max(1, width // 2), max(1, height // 2))))
+        return levels
+
+    def bucket(self, diameter: float) -> int:
+        """Snap a diameter to the nearest bucket size."""
+        diameter = max(1, int(diameter))
+        if diameter <= self.exact_below:
+            return diameter
+        rung = round(math.log(diameter / self.exact_below, self.step))
+        return max(self.exact_below, int(round(self.exact_below * self.step ** rung)))
+
+    def buckets(self, diameters: np.ndarray) -> np.ndarray:
+        """Snap an array of diameters to their bucket sizes at once, the same as bucket does for one."""
+        diameters = np.maximum(1, diameters.astype(np.int64))
+        rung = np.round(np.log(diameters / self.exact_below) / math.log(self.step))
+        snapped = np.maximum(self.exact_below, np.round(self.exact_below * self.step ** rung).astype(np.int64))
+        return np.where(diameters <= self.exact_below, diameters, snapped)
+
+    def level_for(self, size: int) -> pygame.Surface:
+        """Get the smallest pyramid level that is still at least as large as size."""
+        for level in reversed(self.pyramid):
+            if min(level.get_size()) >= size:
+                return level
+        return self.pyramid[0]
+
+    def build(self, size: int, bg_color: Tuple[int, int, int]) -> pygame.Surface:
+        """Scale and tint a sprite for one bucket."""
+        sprite = pygame.transform.scale(self.level_for(size), (size, size))
+        tint_surface = pygame.Surface((size, size), pygame.SRCALPHA)
+        tint_surface.fill((*bg_color, self.alpha))
+        sprite.blit(tint_surface, (0, 0), special_flags=pygame.BLEND_RGBA_MULT)
+        if pygame.display.get_surface() is not None:
+            sprite = sprite.convert_alpha()
+        return sprite
+
+    def get(self, diameter: float, bg_color: Tuple[int, int, int]) -> pygame.Surface:
+        """Get the sprite for a diameter and background color, building it on a cache miss."""
+        key = (self.bucket(diameter), tuple(bg_color))
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.hits += 1
+            self.sprites.move_to_end(key)
+            return sprite
+        self.misses += 1
+        sprite = self.build(*key)
+        self.sprites[key] = sprite
+        self.memory_used += self.sprite_bytes(sprite)
+        self.evict()
+        return sprite
+
+    def prewarm(self, keys: Iterable[Tuple[int, Tuple[int, int, int]]]) -> None:
+        """Build the sprites of all (bucket, background color) keys that are not cached yet, see buckets."""
+        for key in keys:
+            if key not in self.sprites:
+                self.sprites[key] = self.build(*key)
+                self.memory_used += self.sprite_bytes(self.sprites[key])
+        self.evict()
+
+    def evict(self) -> None:
+        """Drop least recently used sprites until the cache fits into its memory budget."""
+        while self.memory_used > self.memory_budget and len(self.sprites) > 1:
+            _, sprite = self.sprites.popitem(last=False)
+            self.memory_used -= self.sprite_bytes(sprite)
+
+    @staticmethod
+    def sprite_bytes(sprite: pygame.Surface) -> int:
+        """Get the pixel memory used by a sprite."""
+        return sprite.get_width() * sprite.get_height() * sprite.get_bytesize()
+
+    def clear(self) -> None:
+        """Drop all cached sprites."""
+        self.sprites.clear()
+        self.memory_used = 0
+
+
+if __name__ == "__main__":
+    print("This file isn't intended to be run directly.")
@@ -0,0 +1,33 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PATH = os.path.dirname(os.path.realpath(__file__))
+
+
+def time_first_frame(runs: int = 5, arguments=()) -> None:
+    """Start main.py until its first frame is on screen and print the wall time per start and as main measured it."""
+    environment = dict(os.environ, BUBBLES_STARTUP_BENCHMARK="1")
+    if not environment.get("DISPLAY") and sys.platform.startswith("linux"):
+        environment.setdefault("SDL_VIDEODRIVER", "dummy")
+    wall_times = []
+    main_times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "main.py", *arguments], cwd=PATH, env=environment,
+                                capture_output=True, text=True, timeout=60)
+        wall_times.append(time.perf_counter() - start)
+        for line in result.stdout.splitlines():
+            if line.startswith("First frame after"):
+                main_times.append(float(line.split()[3]))
+        if result.returncode != 0 or len(main_times) < len(wall_times):
+            raise RuntimeError(f"main.py didn't draw a frame:\n{result.stdout}{result.stderr}")
+    print(f"time to first frame over {runs} starts: median {statistics.median(wall_times) * 1000:.0f} ms, "
+          f"best {min(wall_times) * 1000:.0f} ms (process start to exit), "
+          f"median {statistics.median(main_times):.0f} ms from the first line of main.py")
+
+
+if __name__ == "__main__":
+    time_first_frame()
@@ -0,0 +1,27 @@
+import os
+import sys
+
+# the modules live next to main.py instead of in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+import pytest
+
+import bubble_store
+import map_file
+
+
+@pytest.fixture
+def make_random_store():
+    """Get a function that builds a store with repeated and unique texts and about one connection per bubble."""
+    def make(count, rng, cell_size=220.0):
+        store = bubble_store.BubbleStore(cell_size, capacity=count)
+        names = [["repeated title"], ["two", "lines"], ["ünïcödé ✓"], ["", "blank first line"]]
+        fields = [{"name": names[index % 4] if index % 3 else [f"bubble {index}", "some more text"],
+                   "color": tuple(int(value) for value in rng.integers(0, 256, 3)),
+                   "text_alignment": map_file.ALIGNMENTS[index % 3]} for index in range(count)]
+        store.add_many(rng.uniform(-1e4, 1e4, count), rng.uniform(-1e4, 1e4, count), rng.uniform(12, 100, count),
+                       fields)
+        store.connect_many(rng.integers(0, count, count), rng.integers(0, count, count))
+        return store
+
+    return make
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+import bubble_store
+
+
+def make_store(count):
+    store = bubble_store.BubbleStore(220.0)
+    store.add_many(np.arange(count, dtype=float), np.zeros(count), np.full(count, 20.0),
+                   [{"name": [f"bubble {index}"]} for index in range(count)])
+    return store
+
+
+def test_removed_view_raises_instead_of_writing_the_last_row():
+    store = make_store(3)
+    removed = store[0]
+    store.remove_many(np.array([0]))
+    with pytest.raises(ValueError):
+        removed["x"] = 100.0
+    with pytest.raises(ValueError):
+        removed["name"] = ["edited"]
+    with pytest.raises(ValueError):
+        removed["radius"]
+    assert store.x[:len(store)].tolist() == [1.0, 2.0]
+    assert store.view_of(removed.id) is None
+
+
+def test_loaded_view_reads_and_writes_its_row():
+    store = make_store(2)
+    view = store[1]
+    view["x"] = 5.0
+    view["name"] = ["edited"]
+    assert view["x"] == 5.0
+    assert store.versions[1] == 1
+
+
+def test_rows_index_the_current_views_after_removals():
+    store = make_store(5)
+    store.remove_many(np.array([1, 3]))
+    assert [store[row].id for row in range(len(store))] == [0, 2, 4]
+    assert store[-1].id == 4
+    with pytest.raises(IndexError):
+        store[3]
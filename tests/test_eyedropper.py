@@ -0,0 +1,53 @@
+import numpy as np
+
+import eyedropper
+
+
+def make_screen():
+    height, width = 40, 60
+    y, x = np.mgrid[0:height, 0:width]
+    pixels = np.stack((x * 4, y * 6, (x + y) % 256), axis=2).astype(np.uint8)
+    return pixels, eyedropper.ArrayScreen(pixels, left=-20, top=10)
+
+
+def test_sample_reads_the_pixel_under_the_pointer():
+    pixels, screen = make_screen()
+    sampler = eyedropper.ScreenSampler(screen, radius=3)
+    assert sampler.sample(10, 30) == tuple(pixels[20, 30].tolist())
+    assert sampler.buffer[3, 3].tolist() == pixels[20, 30].tolist()
+
+
+def test_sample_at_and_beyond_the_edges_stays_on_the_screen():
+    pixels, screen = make_screen()
+    sampler = eyedropper.ScreenSampler(screen, radius=3)
+    assert sampler.sample(-20, 10) == tuple(pixels[0, 0].tolist())
+    assert sampler.sample(39, 49) == tuple(pixels[39, 59].tolist())
+    assert sampler.sample(500, -500) == tuple(pixels[0, 59].tolist())
+
+
+def test_sampling_reuses_the_buffer_and_grabs_once_per_sample():
+    pixels, screen = make_screen()
+    sampler = eyedropper.ScreenSampler(screen, radius=3)
+    buffer = sampler.buffer
+    for x in range(-20, 40, 7):
+        sampler.sample(x, 20)
+    assert sampler.buffer is buffer
+    assert screen.grabs == 9
+
+
+def test_magnified_outlines_the_middle_pixel():
+    pixels, screen = make_screen()
+    sampler = eyedropper.ScreenSampler(screen, radius=3)
+    sampler.sample(10, 30)
+    magnified = sampler.magnified(4)
+    assert magnified.shape == (28, 28, 3)
+    outline = magnified[12, 12].tolist()
+    assert outline in ([0, 0, 0], [255, 255, 255])
+    assert magnified[12:16, 15].tolist() == [outline] * 4
+    assert magnified[13, 13].tolist() == pixels[20, 30].tolist()
+
+
+def test_close_releases_the_screen():
+    pixels, screen = make_screen()
+    eyedropper.ScreenSampler(screen).close()
+    assert screen.closed
@@ -0,0 +1,32 @@
+import frame_scheduler
+
+
+def make_scheduler():
+    scheduler = frame_scheduler.FrameScheduler(active_fps=120, idle_fps=10, idle_after=1.0, sleep_after=20.0)
+    scheduler.last_event = 0.0
+    scheduler.last_busy = 0.0
+    return scheduler
+
+
+def test_goes_idle_then_sleeps_without_events_or_busy_frames():
+    scheduler = make_scheduler()
+    assert scheduler.choose_mode(0.5) == "active"
+    assert scheduler.choose_mode(5.0) == "idle"
+    assert scheduler.choose_mode(20.0) == "sleep"
+
+
+def test_busy_frame_keeps_the_loop_out_of_sleep():
+    scheduler = make_scheduler()
+    scheduler.last_busy = 25.0
+    assert scheduler.choose_mode(25.5) == "active"
+    assert scheduler.choose_mode(30.0) == "idle"
+    assert scheduler.choose_mode(44.0) == "idle"
+    assert scheduler.choose_mode(45.0) == "sleep"
+
+
+def test_keep_busy_only_counts_busy_frames():
+    scheduler = make_scheduler()
+    scheduler.keep_busy(False)
+    assert scheduler.last_busy == 0.0
+    scheduler.keep_busy(True)
+    assert scheduler.last_busy > 0.0
@@ -0,0 +1,31 @@
+import time
+
+import bubble_store
+import ingest
+
+
+def fit(lines, radius):
+    return 12
+
+
+def test_drain_hands_every_added_chunk_to_on_added():
+    store = bubble_store.BubbleStore(220.0)
+    bubble_ingest = ingest.BubbleIngest(chunk_size=100, frame_budget=10.0)
+    bubble_ingest.submit([{"name": f"bubble {index}"} for index in range(250)])
+    chunks = []
+    assert bubble_ingest.drain(store, fit, on_added=chunks.append) == 250
+    assert [len(views) for views in chunks] == [100, 100, 50]
+    assert [view.row for views in chunks for view in views] == list(range(250))
+
+
+def test_on_added_counts_towards_the_frame_budget():
+    store = bubble_store.BubbleStore(220.0)
+    bubble_ingest = ingest.BubbleIngest(chunk_size=100, frame_budget=0.01)
+    bubble_ingest.submit([{"name": f"bubble {index}"} for index in range(500)])
+
+    def slow_follow_up(views):
+        time.sleep(0.02)
+
+    assert bubble_ingest.drain(store, fit, on_added=slow_follow_up) == 100
+    assert bubble_ingest.drain(store, fit, on_added=slow_follow_up) == 100
+    assert not bubble_ingest.empty()
@@ -0,0 +1,166 @@
+import threading
+
+import numpy as np
+
+import bubble_store
+import journal
+import map_file
+
+DEFAULTS = {"font_size": None, "rendered_lines": (), "text_surface": None}
+
+
+def fill_journal(log, store, rng, count):
+    """Log exactly count random adds, edits, moves and connections and apply them to store like the app does."""
+    for _ in range(count):
+        choice = rng.random()
+        if choice < 0.4 or len(store) < 2:
+            view = store.add({"x": float(rng.uniform(-1e3, 1e3)), "y": float(rng.uniform(-1e3, 1e3)),
+                              "radius": float(rng.uniform(12, 100)), "name": ["journaled", "bubble"],
+                              "color": (1, 2, 3), "text_alignment": "left", "font_size": None, "rendered_lines": [],
+                              "text_surface": None})
+            log.record_add(view)
+        elif choice < 0.6:
+            view = store.views[int(rng.integers(len(store)))]
+            view["name"] = [f"edited {rng.integers(1000)}"]
+            view["color"] = (4, 5, 6)
+            log.record_edit(view)
+        elif choice < 0.8:
+            view = store.views[int(rng.integers(len(store)))]
+            view["x"] += 10.0
+            log.record_move(view)
+        else:
+            source, target = (store.views[int(row)] for row in rng.integers(len(store), size=2))
+            if store.connect(source, target):
+                log.record_connect(source, target)
+            else:
+                # a connection that exists already logs nothing, so the source moves to keep one record per step
+                source["y"] += 10.0
+                log.record_move(source)
+
+
+def describe(store):
+    """Get everything recovery has to restore, for comparing stores."""
+    return (sorted((view.id, view["x"], view["y"], round(view["radius"], 3), tuple(view["name"]), view["color"],
+                    view["text_alignment"]) for view in store), sorted(store.graph.edges()))
+
+
+def recover(path, snapshot_path):
+    store = bubble_store.BubbleStore(220.0)
+    replayed = journal.Journal(path, snapshot_path).recover(store, DEFAULTS)
+    return store, replayed
+
+
+def write_journal(tmp_path, make_random_store, count=500, records=300):
+    path, snapshot_path = str(tmp_path / "test.journal"), str(tmp_path / "test.bmap")
+    rng = np.random.default_rng(0)
+    store = make_random_store(count, rng)
+    log = journal.Journal(path, snapshot_path, flush_interval=0.01)
+    log.start()
+    log.compact(store)
+    fill_journal(log, store, rng, records)
+    log.close()
+    return path, snapshot_path, store, log
+
+
+def test_recovery_replays_the_journal_onto_the_snapshot(tmp_path, make_random_store):
+    path, snapshot_path, store, log = write_journal(tmp_path, make_random_store)
+    recovered, replayed = recover(path, snapshot_path)
+    assert replayed == log.written == 300
+    assert describe(recovered) == describe(store)
+    recovered.close_lazy_fields()
+
+
+def test_recovery_time_of_a_large_snapshot_with_a_journal_tail(tmp_path, make_random_store):
+    path, snapshot_path, store, log = write_journal(tmp_path, make_random_store, count=100000, records=3000)
+    started = journal.Journal(path, snapshot_path)
+    recovered = bubble_store.BubbleStore(220.0)
+    assert started.recover(recovered, DEFAULTS) == 3000
+    print(f"recovered 100000 bubbles + 3000 records in {started.recovery_seconds * 1000:.1f} ms")
+    assert len(recovered) == len(store)
+    # loading the snapshot takes most of it, a loose bound only catches replay turning quadratic
+    assert 0 < started.recovery_seconds < 5.0
+    recovered.close_lazy_fields()
+
+
+def test_crash_between_snapshot_and_truncation_loses_nothing(tmp_path, make_random_store):
+    path, snapshot_path, store, log = write_journal(tmp_path, make_random_store)
+    # a snapshot that already holds the journal, as if the app died before the journal was emptied
+    map_file.save(store, snapshot_path)
+    recovered, replayed = recover(path, snapshot_path)
+    assert describe(recovered) == describe(store)
+    recovered.close_lazy_fields()
+
+
+def test_torn_last_record_is_skipped(tmp_path, make_random_store):
+    path, snapshot_path, store, log = write_journal(tmp_path, make_random_store)
+    with open(path, "ab") as file:
+        file.write(b'{"op":"move","id":')
+    recovered, replayed = recover(path, snapshot_path)
+    assert replayed == log.written
+    assert describe(recovered) == describe(store)
+    recovered.close_lazy_fields()
+
+
+def test_positions_moved_by_the_layout_are_recovered(tmp_path, make_random_store):
+    path, snapshot_path = str(tmp_path / "test.journal"), str(tmp_path / "test.bmap")
+    store = make_random_store(500, np.random.default_rng(0))
+    log = journal.Journal(path, snapshot_path, flush_interval=0.01)
+    log.start()
+    log.compact(store)
+    assert log.record_positions(store) == 0
+    store.x[:100] += 25.0
+    store.y[:100] -= 25.0
+    # too small to be logged
+    store.x[100:200] += 0.1
+    assert log.record_positions(store) == 100
+    assert log.record_positions(store) == 0
+    log.close()
+    assert log.compactions == 1
+    recovered, replayed = recover(path, snapshot_path)
+    assert replayed == 1
+    for row in range(100):
+        moved = recovered.view_of(store[row].id)
+        assert (moved["x"], moved["y"]) == (store[row]["x"], store[row]["y"])
+    recovered.close_lazy_fields()
+
+
+def test_moving_most_bubbles_compacts_instead_of_logging(tmp_path, make_random_store):
+    path, snapshot_path = str(tmp_path / "test.journal"), str(tmp_path / "test.bmap")
+    store = make_random_store(500, np.random.default_rng(0))
+    log = journal.Journal(path, snapshot_path, flush_interval=0.01, compact_after=100)
+    log.start()
+    log.compact(store)
+    store.x[:len(store)] += 25.0
+    assert log.record_positions(store) == len(store)
+    log.close()
+    assert log.compactions == 2 and log.written == 0
+    recovered, replayed = recover(path, snapshot_path)
+    assert replayed == 0
+    assert describe(recovered) == describe(store)
+    recovered.close_lazy_fields()
+
+
+def test_positions_are_logged_when_the_layout_settles(make_random_store):
+    log = journal.Journal("unused.journal", "unused.bmap", position_interval=60.0)
+    store = make_random_store(50, np.random.default_rng(0))
+    log.remember_positions(store)
+    store.x[:10] += 25.0
+    assert log.record_positions_if_due(store, settled=False) == 0
+    assert log.record_positions_if_due(store, settled=True) == 10
+    assert log.record_positions_if_due(store, settled=True) == 0
+    assert log.records.qsize() == 1
+
+
+def test_records_from_several_threads_are_all_counted():
+    log = journal.Journal("unused.journal", "unused.bmap")
+
+    def record():
+        for _ in range(2000):
+            log.record("noop")
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert log.pending == 8000
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+import bubble_store
+import map_file
+
+DEFAULTS = {"font_size": None, "rendered_lines": (), "text_surface": None}
+
+
+def test_round_trip_keeps_every_bubble_and_connection(tmp_path, make_random_store):
+    path = str(tmp_path / "round_trip.bmap")
+    rng = np.random.default_rng(0)
+    original = make_random_store(2000, rng)
+    # removed bubbles leave gaps in the ids
+    for row in sorted(rng.choice(len(original), 100, replace=False).tolist(), reverse=True):
+        original.remove(original[row])
+    map_file.save(original, path)
+    loaded = bubble_store.BubbleStore(220.0)
+    map_file.load(loaded, path, DEFAULTS)
+    assert len(loaded) == len(original)
+    assert np.array_equal(loaded.ids[:len(loaded)], original.ids[:len(original)])
+    for before, after in zip(original, loaded):
+        assert after.id == before.id
+        assert (after["x"], after["y"]) == (before["x"], before["y"])
+        assert abs(after["radius"] - before["radius"]) < 1e-4
+        assert after["name"] == before["name"]
+        assert after["color"] == before["color"]
+        assert after["text_alignment"] == before["text_alignment"]
+    assert set(loaded.graph.edges()) == set(original.graph.edges())
+    loaded.close_lazy_fields()
+
+
+def test_saving_over_the_mapped_file_keeps_the_loaded_names(tmp_path, make_random_store):
+    path = str(tmp_path / "mapped.bmap")
+    original = make_random_store(500, np.random.default_rng(1))
+    map_file.save(original, path)
+    loaded = bubble_store.BubbleStore(220.0)
+    map_file.load(loaded, path, DEFAULTS)
+    map_file.save(loaded, path)
+    assert [view["name"] for view in loaded] == [view["name"] for view in original]
+    loaded.close_lazy_fields()
+
+
+def test_loading_a_file_that_isnt_a_map_raises(tmp_path):
+    path = tmp_path / "broken.bmap"
+    path.write_bytes(b"not a map")
+    with pytest.raises(ValueError):
+        map_file.load(bubble_store.BubbleStore(220.0), str(path), DEFAULTS)
@@ -0,0 +1,36 @@
+import numpy as np
+
+import bubble_store
+import simulation
+
+
+def make_simulation():
+    store = bubble_store.BubbleStore(220.0)
+    store.add_many(np.array([0.0, 30.0]), np.array([0.0, 0.0]), np.full(2, 20.0), [{}, {}])
+    return store, simulation.Simulation(store, 20.0, settle_tolerance=0.05)
+
+
+def test_settled_simulation_runs_no_steps_until_woken():
+    store, bubble_simulation = make_simulation()
+    bubble_simulation.settle()
+    assert bubble_simulation.settled
+    before = store.x[:2].copy()
+    assert bubble_simulation.advance(1.0) == 0
+    assert bubble_simulation.advance(1.0) == 0
+    assert np.array_equal(store.x[:2], before)
+    store[0]["x"] = 5.0
+    bubble_simulation.wake()
+    assert bubble_simulation.advance(bubble_simulation.timestep) == 1
+
+
+def test_woken_simulation_steps_until_it_settles_again():
+    store, bubble_simulation = make_simulation()
+    bubble_simulation.settle()
+    store[1]["x"] = 10.0
+    bubble_simulation.wake()
+    for _ in range(10000):
+        bubble_simulation.advance(bubble_simulation.timestep)
+        if bubble_simulation.settled:
+            break
+    assert bubble_simulation.settled
+    assert store.x[1] - store.x[0] > 40.0
@@ -0,0 +1,18 @@
+import numpy as np
+import pygame
+
+import sprite_cache
+
+
+def test_buckets_snap_like_bucket():
+    cache = sprite_cache.BubbleSpriteCache(pygame.Surface((64, 64), pygame.SRCALPHA))
+    diameters = np.concatenate((np.linspace(0.0, 30.0, 301), np.geomspace(24.0, 5000.0, 2000)))
+    assert cache.buckets(diameters).tolist() == [cache.bucket(diameter) for diameter in diameters.tolist()]
+
+
+def test_prewarm_builds_each_key_once():
+    cache = sprite_cache.BubbleSpriteCache(pygame.Surface((64, 64), pygame.SRCALPHA))
+    cache.prewarm([(30, (40, 40, 40)), (30, (40, 40, 40)), (12, (240, 240, 240))])
+    assert set(cache.sprites) == {(30, (40, 40, 40)), (12, (240, 240, 240))}
+    cache.get(30, (40, 40, 40))
+    assert cache.misses == 0
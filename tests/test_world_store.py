@@ -0,0 +1,59 @@
+import numpy as np
+
+import bubble_store
+import world_store
+
+DEFAULTS = {"font_size": None, "rendered_lines": (), "text_surface": None}
+
+
+def edge_set(store):
+    return set(map(tuple, store.graph.edge_ids().tolist()))
+
+
+def open_world(tmp_path, original):
+    world = world_store.WorldStore(str(tmp_path / "test.world"), original, DEFAULTS, chunk_size=1024.0)
+    world.import_store()
+    store = bubble_store.BubbleStore(220.0)
+    world.store = store
+    world.open()
+    return world, store
+
+
+def test_panning_loads_the_bubbles_and_connections_of_the_map(tmp_path, make_random_store):
+    original = make_random_store(20000, np.random.default_rng(0))
+    world, store = open_world(tmp_path, original)
+    all_edges = edge_set(original)
+    for step in range(60):
+        left = -1e4 + step * 300.0
+        world.update(left, -1500.0, left + 4000.0, 1500.0)
+        assert len(world.chunks) <= world.max_chunks
+        loaded = set(store.ids[:len(store)].tolist())
+        assert loaded == set(world.chunk_of)
+        for view in store:
+            before = original.view_of(view.id)
+            assert (view["x"], view["y"], view["name"], view["color"]) == \
+                   (before["x"], before["y"], before["name"], before["color"])
+        assert edge_set(store) == {(a, b) for a, b in all_edges if a in loaded and b in loaded}
+    world.close()
+
+
+def test_edited_bubble_survives_eviction(tmp_path, make_random_store):
+    original = make_random_store(20000, np.random.default_rng(0))
+    world, store = open_world(tmp_path, original)
+    world.update(-2000.0, -1500.0, 2000.0, 1500.0)
+    while world.loading:
+        world.update(-2000.0, -1500.0, 2000.0, 1500.0)
+    view = store[0]
+    bubble_id = view.id
+    view["x"] += 1.5
+    view["name"] = ["moved"]
+    world.record_edit(view)
+    moved_x, moved_y = view["x"], view["y"]
+    world.update(2e4, 2e4, 2.4e4, 2.3e4)
+    assert store.view_of(bubble_id) is None
+    world.update(moved_x - 10, moved_y - 10, moved_x + 10, moved_y + 10)
+    while world.loading:
+        world.update(moved_x - 10, moved_y - 10, moved_x + 10, moved_y + 10)
+    assert store.view_of(bubble_id)["x"] == moved_x
+    assert store.view_of(bubble_id)["name"] == ["moved"]
+    world.close()
@@ -0,0 +1,85 @@
+from typing import Tuple
+
+import pygame
+
+
+class TextSurfaceCache:
+    """Keeps one composed text surface per bubble and rebuilds it only when its inputs change."""
+
+    def __init__(self, blank_line: str = "‎ "):
+        """
+        Text surface cache
+
+        Args:
+            blank_line: Placeholder rendered for empty lines so they keep their height
+        """
+        self.blank_line = blank_line
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(bubble, font_size: int, line_height: int, text_color: Tuple[int, int, int]) -> tuple:
+        """Build the cache key of everything that changes how the text of a bubble looks."""
+        return (tuple(bubble["rendered_lines"]), font_size, line_height, tuple(text_color),
+                bubble.get("text_alignment"))
+
+    @staticmethod
+    def invalidate(bubble) -> None:
+        """Drop the cached text surface of a bubble."""
+        bubble["text_surface"] = None
+
+    def get(self, bubble, font: pygame.font.Font, font_size: int, line_height: int,
+            text_color: Tuple[int, int, int]) -> pygame.Surface:
+        """Get the composed text surface of a bubble, rendering it only on a cache miss."""
+        key = self.make_key(bubble, font_size, line_height, text_color)
+        cached = bubble.get("text_surface")
+        if cached is not None and cached[0] == key:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        surface = self.compose(bubble["rendered_lines"], font, line_height, text_color, bubble.get("text_alignment"))
+        bubble["text_surface"] = (key, surface)
+        return surface
+
+    def compose(self, lines, font: pygame.font.Font, line_height: int, text_color: Tuple[int, int, int],
+                alignment: str) -> pygame.Surface:
+        """Render all lines once and stack them on a single transparent surface."""
+        rendered = [font.render(line if line.strip() else self.blank_line, True, text_color) for line in lines]
+        width = max((line.get_width() for line in rendered), default=0)
+        height = (len(rendered) - 1) * line_height + rendered[-1].get_height() if rendered else 0
+        surface = pygame.Surface((max(1, width), max(1, height)), pygame.SRCALPHA)
+        surface.fill((*text_color, 0))
+        for index, line in enumerate(rendered):
+            if alignment == "left":
+                x = 0
+            elif alignment == "right":
+                x = width - line.get_width()
+            else:
+                x = (width - line.get_width()) // 2
+            surface.blit(line, (x, index * line_height), special_flags=pygame.BLEND_RGBA_MAX)
+        return surface
+
+    def reset_stats(self) -> None:
+        """Reset the hit and miss counters."""
+        self.hits = 0
+        self.misses = 0
+
+
+def wrap_name(lines, max_chars: int = 40) -> list:
+    """Break every line at the first space after max_chars characters and drop empty lines, safe on any thread."""
+    wrapped_lines = []
+    for line in lines:
+        split_next = False
+        for index, letter in enumerate(line):
+            if index > max_chars:
+                split_next = True
+            if split_next:
+                if letter == " ":
+                    line = line[:index] + "\n" + line[index:]
+                    split_next = False
+        wrapped_lines.append(line)
+    return [line for line in wrapped_lines if line]
+
+
+if __name__ == "__main__":
+    print("This file isn't intended to be run directly.")
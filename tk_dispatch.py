@@ -0,0 +1,122 @@
+import collections
+import queue
+import statistics
+import threading
+import time
+from typing import Callable, Optional
+
+WAKE_EVENT = "<<TkCommand>>"
+
+
+class TkDispatcher:
+    """Hands named commands from other threads to the tkinter thread without waking it while nothing is open."""
+
+    def __init__(self, commands: Optional[queue.Queue] = None, latency_samples: int = 100):
+        """
+        Tkinter command dispatcher
+
+        Args:
+            commands: Queue the commands go through, a new one is made when it is None
+            latency_samples: Number of recent queue latencies kept for the statistics
+        """
+        self.commands = queue.Queue() if commands is None else commands
+        self.handlers = {}
+        self.queue_seconds = collections.deque(maxlen=latency_samples)
+        self.handled = 0
+        self.stopped = False
+        self.root = None
+        self.keep_open = None
+        # guards whether the Tk event loop runs and whether a wake event is on its way to it
+        self.lock = threading.Lock()
+        self.in_loop = False
+        self.wake_pending = False
+
+    def register(self, name: str, handler: Callable) -> None:
+        """Call handler with the arguments of every command of this name and the time it was queued at."""
+        self.handlers[name] = handler
+
+    def submit(self, name: str, *args) -> None:
+        """Queue a command from any thread, waking the Tk event loop if it runs."""
+        self.commands.put((name, args, time.perf_counter()))
+        self.wake()
+
+    def stop(self) -> None:
+        """Let the tkinter thread leave its loop once it gets to this point of the queue."""
+        self.commands.put(None)
+        self.wake()
+
+    def wake(self) -> None:
+        """Send one wake event to the running Tk event loop, the blocked queue get needs none."""
+        with self.lock:
+            if not self.in_loop or self.wake_pending:
+                return
+            self.wake_pending = True
+        # tkinter hands this call to the Tk thread, which doesn't leave its loop while a wake is pending
+        self.root.event_generate(WAKE_EVENT, when="tail")
+
+    def empty(self) -> bool:
+        """Check whether no command is waiting."""
+        return self.commands.empty()
+
+    def handle(self, command) -> None:
+        """Run the handler of one command on the tkinter thread."""
+        name, args, queued_at = command
+        self.queue_seconds.append(time.perf_counter() - queued_at)
+        self.handlers[name](*args, queued_at=queued_at)
+        self.handled += 1
+
+    def drain(self, event=None) -> None:
+        """Handle the commands that came in while the Tk event loop runs, called for every wake event."""
+        with self.lock:
+            self.wake_pending = False
+        while not self.stopped:
+            try:
+                command = self.commands.get(block=False)
+            except queue.Empty:
+                break
+            if command is None:
+                self.stopped = True
+            else:
+                self.handle(command)
+        self.settle()
+
+    def settle(self) -> None:
+        """Leave the Tk event loop once no dialog is open, call it on the tkinter thread after closing one."""
+        if not self.stopped and self.keep_open():
+            return
+        with self.lock:
+            # a pending wake has to be handled in the loop, its drain settles again afterwards
+            if not self.in_loop or self.wake_pending:
+                return
+            self.in_loop = False
+        self.root.quit()
+
+    def run(self, root, keep_open: Callable[[], bool]) -> None:
+        """Block on the queue while no dialog is open and run the Tk event loop of root while one is."""
+        self.root = root
+        self.keep_open = keep_open
+        root.bind(WAKE_EVENT, self.drain)
+        while not self.stopped:
+            command = self.commands.get()
+            if command is None:
+                self.stopped = True
+                break
+            self.handle(command)
+            if keep_open():
+                with self.lock:
+                    self.in_loop = True
+                # commands queued between the get and setting in_loop sent no wake, so check once on entering
+                root.after_idle(self.drain)
+                root.mainloop()
+                with self.lock:
+                    self.in_loop = False
+
+    def latency(self) -> tuple:
+        """Get the median and the worst of the recent times commands waited in the queue in seconds."""
+        if not self.queue_seconds:
+            return 0.0, 0.0
+        return statistics.median(self.queue_seconds), max(self.queue_seconds)
+
+
+if __name__ == "__main__":
+    print("This file isn't intended to be run directly.")
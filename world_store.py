@@ -0,0 +1,283 @@
+import math
+import sqlite3
+import threading
+import time
+from typing import Tuple
+
+import numpy as np
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value);
+CREATE TABLE IF NOT EXISTS bubbles (id INTEGER PRIMARY KEY, chunk_x INTEGER NOT NULL, chunk_y INTEGER NOT NULL,
+                                    x REAL NOT NULL, y REAL NOT NULL, radius REAL NOT NULL, name TEXT NOT NULL,
+                                    color INTEGER NOT NULL, alignment TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS bubbles_by_chunk ON bubbles (chunk_x, chunk_y);
+CREATE TABLE IF NOT EXISTS connections (source INTEGER NOT NULL, target INTEGER NOT NULL,
+                                        PRIMARY KEY (source, target)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS connections_by_target ON connections (target);
+"""
+CHUNK_CONNECTIONS = """
+SELECT connections.source, connections.target FROM connections JOIN bubbles ON bubbles.id = connections.source
+WHERE bubbles.chunk_x = ? AND bubbles.chunk_y = ?
+UNION ALL
+SELECT connections.source, connections.target FROM connections JOIN bubbles ON bubbles.id = connections.target
+WHERE bubbles.chunk_x = ? AND bubbles.chunk_y = ?
+"""
+
+
+def pack_color(color) -> int:
+    """Pack an RGB tuple into one integer column."""
+    return (int(color[0]) << 16) | (int(color[1]) << 8) | int(color[2])
+
+
+def unpack_color(value: int) -> Tuple[int, int, int]:
+    """Unpack an RGB tuple packed by pack_color."""
+    return (value >> 16) & 255, (value >> 8) & 255, value & 255
+
+
+class WorldStore:
+    """Bubbles kept in square chunks of an SQLite database, with only the chunks around the view loaded into a store."""
+
+    def __init__(self, path: str, store, defaults: dict, chunk_size: float = 2048.0, margin: int = 1,
+                 prefetch: int = 1, max_chunks: int = 64, loads_per_update: int = 4, compact_after: int = 2000):
+        """
+        World store
+
+        Args:
+            path: Path of the SQLite database, created if missing
+            store: The bubble store the loaded chunks go into, the world owns its content while it is open
+            defaults: Fields every loaded bubble gets besides its color, alignment and name
+            chunk_size: Edge length of the chunks in world units, a database keeps the size it was created with
+            margin: Chunks loaded around the ones the view touches
+            prefetch: Chunks loaded beyond the margin in the direction the view moves
+            max_chunks: Most chunks loaded at once, the ones farthest from the view are evicted first
+            loads_per_update: Most chunks read per update, so fast panning spreads the reads over frames
+            compact_after: Number of edits after which compact_if_due writes every loaded chunk back
+        """
+        self.path = path
+        self.store = store
+        self.defaults = defaults
+        self.margin = margin
+        self.prefetch = prefetch
+        self.max_chunks = max_chunks
+        self.loads_per_update = loads_per_update
+        self.compact_after = compact_after
+        self.database = sqlite3.connect(path)
+        self.database.execute("PRAGMA journal_mode = WAL")
+        self.database.execute("PRAGMA synchronous = NORMAL")
+        self.database.executescript(SCHEMA)
+        self.database.execute("INSERT OR IGNORE INTO settings VALUES ('chunk_size', ?)", (chunk_size,))
+        self.chunk_size = float(self.database.execute("SELECT value FROM settings WHERE key = 'chunk_size'").fetchone()[0])
+        self.database.commit()
+        # members of every loaded chunk, a bubble stays with the chunk it was loaded with until that is evicted
+        self.chunks = {}
+        self.chunk_of = {}
+        self.edited = set()
+        # record_edit may be called from any thread, write_back runs on the main one
+        self.edited_lock = threading.Lock()
+        self.pending = 0
+        self.last_center = None
+        self.direction = (0, 0)
+        self.loading = False
+        self.loaded_chunks = 0
+        self.evicted_chunks = 0
+        self.update_seconds = 0.0
+
+    def __len__(self) -> int:
+        return self.database.execute("SELECT COUNT(*) FROM bubbles").fetchone()[0]
+
+    def chunk_at(self, x: float, y: float) -> Tuple[int, int]:
+        """Get the chunk a world position falls into."""
+        return math.floor(x / self.chunk_size), math.floor(y / self.chunk_size)
+
+    def import_store(self) -> int:
+        """Write every bubble and connection of the store into the database and get the number of bubbles."""
+        store = self.store
+        store.materialize()
+        count = len(store)
+        x, y = store.x[:count], store.y[:count]
+        chunk_x = np.floor(x / self.chunk_size).astype(np.int64).tolist()
+        chunk_y = np.floor(y / self.chunk_size).astype(np.int64).tolist()
+        self.database.executemany("INSERT OR REPLACE INTO bubbles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+            (view.id, cx, cy, px, py, radius, "\n".join(view.fields["name"]), pack_color(view.fields["color"]),
+             view.fields.get("text_alignment", "center"))
+            for view, cx, cy, px, py, radius in zip(store, chunk_x, chunk_y, x.tolist(), y.tolist(),
+                                                    store.radius[:count].tolist())))
+        self.database.executemany("INSERT OR IGNORE INTO connections VALUES (?, ?)", store.graph.edge_ids().tolist())
+        self.database.commit()
+        return count
+
+    def open(self) -> None:
+        """Empty the store so it only holds loaded chunks, and keep new ids clear of the ones in the database."""
+        self.store.clear()
+        largest = self.database.execute("SELECT MAX(id) FROM bubbles").fetchone()[0]
+        self.store.next_id = max(self.store.next_id, (largest if largest is not None else -1) + 1)
+        self.chunks = {}
+        self.chunk_of = {}
+        self.last_center = None
+
+    def update(self, left: float, top: float, right: float, bottom: float) -> bool:
+        """Load the chunks around the visible world rect and evict the distant ones, and get whether any changed."""
+        start = time.perf_counter()
+        size = self.chunk_size
+        center = ((left + right) / 2, (top + bottom) / 2)
+        if self.last_center is not None and center != self.last_center:
+            self.direction = (int(np.sign(center[0] - self.last_center[0])),
+                              int(np.sign(center[1] - self.last_center[1])))
+        self.last_center = center
+        first_x, first_y = math.floor(left / size) - self.margin, math.floor(top / size) - self.margin
+        last_x, last_y = math.floor(right / size) + self.margin, math.floor(bottom / size) + self.margin
+        direction_x, direction_y = self.direction
+        # the wanted area reaches further ahead in the direction the view pans
+        first_x += min(0, direction_x) * self.prefetch
+        last_x += max(0, direction_x) * self.prefetch
+        first_y += min(0, direction_y) * self.prefetch
+        last_y += max(0, direction_y) * self.prefetch
+        center_x, center_y = center[0] / size - 0.5, center[1] / size - 0.5
+
+        def distance(chunk):
+            return max(abs(chunk[0] - center_x), abs(chunk[1] - center_y))
+
+        wanted = sorted(((chunk_x, chunk_y) for chunk_x in range(first_x, last_x + 1)
+                         for chunk_y in range(first_y, last_y + 1)), key=distance)[:self.max_chunks]
+        wanted_set = set(wanted)
+        # chunks just outside of the wanted area stay, so panning back and forth doesn't reload them
+        evicted = [chunk for chunk in self.chunks
+                   if not (first_x - 1 <= chunk[0] <= last_x + 1 and first_y - 1 <= chunk[1] <= last_y + 1)]
+        missing = [chunk for chunk in wanted if chunk not in self.chunks]
+        overflow = len(self.chunks) - len(evicted) + len(missing) - self.max_chunks
+        if overflow > 0:
+            spare = sorted((chunk for chunk in self.chunks if chunk not in wanted_set and chunk not in evicted),
+                           key=distance, reverse=True)
+            evicted += spare[:overflow]
+        self.evict(evicted)
+        for chunk in missing[:self.loads_per_update]:
+            self.load(chunk)
+        self.loading = len(missing) > self.loads_per_update
+        self.update_seconds = time.perf_counter() - start
+        return bool(evicted or missing)
+
+    def load(self, chunk: Tuple[int, int]) -> None:
+        """Read one chunk into the store and connect it to the loaded bubbles it has connections with."""
+        store = self.store
+        records = self.database.execute("SELECT id, x, y, radius, name, color, alignment FROM bubbles "
+                                        "WHERE chunk_x = ? AND chunk_y = ?", chunk).fetchall()
+        members = set()
+        self.chunks[chunk] = members
+        fresh = []
+        for record in records:
+            bubble_id = record[0]
+            if 0 <= bubble_id < len(store.row_of) and store.row_of[bubble_id] >= 0:
+                # it moved here from a chunk that is still loaded, or it was created here before the chunk loaded
+                if bubble_id not in self.chunk_of:
+                    self.chunk_of[bubble_id] = chunk
+                    members.add(bubble_id)
+                continue
+            fresh.append(record)
+        if fresh:
+            ids, x, y, radius, names, colors, alignments = zip(*fresh)
+            fields = [{**self.defaults, "name": name.split("\n"), "color": unpack_color(color),
+                       "text_alignment": alignment} for name, color, alignment in zip(names, colors, alignments)]
+            store.add_many(np.array(x), np.array(y), np.array(radius), fields, np.array(ids))
+            members.update(ids)
+            self.chunk_of.update(dict.fromkeys(ids, chunk))
+        edges = self.database.execute(CHUNK_CONNECTIONS, chunk * 2).fetchall()
+        if edges:
+            edges = np.array(edges, dtype=np.int64)
+            inside = edges < len(store.row_of)
+            resident = np.zeros(edges.shape, dtype=bool)
+            resident[inside] = store.row_of[edges[inside]] >= 0
+            edges = edges[resident.all(axis=1)]
+            store.connect_many(edges[:, 0], edges[:, 1])
+        self.loaded_chunks += 1
+
+    def evict(self, chunks: list) -> None:
+        """Write chunks back and drop their bubbles from the store, handing bubbles that moved on to loaded chunks."""
+        if not chunks:
+            return
+        store = self.store
+        leaving = []
+        for chunk in chunks:
+            for bubble_id in self.chunks.pop(chunk):
+                view = store.view_of(bubble_id)
+                moved_to = self.chunk_at(view["x"], view["y"])
+                if moved_to in self.chunks and moved_to not in chunks:
+                    self.chunks[moved_to].add(bubble_id)
+                    self.chunk_of[bubble_id] = moved_to
+                else:
+                    del self.chunk_of[bubble_id]
+                    leaving.append(view)
+        self.write_back(leaving)
+        self.database.commit()
+        store.remove_many(np.array([view.row for view in leaving], dtype=np.int64))
+        self.evicted_chunks += len(chunks)
+
+    def write_back(self, views: list) -> None:
+        """Write positions and chunks of bubbles, plus the fields of the edited ones, to the database."""
+        if not views:
+            return
+        rows = np.array([view.row for view in views], dtype=np.int64)
+        x, y, radius = self.store.x[rows], self.store.y[rows], self.store.radius[rows]
+        chunk_x = np.floor(x / self.chunk_size).astype(np.int64).tolist()
+        chunk_y = np.floor(y / self.chunk_size).astype(np.int64).tolist()
+        self.database.executemany("UPDATE bubbles SET chunk_x = ?, chunk_y = ?, x = ?, y = ?, radius = ? WHERE id = ?",
+                                  zip(chunk_x, chunk_y, x.tolist(), y.tolist(), radius.tolist(),
+                                      (view.id for view in views)))
+        with self.edited_lock:
+            edited = [view for view in views if view.id in self.edited]
+            self.edited.difference_update(view.id for view in edited)
+        self.database.executemany("UPDATE bubbles SET name = ?, color = ?, alignment = ? WHERE id = ?", (
+            ("\n".join(view["name"]), pack_color(view["color"]), view["text_alignment"], view.id) for view in edited))
+
+    def record_add(self, view) -> None:
+        """Insert a new bubble right away, so loading its chunk later finds it."""
+        chunk = self.chunk_at(view["x"], view["y"])
+        self.database.execute("INSERT OR REPLACE INTO bubbles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (
+            view.id, *chunk, view["x"], view["y"], view["radius"], "\n".join(view["name"]), pack_color(view["color"]),
+            view["text_alignment"]))
+        if chunk in self.chunks:
+            self.chunks[chunk].add(view.id)
+            self.chunk_of[view.id] = chunk
+        self.pending += 1
+
+    def record_edit(self, view) -> None:
+        """Remember an edited bubble, the fields are written with its chunk on the main thread."""
+        with self.edited_lock:
+            self.edited.add(view.id)
+            self.pending += 1
+
+    def record_move(self, view) -> None:
+        """Count a drag, positions are written back with the chunk."""
+        self.pending += 1
+
+    def record_positions_if_due(self, store, settled: bool) -> int:
+        """Nothing to log, positions the layout changed are written back with their chunk."""
+        return 0
+
+    def record_connect(self, source, target) -> None:
+        """Insert a new connection right away."""
+        self.database.execute("INSERT OR IGNORE INTO connections VALUES (?, ?)", (source.id, target.id))
+        self.pending += 1
+
+    def compact(self, store) -> None:
+        """Write every loaded bubble back and commit."""
+        self.write_back([store.view_of(bubble_id) for bubble_id in self.chunk_of])
+        self.database.commit()
+        self.pending = 0
+
+    def compact_if_due(self, store) -> bool:
+        """Write everything back once compact_after edits piled up."""
+        if self.pending < self.compact_after:
+            return False
+        self.compact(store)
+        return True
+
+    def close(self) -> None:
+        """Commit and close the database."""
+        self.database.commit()
+        self.database.close()
+
+
+if __name__ == "__main__":
+    print("This file isn't intended to be run directly.")